@@ -0,0 +1,176 @@
+# backend/async_app.py
+"""
+Asyncio server mode: the same Socket.IO protocol and routes as app.py, served
+by python-socketio's AsyncServer on aiohttp. Every socket is a coroutine on one
+event loop instead of a thread, so a process can hold many thousands of
+mostly-idle connections.
+
+Game and lobby handling is shared with app.py through lobbies.LobbyServer;
+this module only moves its Outbox onto the wire. Logging goes through a
+queue drained by a background thread, and FodinhaGame's progress prints are
+off, so handlers never block the loop on stdout.
+
+    pip install aiohttp
+    python async_app.py --port 5050
+"""
+import os
+import queue
+import asyncio
+import logging
+import argparse
+import logging.handlers
+import socketio
+from aiohttp import web
+from lobbies import EVENTOS, LobbyServer
+from metrics import Metrics, CountingJSON
+from stores import criar_store
+from room_locks import AsyncRoomLocks
+from checkpoint import checkpointer_do_ambiente
+from replay import registro_do_ambiente
+from sweeper import sweeper_do_ambiente
+from matchmaking import fila_do_ambiente
+from rate_limits import limites_do_ambiente
+from backpressure import saida_do_ambiente
+from turn_timers import turnos_do_ambiente
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+metrics = Metrics()
+store = criar_store(os.environ.get("FODINHA_STORE")) # See stores.py
+server = LobbyServer(metrics, store, verbose_games=False)
+# Handlers are synchronous, but flushing awaits; holding the room's lock until the flush
+# is done keeps each handler's emits contiguous, so delta patches leave in version order.
+# Rooms don't wait for each other (see room_locks.py).
+room_locks = AsyncRoomLocks(metrics)
+# Closes idle lobbies and keeps their number under FODINHA_MAX_LOBBIES (see sweeper.py)
+sweeper = sweeper_do_ambiente(server)
+# Seats join_matchmaking players, relaxing brackets for those waiting past FODINHA_MATCH_WAIT (see matchmaking.py)
+matchmaking = fila_do_ambiente(server)
+
+sio = socketio.AsyncServer(async_mode="aiohttp", cors_allowed_origins="*", json=CountingJSON(metrics),
+                           client_manager=store.client_manager(async_mode=True, travas=room_locks,
+                                                               sala_de=server.sala_do_destino))
+web_app = web.Application()
+sio.attach(web_app)
+
+def outbound_depth(sid):
+    """Packets queued on sid's engine.io socket, or None if sid isn't a socket on this process."""
+    eio_sid = sio.manager.eio_sid_from_sid(sid, "/")
+    eio_socket = sio.eio.sockets.get(eio_sid) if eio_sid else None
+    return eio_socket.queue.qsize() if eio_socket is not None else None
+
+# Token buckets per sid and per room, checked before an event takes its room lock (see rate_limits.py)
+server.limites = limites_do_ambiente()
+# One heap of turn deadlines for every table; the server plays for players who time out (see turn_timers.py)
+server.turnos = turnos_do_ambiente()
+# Slow consumers get only the newest game_update, and are cut off past a hard limit (see backpressure.py)
+server.saida = saida_do_ambiente(server, outbound_depth, lambda sid: asyncio.ensure_future(sio.disconnect(sid)))
+
+async def flush(out):
+    """Sends what a LobbyServer handler queued, in order."""
+    for kind, *args in out:
+        if kind == "emit":
+            event, payload, room = args
+            await sio.emit(event, payload, room=room)
+        elif kind == "join":
+            await sio.enter_room(*args)
+        else:
+            await sio.leave_room(*args)
+
+# ── Health-check route ─────────────────────────────────────────────────────────
+async def status(request):
+    return web.json_response({"status": "Fodinha backend alive"})
+
+async def metrics_endpoint(request):
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+web_app.router.add_get("/", status)
+web_app.router.add_get("/metrics", metrics_endpoint)
+web_app.router.add_static("/static/", os.path.join(HERE, "static"))
+
+# ── Socket handlers ────────────────────────────────────────────────────────────
+async def run_event(event, sid, data=None):
+    """Dispatches one event under its rooms' locks and sends what it queued."""
+    barrado = server.limitar(event, sid, data)
+    if barrado is not None:
+        await flush(barrado)
+        return
+    if event == "create_lobby":
+        # At the lobby cap: close the least recently active ones first (only once the limiter let the request in)
+        for vaga in sweeper.vagas():
+            await run_event("evict_lobby", None, vaga)
+    async with room_locks.travar(lambda: server.salas_do_evento(sid, data), event):
+        out = server.dispatch(event, sid, data)
+        with store.publicacao():
+            await flush(out)
+
+def register_handler(event):
+    # connect is called with (sid, environ, auth) and disconnect with (sid, reason); instrument drops the extras
+    @sio.on(event)
+    @metrics.instrument(event)
+    async def handler(sid, data=None):
+        await run_event(event, sid, data)
+
+for event in EVENTOS:
+    register_handler(event)
+
+def configure_logging(level=logging.INFO):
+    """Logs through a queue so handlers only pay for a put; a listener thread does the writing."""
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
+    logging.basicConfig(level=level, format="%(message)s", handlers=[logging.handlers.QueueHandler(log_queue)])
+    listener.start()
+    return listener
+
+# ── Launch ─────────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fodinha backend on an asyncio Socket.IO server.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 5050)))
+    args = parser.parse_args()
+
+    listener = configure_logging()
+    # Warm restart: reload lobbies checkpointed by the previous process (FODINHA_CHECKPOINT=off disables it)
+    checkpointer = checkpointer_do_ambiente(server)
+    if checkpointer:
+        checkpointer.restaurar()
+        server.schedule_turns() # Restored games get a fresh deadline for the turn they were waiting on
+        checkpointer.iniciar()
+
+        async def start_checkpoints(app):
+            app["checkpoints"] = asyncio.create_task(checkpointer.rodar_async())
+
+        async def stop_checkpoints(app):
+            app["checkpoints"].cancel()
+            checkpointer.fechar()
+
+        web_app.on_startup.append(start_checkpoints)
+        web_app.on_cleanup.append(stop_checkpoints)
+
+    async def start_sweeper(app):
+        app["sweeper"] = asyncio.create_task(sweeper.rodar_async(run_event))
+        app["matchmaking"] = asyncio.create_task(matchmaking.rodar_async(run_event))
+        if server.saida is not None:
+            app["outbound"] = asyncio.create_task(server.saida.rodar_async(run_event))
+        if server.turnos is not None:
+            app["turn_timers"] = asyncio.create_task(server.turnos.rodar_async(run_event))
+
+    async def stop_sweeper(app):
+        app["sweeper"].cancel()
+        app["matchmaking"].cancel()
+        if "outbound" in app:
+            app["outbound"].cancel()
+        if "turn_timers" in app:
+            app["turn_timers"].cancel()
+
+    web_app.on_startup.append(start_sweeper)
+    web_app.on_cleanup.append(stop_sweeper)
+    # Seed + action log of every finished game, for replay.py (FODINHA_GAME_LOG=off disables it)
+    game_log = registro_do_ambiente(server)
+    print(f"Starting Fodinha asyncio backend on {args.host}:{args.port}...")
+    try:
+        web.run_app(web_app, host=args.host, port=args.port, print=None)
+    finally:
+        if game_log:
+            game_log.fechar()
+        listener.stop()
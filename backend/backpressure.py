@@ -0,0 +1,146 @@
+# backend/backpressure.py
+"""
+Backpressure for slow consumers.
+
+python-socketio queues every packet for a socket on its engine.io queue,
+and a writer drains that queue as fast as the client reads. A client that
+can't keep up (a phone on a bad network, a stalled tab) grows the queue by
+one full player view per game_update. FilasDeSaida watches that depth
+through profundidade(sid), which the transport supplies (None for sockets
+it doesn't hold, e.g. on another worker), and applies it to every emit
+addressed to a single sid:
+
+- at `coalescer` queued packets or more, a game_update is held back instead
+  of queued, replacing any update already held: a player view is complete,
+  so only the newest matters. The held update goes out just before the
+  next other event to that sid, so their order is kept. If no such event
+  comes, it goes out once the queue drains: every `interval` seconds the
+  transport runs the internal "drain_outbound" event for those sockets.
+- at `desconectar` packets the socket is disconnected. Its client rejoins
+  and gets a fresh state.
+
+Room broadcasts (lobby_state, delta patches, spectator updates) are never
+held. LobbyServer.dispatch filters before batching (batching.py) and
+encoding (wire.py), so a batching socket's superseded game_updates are
+dropped the same way and what is left still goes out as one batch; a held
+update is batched and encoded with whatever its drain sends. A batch is
+one packet: the events of one call to a batching socket don't count
+against each other. Replaced updates and disconnects are counted
+(outbound_dropped_total, slow_consumer_disconnects_total).
+
+    FODINHA_OUTBOUND="coalesce=8,disconnect=512"   queued packets, any subset; "off" disables it
+"""
+import os
+import asyncio
+
+COALESCER_PADRAO = 8
+DESCONECTAR_PADRAO = 512
+
+def saida_do_ambiente(server, profundidade, desconectar):
+    """A FilasDeSaida configured from FODINHA_OUTBOUND, or None when it is "off"."""
+    valor = os.environ.get("FODINHA_OUTBOUND", "")
+    if valor.strip().lower() == "off":
+        return None
+    limites = {"coalesce": COALESCER_PADRAO, "disconnect": DESCONECTAR_PADRAO}
+    for item in filter(None, valor.split(",")):
+        nome, _, n = item.partition("=")
+        if nome.strip() not in limites:
+            raise ValueError(f"Unknown setting in FODINHA_OUTBOUND: {nome}")
+        limites[nome.strip()] = int(n)
+    return FilasDeSaida(profundidade, desconectar, server.metrics, server.sala_do_destino,
+                        limites["coalesce"], limites["disconnect"])
+
+class FilasDeSaida:
+    def __init__(self, profundidade, desconectar, metrics, sala_de, coalescer=COALESCER_PADRAO,
+                 desconectar_acima=DESCONECTAR_PADRAO, interval=0.05):
+        self.profundidade = profundidade # sid -> packets queued on its engine.io socket, or None
+        self.desconectar = desconectar   # sid -> None; must not disconnect synchronously (it runs inside a handler)
+        self.metrics = metrics
+        self.sala_de = sala_de
+        self.coalescer = coalescer
+        self.desconectar_acima = desconectar_acima
+        self.interval = interval
+        self.retidos = {}       # sid -> (room_id, held game_update op)
+        self._desconectando = set()
+
+    def __len__(self):
+        return len(self.retidos)
+
+    def filtrar(self, ops, em_lote=lambda sid: False):
+        """
+        Outbox ops with game_updates to backed-up sids held back, and
+        backed-up-to-the-limit sids cut off. em_lote(sid) tells which sids
+        will get this call's events as one batch.
+        """
+        resultado = []
+        na_fila = {} # sid -> depth before this call + packets this call added, asked once per sid
+        lote = {}    # sid -> em_lote(sid), for sids with a depth
+        for op in ops:
+            if op[0] != "emit":
+                resultado.append(op)
+                continue
+            sid = op[3]
+            if sid not in na_fila:
+                na_fila[sid] = self.profundidade(sid)
+                if na_fila[sid] is not None:
+                    lote[sid] = bool(em_lote(sid))
+            profundidade = na_fila[sid]
+            if profundidade is None: # A room, or a socket on another worker
+                resultado.append(op)
+                continue
+            if profundidade >= self.desconectar_acima:
+                if sid not in self._desconectando:
+                    self._desconectando.add(sid)
+                    self.retidos.pop(sid, None)
+                    self.metrics.slow_consumer_disconnects += 1
+                    self.desconectar(sid)
+                self.metrics.dropped_events[op[1]] += 1
+                continue
+            retido = self.retidos.pop(sid, None)
+            if op[1] == "game_update":
+                if retido is not None:
+                    self.metrics.dropped_events["game_update"] += 1 # Superseded before it was sent
+                if profundidade >= self.coalescer:
+                    self.retidos[sid] = (self.sala_de(sid), op)
+                    continue
+            elif retido is not None:
+                resultado.append(retido[1])
+                na_fila[sid] += not lote[sid]
+            resultado.append(op)
+            na_fila[sid] += not lote[sid] # A batching sid gets all of this call's events in one packet
+        return resultado
+
+    def liberar(self, sid):
+        """The game_update held for sid, if any, to send now."""
+        retido = self.retidos.pop(sid, None)
+        return retido[1] if retido is not None else None
+
+    def esquecer(self, sid):
+        """Drops what was held for a disconnected sid."""
+        self.retidos.pop(sid, None)
+        self._desconectando.discard(sid)
+
+    def drenados(self):
+        """drain_outbound payloads for sids whose queue has gone below `coalescer` with an update held."""
+        prontos = []
+        for sid, (room_id, _) in list(self.retidos.items()):
+            profundidade = self.profundidade(sid)
+            if profundidade is None:
+                self.retidos.pop(sid, None) # Gone
+            elif profundidade < self.coalescer:
+                prontos.append({"room_id": room_id, "sid": sid})
+        return prontos
+
+    def rodar(self, sleep, executar):
+        """Background loop for app.py; executar(event, sid, data) runs an event like a socket handler."""
+        while True:
+            sleep(self.interval)
+            for data in self.drenados():
+                executar("drain_outbound", None, data)
+
+    async def rodar_async(self, executar):
+        """Background task for async_app.py; executar is the coroutine version."""
+        while True:
+            await asyncio.sleep(self.interval)
+            for data in self.drenados():
+                await executar("drain_outbound", None, data)
@@ -0,0 +1,262 @@
+# backend/batch_engine.py
+"""
+Lockstep NumPy engine that plays many independent Fodinha games at once.
+
+Every active game is in the same round of its own match (the card count
+progression only depends on how many rounds were played), so deals, bids,
+tricks and life updates run as array operations over a batch dimension.
+Rules mirror FodinhaGame exactly, including the tie -> truco_multiplier rule
+and the last-trick suit tiebreak; verificar_equivalencia replays the same
+deals through FodinhaGame and checks the outcomes match game for game.
+
+Needs numpy (requirements-tools.txt). The server never imports this module.
+
+Policies work on a whole batch: bid_policy(lote, assentos) -> bids and
+play_policy(lote, assentos) -> card indexes into each player's current hand,
+one value per active game (lote.linhas), where assentos holds the seat whose
+turn it is in each of those games.
+"""
+import numpy as np
+from game_logic import (FORCA_POR_MANILHA, DESEMPATE_POR_CODIGO, MANILHA_POR_CODIGO, N_CARTAS_BARALHO,
+                        proxima_quantidade_cartas)
+from simulation import (MAX_RODADAS_POR_PARTIDA, simular_partida, palpite_por_manilhas,
+                        jogar_primeira_carta, jogar_carta_mais_forte)
+
+FORCAS = np.array(FORCA_POR_MANILHA, dtype=np.int16)          # [manilha, codigo]
+DESEMPATE = np.array(DESEMPATE_POR_CODIGO, dtype=np.int16)    # [codigo]
+MANILHA = np.array(MANILHA_POR_CODIGO, dtype=np.int64)        # [codigo da carta do meio]
+
+class FodinhaLote:
+    def __init__(self, n_jogos, n_jogadores, initial_lives=3, seed=None, registrar=False):
+        if n_jogadores < 2:
+            raise ValueError("Fodinha needs at least 2 players.")
+        self.rng = np.random.Generator(np.random.PCG64(seed))
+        self.n_jogos = n_jogos
+        self.n_jogadores = n_jogadores
+        self.vidas = np.full((n_jogos, n_jogadores), initial_lives, dtype=np.int64)
+        self.dealer = self.rng.integers(0, n_jogadores, size=n_jogos)
+        self.ativo = np.ones(n_jogos, dtype=bool)
+        self.rodadas = np.zeros(n_jogos, dtype=np.int64)
+
+        # Shared by every game: all active games are always in the same round
+        self.cartas_global = 1
+        self.crescendo_global = True
+        self.max_cartas_global = (N_CARTAS_BARALHO - 1) // n_jogadores
+
+        # registrar=True keeps every deal and round outcome, for verificar_equivalencia
+        self.registrar = registrar
+        self.registro = [] # one (linhas, baralhos, palpites, vitorias) per round
+
+        # --- Round state, one row per active game (see self.linhas) ---
+        self.linhas = None
+        self.n_cartas = 0
+        self.meio = None     # [jogo] code of the middle card
+        self.maos = None     # [jogo, assento, slot] card codes as dealt
+        self.jogadas = None  # [jogo, assento, slot] True once that card is played
+        self.forcas = None   # [jogo, codigo] strength table of each game's manilha
+        self.palpites = None
+        self.soma_palpites = None
+        self.n_palpites_feitos = 0
+        self.vitorias = None
+        self.truco_multiplier = None
+        self.mesa = None     # [jogo, assento] code played in the current trick, -1 if none yet
+
+    @property
+    def ultimo_a_palpitar(self):
+        return self.n_palpites_feitos == self.n_jogadores - 1
+
+    def posicoes_na_mao(self, assentos, indices):
+        """Maps indexes into the current (unplayed) hand to slots of self.maos."""
+        ar = np.arange(len(self.linhas))
+        restantes = np.cumsum(~self.jogadas[ar, assentos], axis=1)
+        return np.argmax(restantes == (indices + 1)[:, None], axis=1)
+
+    def jogar_rodada(self, bid_policy, play_policy):
+        """Plays one round in every active game. Returns False once all games are over."""
+        linhas = np.flatnonzero(self.ativo)
+        if not len(linhas):
+            return False
+        A, P, n = len(linhas), self.n_jogadores, self.cartas_global
+        ar = np.arange(A)
+        self.linhas, self.n_cartas = linhas, n
+
+        # Deal: baralhos[j, k] is the code of the k-th card of game j's shuffled deck
+        baralhos = np.argsort(self.rng.random((A, N_CARTAS_BARALHO)), axis=1)
+        self.meio = baralhos[:, 0]
+        self.forcas = FORCAS[MANILHA[self.meio]]
+        self.maos = baralhos[:, 1:1 + P * n].reshape(A, P, n)
+        self.jogadas = np.zeros((A, P, n), dtype=bool)
+        dealer = self.dealer[linhas]
+
+        # Bids, starting from the player after the dealer
+        self.palpites = np.zeros((A, P), dtype=np.int64)
+        self.soma_palpites = np.zeros(A, dtype=np.int64)
+        for t in range(P):
+            self.n_palpites_feitos = t
+            assentos = (dealer + 1 + t) % P
+            palpite = np.asarray(bid_policy(self, assentos), dtype=np.int64)
+            invalido = (palpite < 0) | (palpite > n)
+            if self.ultimo_a_palpitar:
+                invalido |= self.soma_palpites + palpite == n
+            if invalido.any():
+                raise ValueError(f"Bid policy made an illegal bid in game {linhas[np.argmax(invalido)]}.")
+            self.palpites[ar, assentos] = palpite
+            self.soma_palpites += palpite
+        self.n_palpites_feitos = P
+
+        # Tricks
+        self.vitorias = np.zeros((A, P), dtype=np.int64)
+        self.truco_multiplier = np.ones(A, dtype=np.int64)
+        lider = (dealer + 1) % P
+        for truque in range(n):
+            self.mesa = np.full((A, P), -1, dtype=np.int64)
+            for t in range(P):
+                assentos = (lider + t) % P
+                indice = np.asarray(play_policy(self, assentos), dtype=np.int64)
+                invalido = (indice < 0) | (indice >= n - truque)
+                if invalido.any():
+                    raise ValueError(f"Play policy made an illegal play in game {linhas[np.argmax(invalido)]}.")
+                slot = self.posicoes_na_mao(assentos, indice)
+                self.jogadas[ar, assentos, slot] = True
+                self.mesa[ar, assentos] = self.maos[ar, assentos, slot]
+
+            forca = self.forcas[ar[:, None], self.mesa]
+            maior = forca.max(axis=1)
+            empatados = forca == maior[:, None]
+            unico = empatados.sum(axis=1) == 1
+            if truque == n - 1:
+                # Last trick: ties are broken by suit (tied cards always differ in suit)
+                vencedor = np.argmax(np.where(empatados, DESEMPATE[self.mesa], -1), axis=1)
+                pontua = np.ones(A, dtype=bool)
+            else:
+                vencedor = np.argmax(forca, axis=1)
+                pontua = unico
+            self.vitorias[ar[pontua], vencedor[pontua]] += self.truco_multiplier[pontua]
+            self.truco_multiplier = np.where(pontua, 1, self.truco_multiplier + 1)
+            # Without a winner, whoever played last leads the next trick
+            lider = np.where(pontua, vencedor, (lider + P - 1) % P)
+
+        # Lives and progression
+        vidas = self.vidas[linhas] - np.abs(self.vitorias - self.palpites)
+        self.vidas[linhas] = vidas
+        self.rodadas[linhas] += 1
+        self.ativo[linhas] = ~(vidas <= 0).any(axis=1)
+        self.dealer[linhas] = np.where(self.ativo[linhas], (dealer + 1) % P, dealer)
+        self.cartas_global, self.crescendo_global = proxima_quantidade_cartas(
+            self.cartas_global, self.crescendo_global, n, self.max_cartas_global)
+        if self.registrar:
+            self.registro.append((linhas, baralhos, self.palpites, self.vitorias))
+        return bool(self.ativo.any())
+
+    def jogar(self, bid_policy, play_policy, max_rodadas=MAX_RODADAS_POR_PARTIDA):
+        """Plays every game to the end (or max_rodadas rounds) and returns per-game results."""
+        rodada = 0
+        while rodada < max_rodadas and self.jogar_rodada(bid_policy, play_policy):
+            rodada += 1
+        return {"vidas": self.vidas, "rodadas": self.rodadas, "game_over": ~self.ativo}
+
+# ── Batch policies (same decisions as their simulation.py counterparts) ────────
+def palpite_por_manilhas_lote(lote, assentos):
+    ar = np.arange(len(lote.linhas))
+    if lote.n_cartas == 1:
+        # The own card is hidden: bid 1 when more than half of the unseen cards beat every card shown
+        chave = lote.forcas * 4 + DESEMPATE # Ties go by suit in the only trick
+        outras = np.arange(lote.n_jogadores)[None, :] != assentos[:, None]
+        cartas = lote.maos[:, :, 0]
+        melhor = np.where(outras, chave[ar[:, None], cartas], -1).max(axis=1)
+        vistas = np.zeros_like(chave, dtype=bool)
+        vistas[ar[:, None], np.where(outras, cartas, lote.meio[:, None])] = True
+        vistas[ar, lote.meio] = True
+        vencem = ((chave > melhor[:, None]) & ~vistas).sum(axis=1)
+        palpite = (2 * vencem > N_CARTAS_BARALHO - vistas.sum(axis=1)).astype(np.int64)
+    else:
+        mao = lote.maos[ar, assentos]
+        palpite = (lote.forcas[ar[:, None], mao] >= 100).sum(axis=1)
+    if lote.ultimo_a_palpitar:
+        proibido = palpite + lote.soma_palpites == lote.n_cartas
+        palpite = np.where(proibido, (palpite + 1) % (lote.n_cartas + 1), palpite)
+    return palpite
+
+def jogar_primeira_carta_lote(lote, assentos):
+    return np.zeros(len(lote.linhas), dtype=np.int64)
+
+def jogar_carta_mais_forte_lote(lote, assentos):
+    ar = np.arange(len(lote.linhas))
+    jogadas = lote.jogadas[ar, assentos]
+    forca = np.where(jogadas, -1, lote.forcas[ar[:, None], lote.maos[ar, assentos]])
+    slot = np.argmax(forca, axis=1)
+    return np.cumsum(~jogadas, axis=1)[ar, slot] - 1
+
+POLITICAS = {
+    "primeira_carta": ((palpite_por_manilhas_lote, jogar_primeira_carta_lote),
+                       (palpite_por_manilhas, jogar_primeira_carta)),
+    "carta_mais_forte": ((palpite_por_manilhas_lote, jogar_carta_mais_forte_lote),
+                         (palpite_por_manilhas, jogar_carta_mais_forte)),
+}
+
+# ── Equivalence with the scalar engine ─────────────────────────────────────────
+class _DealsEsgotados(Exception):
+    """The scalar game wanted more rounds than the batch game played."""
+
+class _DealsDoLote:
+    """random.Random stand-in that makes FodinhaGame deal exactly what a FodinhaLote dealt."""
+    def __init__(self, dealer, baralhos):
+        self._dealer = dealer
+        self._baralhos = iter(baralhos)
+    def randint(self, a, b):
+        return self._dealer
+    def shuffle(self, baralho):
+        # criar_baralho passes the deck in code order, so baralho[c] is the card with code c
+        ordem = next(self._baralhos, None)
+        if ordem is None:
+            raise _DealsEsgotados()
+        baralho[:] = [baralho[c] for c in ordem]
+
+def verificar_equivalencia(n_jogos=1000, n_jogadores=4, seed=0, politicas="carta_mais_forte",
+                           initial_lives=3, max_rodadas=MAX_RODADAS_POR_PARTIDA):
+    """
+    Plays n_jogos games with FodinhaLote, replays each one through FodinhaGame
+    (simulation.simular_partida) on the same deals, and returns the indexes of
+    games whose bids, tricks won, lives or length differ. An empty list means
+    both engines agree on every game.
+    """
+    (bid_lote, play_lote), (bid, play) = POLITICAS[politicas]
+    lote = FodinhaLote(n_jogos, n_jogadores, initial_lives, seed, registrar=True)
+    dealers = lote.dealer.copy()
+    lote.jogar(bid_lote, play_lote, max_rodadas)
+
+    divergentes = []
+    jogadores = list(range(n_jogadores))
+    for jogo in range(n_jogos):
+        rodadas = [(linhas, np.searchsorted(linhas, jogo), baralhos, palpites, vitorias)
+                   for linhas, baralhos, palpites, vitorias in lote.registro if jogo in linhas]
+        deals = _DealsDoLote(int(dealers[jogo]), [baralhos[i].tolist() for _, i, baralhos, _, _ in rodadas])
+        try:
+            partida = simular_partida(jogadores, bid, play, initial_lives=initial_lives, max_rodadas=max_rodadas, rng=deals)
+        except _DealsEsgotados:
+            divergentes.append(jogo)
+            continue
+        iguais = (partida["rodadas"] == lote.rodadas[jogo]
+                  and partida["game_over"] == (not lote.ativo[jogo])
+                  and [partida["vidas"][j] for j in jogadores] == lote.vidas[jogo].tolist())
+        for registro, (_, i, _, palpites, vitorias) in zip(partida["historico"], rodadas):
+            iguais = (iguais and [registro["palpites"][j] for j in jogadores] == palpites[i].tolist()
+                      and [registro["vitorias"][j] for j in jogadores] == vitorias[i].tolist())
+        if not iguais:
+            divergentes.append(jogo)
+    return divergentes
+
+if __name__ == "__main__":
+    import time
+    for n_jogadores in range(2, 7):
+        for nome in POLITICAS:
+            divergentes = verificar_equivalencia(500, n_jogadores, seed=n_jogadores, politicas=nome, initial_lives=5)
+            print(f"{n_jogadores} jogadores, {nome}: {'OK' if not divergentes else f'DIVERGE em {divergentes[:10]}'}")
+
+    bid, play = POLITICAS["carta_mais_forte"][0]
+    lote = FodinhaLote(100_000, 4, seed=42)
+    inicio = time.perf_counter()
+    lote.jogar(bid, play)
+    duracao = time.perf_counter() - inicio
+    rodadas = int(lote.rodadas.sum())
+    print(f"{lote.n_jogos} partidas, {rodadas} rodadas em {duracao:.2f}s ({rodadas / duracao:.0f} rodadas/s)")
@@ -0,0 +1,87 @@
+# backend/batching.py
+"""
+One message per socket per action.
+
+A single action can send a player several full-state events: a card that
+ends a round gives each of them game_update (card_played), game_update
+(trick_completed), round_results and maybe prompt_card_play, each carrying
+the whole player view. Clients that send "batch": true with
+create_lobby/join_lobby instead get every event an action addressed to them
+in one "batch" message, in order:
+
+    {"states": [{...player view...}],
+     "events": [{"event": "game_update", "state": 0, "data": {"event_type": "card_played", ...}},
+                {"event": "round_results", "state": 0, "data": {"event_type": "round_over", ...}},
+                {"event": "game_snapshot", "data": {...}}]}
+
+An entry with "state" is the player view states[state] updated with "data";
+without it, "data" is the payload itself. The player view is encoded once
+however many events share it. Broadcasts to a whole room (lobby_state,
+game_patch, ...) are sent as before, and so is an action's only event for
+a socket. Sockets without the flag get exactly the old events.
+"""
+
+class Vista(dict):
+    """A player view payload: a shallow copy of `base` plus event fields, so batches can share `base`."""
+    __slots__ = ("base",)
+
+    def __init__(self, base, **extras):
+        super().__init__(base, **extras)
+        self.base = base
+
+    def extras(self):
+        base = self.base
+        return {k: v for k, v in self.items() if k not in base or base[k] is not v}
+
+    def __reduce__(self):
+        return (dict, (dict(self),)) # Pickles (SQLiteStore pub/sub) as the plain dict it is on the wire
+
+def agrupar(ops, em_lote, contagem=None):
+    """
+    Outbox ops with the emits to each batching sid (em_lote(sid) is true)
+    folded into "batch" emits. A batch goes out where its first event was, and
+    is closed by any other kind of op (a room broadcast, join or leave), so
+    every socket still sees its events in handler order. contagem (a Counter)
+    gets the events that went out inside a batch, per event.
+    """
+    resultado = []
+    abertos = {} # sid -> (position in resultado, [(event, payload)])
+    lote = {}    # sid -> em_lote(sid), asked once per call
+    for op in ops:
+        if op[0] == "emit":
+            _, event, payload, room = op
+            if room not in lote:
+                lote[room] = bool(em_lote(room))
+            if lote[room]:
+                aberto = abertos.get(room)
+                if aberto is None:
+                    abertos[room] = (len(resultado), [(event, payload)])
+                    resultado.append(op)
+                else:
+                    aberto[1].append((event, payload))
+                continue
+        _fechar(resultado, abertos, contagem)
+        resultado.append(op)
+    _fechar(resultado, abertos, contagem)
+    return resultado
+
+def _fechar(resultado, abertos, contagem):
+    for sid, (posicao, eventos) in abertos.items():
+        if len(eventos) > 1:
+            resultado[posicao] = ("emit", "batch", _lote(eventos), sid)
+            if contagem is not None:
+                contagem.update(event for event, _ in eventos)
+    abertos.clear()
+
+def _lote(eventos):
+    estados, indices, entradas = [], {}, []
+    for event, payload in eventos:
+        if isinstance(payload, Vista):
+            indice = indices.get(id(payload.base))
+            if indice is None:
+                indice = indices[id(payload.base)] = len(estados)
+                estados.append(payload.base)
+            entradas.append({"event": event, "state": indice, "data": payload.extras()})
+        else:
+            entradas.append({"event": event, "data": payload})
+    return {"states": estados, "events": entradas}
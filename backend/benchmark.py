@@ -0,0 +1,266 @@
+# backend/benchmark.py
+"""
+Microbenchmarks for the game engine and the Socket.IO handlers.
+
+Every case runs with a fixed seed for 2 to 6 players and reports the best of
+several repeats (microseconds per operation). Results are written as JSON and
+compared against a stored baseline, flagging anything slower than the
+tolerance:
+
+    python benchmark.py --save-baseline           # record bench_baseline.json
+    python benchmark.py                           # run, write bench_results.json, compare
+    python benchmark.py --only engine --tolerance 0.25
+
+The handler cases drive app.py through Flask-SocketIO's test client, so they
+include handler work and emits but no network. Exit status is 1 when a case
+regressed.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import contextlib
+from game_logic import CARTAS, FodinhaGame, criar_baralho
+from simulation import palpites_permitidos
+from endgame import EndgameSolver
+
+PLAYER_COUNTS = (2, 3, 4, 5, 6)
+REPEATS = 5
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def _best_of(run, repeats=REPEATS):
+    """run() returns (seconds, operations); returns the best seconds per operation."""
+    best = None
+    for _ in range(repeats):
+        seconds, ops = run()
+        if ops and (best is None or seconds / ops < best):
+            best = seconds / ops
+    return best
+
+def _new_game(n_players, seed, n_cartas=None):
+    game = FodinhaGame([f"P{i + 1}" for i in range(n_players)], rng=random.Random(seed), verbose=False)
+    if n_cartas is not None:
+        game.cartas_global = n_cartas
+    game.start_new_round()
+    return game
+
+def _bid_all(game, rng):
+    while game.round_phase == "waiting_palpites":
+        game.submit_palpite(game.jogador_da_vez_acao, rng.choice(palpites_permitidos(game)))
+
+# ── Engine cases ───────────────────────────────────────────────────────────────
+def bench_criar_baralho(n_players, seed):
+    rng = random.Random(seed)
+    def run():
+        start = time.perf_counter()
+        for _ in range(2000):
+            criar_baralho(rng)
+        return time.perf_counter() - start, 2000
+    return _best_of(run)
+
+def bench_start_new_round(n_players, seed):
+    def run():
+        games = [FodinhaGame([f"P{i + 1}" for i in range(n_players)], rng=random.Random(seed + i), verbose=False)
+                 for i in range(500)]
+        for g in games:
+            g.cartas_global = 5
+        start = time.perf_counter()
+        for g in games:
+            g.start_new_round()
+        return time.perf_counter() - start, len(games)
+    return _best_of(run)
+
+def bench_submit_palpite(n_players, seed):
+    def run():
+        rng = random.Random(seed)
+        games = [_new_game(n_players, seed + i, n_cartas=5) for i in range(300)]
+        bids = []
+        for g in games:
+            # Precompute a legal bid sequence so only submit_palpite is timed
+            sequence, soma = [], 0
+            for k in range(n_players):
+                allowed = [p for p in range(6) if not (k == n_players - 1 and soma + p == 5)]
+                sequence.append(rng.choice(allowed))
+                soma += sequence[-1]
+            bids.append(sequence)
+        start = time.perf_counter()
+        for g, sequence in zip(games, bids):
+            for palpite in sequence:
+                g.submit_palpite(g.jogador_da_vez_acao, palpite)
+        return time.perf_counter() - start, len(games) * n_players
+    return _best_of(run)
+
+def bench_submit_card_play(n_players, seed):
+    def run():
+        rng = random.Random(seed)
+        games = [_new_game(n_players, seed + i, n_cartas=5) for i in range(200)]
+        for g in games:
+            _bid_all(g, rng)
+        ops = 0
+        start = time.perf_counter()
+        for g in games:
+            while g.round_phase == "waiting_card_play":
+                g.submit_card_play(g.jogador_da_vez_acao, 0)
+                ops += 1
+        return time.perf_counter() - start, ops
+    return _best_of(run)
+
+def bench_determine_trick_winner(n_players, seed):
+    rng = random.Random(seed)
+    game = _new_game(n_players, seed, n_cartas=5)
+    tables = [[(p, c) for p, c in zip(game.jogadores, rng.sample(CARTAS, n_players))] for _ in range(500)]
+    def run():
+        start = time.perf_counter()
+        for table in tables:
+            game.cartas_na_mesa_rodada_atual = table
+            game._determine_trick_winner()
+        return time.perf_counter() - start, len(tables)
+    return _best_of(run)
+
+def bench_get_player_game_state(n_players, seed, warm=False):
+    game = _new_game(n_players, seed, n_cartas=5)
+    def run():
+        elapsed = 0.0
+        for _ in range(300):
+            if not warm:
+                game._bump_version() # Invalidate the view cache, as any action would
+            start = time.perf_counter()
+            for p in game.jogadores:
+                game.get_player_game_state(p)
+            elapsed += time.perf_counter() - start
+        return elapsed, 300 * n_players
+    return _best_of(run)
+
+def bench_endgame_melhor_jogada(n_players, seed, positions=40):
+    """Median over `positions` 3-card deals of solving the first card play from scratch (endgame.py)."""
+    timings = []
+    for i in range(positions):
+        game = _new_game(n_players, seed + i, n_cartas=3)
+        _bid_all(game, random.Random(seed + i))
+        def run():
+            start = time.perf_counter()
+            EndgameSolver(game).melhor_jogada(game.jogador_da_vez_acao)
+            return time.perf_counter() - start, 1
+        timings.append(_best_of(run, repeats=3))
+    return sorted(timings)[len(timings) // 2]
+
+ENGINE_CASES = {
+    "criar_baralho": bench_criar_baralho,
+    "start_new_round": bench_start_new_round,
+    "submit_palpite": bench_submit_palpite,
+    "submit_card_play": bench_submit_card_play,
+    "_determine_trick_winner": bench_determine_trick_winner,
+    "get_player_game_state": bench_get_player_game_state,
+    "get_player_game_state_cached": lambda n, seed: bench_get_player_game_state(n, seed, warm=True),
+    "endgame_melhor_jogada": bench_endgame_melhor_jogada,
+}
+
+# ── Socket handler cases ───────────────────────────────────────────────────────
+def bench_handlers(n_players, seed, rounds=6, repeats=REPEATS):
+    """Plays `rounds` rounds through app.py `repeats` times; returns the median seconds per handler call, by event."""
+    timings = {}
+    for repeat in range(repeats):
+        _play_through_handlers(n_players, seed, rounds, timings)
+    return {event: sorted(samples)[len(samples) // 2] for event, samples in timings.items()}
+
+def _play_through_handlers(n_players, seed, rounds, timings):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        import app
+        app.server.sementes = random.Random(seed) # Same deals on every run with this seed
+        rng = random.Random(seed)
+
+        def timed(client, event, data):
+            start = time.perf_counter()
+            client.emit(event, data)
+            timings.setdefault(event, []).append(time.perf_counter() - start)
+            client.get_received() # Drop queued messages so memory stays flat
+
+        clients = {f"P{i + 1}": app.socketio.test_client(app.app) for i in range(n_players)}
+        host = clients["P1"]
+        host.emit("create_lobby", {"player_id": "P1"})
+        room_id = next(m["args"][0]["room_id"] for m in host.get_received() if m["name"] == "lobby_created")
+        for player_id, client in clients.items():
+            if player_id != "P1":
+                timed(client, "join_lobby", {"room_id": room_id, "player_id": player_id})
+        timed(host, "start_game", {"room_id": room_id})
+        for _ in range(rounds):
+            game = app.games[room_id]["game_instance"]
+            while game.round_phase == "waiting_palpites":
+                timed(clients[game.jogador_da_vez_acao], "submit_palpite_action",
+                      {"room_id": room_id, "palpite": rng.choice(palpites_permitidos(game))})
+            while game.round_phase == "waiting_card_play":
+                timed(clients[game.jogador_da_vez_acao], "submit_card_action", {"room_id": room_id, "card_index": 0})
+            if game.round_phase == "game_over":
+                break
+            timed(host, "request_next_round_action", {"room_id": room_id})
+        for client in clients.values():
+            client.disconnect()
+
+# ── Runner ─────────────────────────────────────────────────────────────────────
+def run_all(seed, only=None):
+    results = {}
+    if only in (None, "engine"):
+        for name, case in ENGINE_CASES.items():
+            for n in PLAYER_COUNTS:
+                results[f"{name}[{n}p]"] = case(n, seed) * 1e6
+    if only in (None, "handlers"):
+        try:
+            import flask_socketio # noqa: F401
+        except ImportError:
+            print("Flask-SocketIO not installed, skipping handler benchmarks.", file=sys.stderr)
+        else:
+            for n in PLAYER_COUNTS:
+                for event, seconds in bench_handlers(n, seed).items():
+                    results[f"handler:{event}[{n}p]"] = seconds * 1e6
+    return results
+
+def compare(results, baseline, tolerance):
+    """Returns (name, baseline_us, current_us, ratio) for cases slower than baseline * (1 + tolerance)."""
+    regressions = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        ratio = current / previous if previous else None
+        flag = ""
+        if ratio is not None and ratio > 1 + tolerance:
+            regressions.append((name, previous, current, ratio))
+            flag = "  <-- REGRESSION"
+        shown = f"{previous:10.2f}" if previous else f"{'-':>10}"
+        print(f"{name:45} {shown} {current:10.2f} us {f'x{ratio:.2f}' if ratio else '':>7}{flag}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fodinha engine and handler microbenchmarks.")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--only", choices=("engine", "handlers"))
+    parser.add_argument("--out", default=os.path.join(HERE, "bench_results.json"))
+    parser.add_argument("--baseline", default=os.path.join(HERE, "bench_baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown before flagging (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    results = run_all(args.seed, args.only)
+    report = {
+        "meta": {"seed": args.seed, "python": platform.python_version(), "machine": platform.machine(),
+                 "platform": platform.platform(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "unit": "microseconds per operation",
+        "results": results,
+    }
+    target = args.baseline if args.save_baseline else args.out
+    with open(target, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Results written to {target}")
+
+    if not args.save_baseline:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+            sys.exit(0)
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        print(f"{'case':45} {'baseline':>10} {'current':>10}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} case(s) regressed more than {args.tolerance:.0%}.")
+            sys.exit(1)
@@ -0,0 +1,262 @@
+# backend/bid_tables.py
+"""
+Precomputed bid-expectation tables: how many tricks a hand takes.
+
+The pipeline deals rounds in bulk with batch_engine.FodinhaLote, plays them
+with a batch play policy and, for every seat, counts the tricks its hand
+took. Hands are canonicalized through Carta.forca under the round's manilha:
+only the number of cards of each non-manilha rank (relabeled 0..8 in
+strength order) and which manilhas the hand holds matter, so K♣ 5♦ and
+K♥ 5♠ share a row. A row is keyed by
+
+    (players, hand size)   one block each
+    manilha rank           it decides which rank lost a card to the carta do meio
+    position               seat order in the first trick (0 = leads)
+    canonical hand
+
+and holds the histogram of tricks won (0..hand size), from which lookups
+derive the expected tricks and the distribution. Rare hands get few
+samples; every answer carries its sample count.
+
+The 1-card round needs no table: a player sees every other card but not
+their own, which is equally likely to be any card they can't see, so
+um_carta() counts exactly how many of those would win.
+
+File: magic line, 4-byte little-endian header length, JSON header (blocks,
+offsets, shapes, how it was built), padding, then the uint32 histograms,
+memory-mapped on load so a server process only pages in what it reads.
+
+    python bid_tables.py --jogadores 2-6 --max-cartas 5 --rodadas 1000000 --workers 8
+
+Needs numpy (requirements-tools.txt), like batch_engine.py. The server never imports this module.
+"""
+import os
+import json
+import mmap
+import time
+import struct
+import argparse
+import itertools
+import multiprocessing
+import numpy as np
+from game_logic import CARTAS, VALORES, NAIPES, N_CARTAS_BARALHO, MANILHA_POR_CODIGO, FORCA_POR_MANILHA, DESEMPATE_POR_CODIGO
+from batch_engine import FodinhaLote, POLITICAS, MANILHA
+from simulation import seed_da_partida, palpite_por_manilhas, palpites_permitidos
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ARQUIVO_PADRAO = os.path.join(HERE, "bid_tables.bin")
+MAGICO = b"FODINHA-BID-TABLES 1\n"
+MIN_AMOSTRAS = 30 # Rows with fewer samples are too noisy for palpite_por_tabela
+
+# ── Canonical hands ────────────────────────────────────────────────────────────
+# A canonical hand is an integer: base-5 digits count the cards of each
+# non-manilha rank (weakest first), and the bits above 5**9 are the manilhas held.
+N_POSTOS = len(VALORES) - 1 # Non-manilha ranks
+BASE_MANILHAS = 5 ** N_POSTOS
+
+def _peso(codigo, manilha_idx):
+    forca = CARTAS[codigo].forca(VALORES[manilha_idx])
+    if forca >= 100:
+        return BASE_MANILHAS << (forca - 100)
+    return 5 ** (forca if forca < manilha_idx else forca - 1)
+
+# PESOS[manilha_idx, codigo]: what the card adds to a canonical hand
+PESOS = np.array([[_peso(c, m) for c in range(N_CARTAS_BARALHO)] for m in range(len(VALORES))], dtype=np.int64)
+_PESOS = PESOS.tolist() # Plain ints for single lookups
+
+_maos_canonicas = {}
+
+def maos_canonicas(n_cartas):
+    """Sorted canonical hands of n_cartas cards (a row index is a position in this array)."""
+    if n_cartas not in _maos_canonicas:
+        maos = set()
+        for mask in range(1 << len(NAIPES)):
+            resto = n_cartas - bin(mask).count("1")
+            if resto < 0:
+                continue
+            for postos in itertools.combinations_with_replacement(range(N_POSTOS), resto):
+                contagem = [postos.count(p) for p in range(N_POSTOS)]
+                if max(contagem, default=0) <= len(NAIPES):
+                    maos.add(sum(c * 5 ** p for p, c in enumerate(contagem)) + mask * BASE_MANILHAS)
+        _maos_canonicas[n_cartas] = np.array(sorted(maos), dtype=np.int64)
+    return _maos_canonicas[n_cartas]
+
+# ── Pipeline ───────────────────────────────────────────────────────────────────
+def _contar_bloco(tarefa):
+    """Worker entry point: deals n_rodadas rounds and returns the (players, hand size) histogram block."""
+    n_jogadores, n_cartas, indice, n_rodadas, seed, politica = tarefa
+    bid_policy, play_policy = POLITICAS[politica][0]
+    lote = FodinhaLote(n_rodadas, n_jogadores, seed=seed_da_partida(seed, indice), registrar=True)
+    dealer = lote.dealer.copy()
+    lote.cartas_global = n_cartas
+    lote.jogar_rodada(bid_policy, play_policy)
+    _, baralhos, _, vitorias = lote.registro[-1]
+
+    maos = maos_canonicas(n_cartas)
+    manilha = MANILHA[baralhos[:, 0]]                                        # [rodada]
+    canonica = PESOS[manilha[:, None, None], lote.maos].sum(axis=2)          # [rodada, assento]
+    linha = np.searchsorted(maos, canonica)
+    posicao = (np.arange(n_jogadores)[None, :] - dealer[:, None] - 1) % n_jogadores
+    forma = (len(VALORES), n_jogadores, len(maos), n_cartas + 1)
+    plano = np.ravel_multi_index((np.broadcast_to(manilha[:, None], linha.shape), posicao, linha, vitorias), forma)
+    return n_jogadores, n_cartas, np.bincount(plano.ravel(), minlength=int(np.prod(forma))).astype(np.uint32).reshape(forma)
+
+def construir(jogadores=range(2, 7), max_cartas=5, n_rodadas=1_000_000, seed=0, politica="carta_mais_forte",
+              n_workers=None, tamanho_bloco=100_000, ao_receber_bloco=None):
+    """
+    Plays n_rodadas rounds for every (players, hand size) and returns
+    {(players, hand size): histogram [manilha, position, hand, tricks]}.
+    Block i of a grid cell always uses the same seed, so results don't
+    depend on the number of workers.
+    """
+    tarefas = []
+    for n_jogadores in jogadores:
+        for n_cartas in range(1, min(max_cartas, (N_CARTAS_BARALHO - 1) // n_jogadores) + 1):
+            for inicio in range(0, n_rodadas, tamanho_bloco):
+                indice = (n_jogadores * 100 + n_cartas) * 1_000_000 + inicio // tamanho_bloco
+                tarefas.append((n_jogadores, n_cartas, indice, min(tamanho_bloco, n_rodadas - inicio), seed, politica))
+    blocos = {}
+    n_workers = n_workers or os.cpu_count() or 1
+
+    def _receber(resultados):
+        for feitos, (n_jogadores, n_cartas, contagens) in enumerate(resultados, 1):
+            chave = (n_jogadores, n_cartas)
+            if chave in blocos:
+                blocos[chave] += contagens
+            else:
+                blocos[chave] = contagens
+            if ao_receber_bloco:
+                ao_receber_bloco(feitos, len(tarefas))
+
+    if n_workers == 1 or len(tarefas) == 1:
+        _receber(map(_contar_bloco, tarefas))
+    else:
+        with multiprocessing.Pool(min(n_workers, len(tarefas))) as pool:
+            _receber(pool.imap_unordered(_contar_bloco, tarefas))
+    return blocos
+
+def salvar(path, blocos, **construcao):
+    """Writes histograms from construir() in the memory-mappable format (see the module docstring)."""
+    header = {"construcao": construcao, "blocos": []}
+    offset = 0
+    for (n_jogadores, n_cartas), contagens in sorted(blocos.items()):
+        header["blocos"].append({"jogadores": n_jogadores, "cartas": n_cartas, "offset": offset, "forma": list(contagens.shape)})
+        offset += contagens.size
+    corpo = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    inicio = len(MAGICO) + 4 + len(corpo)
+    padding = -inicio % 8
+    temporario = path + ".tmp"
+    with open(temporario, "wb") as f:
+        f.write(MAGICO + struct.pack("<I", len(corpo) + padding) + corpo + b" " * padding)
+        for _, contagens in sorted(blocos.items()):
+            f.write(np.ascontiguousarray(contagens, dtype="<u4").tobytes())
+    os.replace(temporario, path)
+
+# ── 1-card rounds ──────────────────────────────────────────────────────────────
+# ORDEM_NA_ULTIMA[manilha_idx][codigo]: rank of the card in a last trick (strength, then suit), 0..39
+ORDEM_NA_ULTIMA = tuple(
+    tuple(sorted(range(N_CARTAS_BARALHO), key=lambda c: (FORCA_POR_MANILHA[m][c], DESEMPATE_POR_CODIGO[c])).index(codigo)
+          for codigo in range(N_CARTAS_BARALHO))
+    for m in range(len(VALORES)))
+
+def um_carta(carta_meio, cartas_visiveis):
+    """
+    Exact answer for a 1-card round, where a player sees every other card but
+    their own: (expected tricks, (P(0), P(1)), cards their own could be).
+    carta_meio and cartas_visiveis are card codes.
+    """
+    ordem = ORDEM_NA_ULTIMA[MANILHA_POR_CODIGO[carta_meio]]
+    melhor = max(ordem[c] for c in cartas_visiveis)
+    vistas = set(cartas_visiveis)
+    vistas.add(carta_meio)
+    possiveis = N_CARTAS_BARALHO - len(vistas)
+    # The only trick is the last one, so ties go by suit and every card has a distinct rank
+    vencem = sum(1 for c in range(N_CARTAS_BARALHO) if ordem[c] > melhor and c not in vistas)
+    p = vencem / possiveis
+    return p, (1.0 - p, p), possiveis
+
+# ── Lookup ─────────────────────────────────────────────────────────────────────
+class BidTables:
+    def __init__(self, path=ARQUIVO_PADRAO):
+        with open(path, "rb") as f:
+            if f.read(len(MAGICO)) != MAGICO:
+                raise ValueError(f"{path} is not a bid table file")
+            (tamanho,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(tamanho))
+            self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.construcao = header["construcao"]
+        # A plain ndarray over the mapping: np.memmap views are several times slower to index
+        dados = np.frombuffer(self._mapa, dtype="<u4", offset=len(MAGICO) + 4 + tamanho)
+        self._blocos = {}
+        for bloco in header["blocos"]:
+            forma = tuple(bloco["forma"])
+            contagens = dados[bloco["offset"]:bloco["offset"] + int(np.prod(forma))].reshape(forma)
+            maos = maos_canonicas(bloco["cartas"])
+            self._blocos[(bloco["jogadores"], bloco["cartas"])] = (contagens, dict(zip(maos.tolist(), range(len(maos)))))
+
+    def consultar(self, n_jogadores, manilha_idx, posicao, mao):
+        """
+        (expected tricks, distribution over 0..len(mao), samples) for a hand of
+        card codes, or None if the tables don't cover this player count and hand size.
+        """
+        bloco = self._blocos.get((n_jogadores, len(mao)))
+        if bloco is None:
+            return None
+        contagens, linhas = bloco
+        pesos = _PESOS[manilha_idx]
+        histograma = contagens[manilha_idx, posicao, linhas[sum(pesos[c] for c in mao)]].tolist()
+        amostras = sum(histograma)
+        if not amostras:
+            return 0.0, (), 0
+        distribuicao = tuple(h / amostras for h in histograma)
+        return sum(k * p for k, p in enumerate(distribuicao)), distribuicao, amostras
+
+    def para_jogador(self, game, player_id):
+        """consultar() for a player during the bidding phase of a FodinhaGame, exact in 1-card rounds."""
+        jogadores = game.jogadores
+        if game.n_cartas_rodada_atual == 1:
+            visiveis = [game.maos_rodada_atual[j][0].codigo for j in jogadores if j != player_id]
+            return um_carta(game.carta_meio_rodada_atual.codigo, visiveis)
+        posicao = (jogadores.index(player_id) - jogadores.index(game.dealer_rodada_atual) - 1) % len(jogadores)
+        manilha_idx = MANILHA_POR_CODIGO[game.carta_meio_rodada_atual.codigo]
+        return self.consultar(len(jogadores), manilha_idx, posicao, [c.codigo for c in game.maos_rodada_atual[player_id]])
+
+# ── Bot policy ─────────────────────────────────────────────────────────────────
+_tabelas = None
+
+def palpite_por_tabela(game, player_id, rng):
+    """
+    Bid policy (simulation.py signature): the legal bid with the fewest
+    expected lives lost, E|tricks - bid|, under the default tables. Falls back
+    to palpite_por_manilhas where the tables have too few samples.
+    """
+    global _tabelas
+    if _tabelas is None:
+        _tabelas = BidTables()
+    resposta = _tabelas.para_jogador(game, player_id)
+    if resposta is None or resposta[2] < MIN_AMOSTRAS:
+        return palpite_por_manilhas(game, player_id, rng)
+    distribuicao = resposta[1]
+    return min(palpites_permitidos(game), key=lambda b: sum(p * abs(k - b) for k, p in enumerate(distribuicao)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build Fodinha bid-expectation tables.")
+    parser.add_argument("--jogadores", default="2-6", help="Player counts, e.g. 4 or 2-6")
+    parser.add_argument("--max-cartas", type=int, default=5)
+    parser.add_argument("--rodadas", type=int, default=1_000_000, help="Rounds dealt per (players, hand size)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--politica", default="carta_mais_forte", choices=sorted(POLITICAS))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--bloco", type=int, default=100_000)
+    parser.add_argument("--out", default=ARQUIVO_PADRAO)
+    args = parser.parse_args()
+
+    primeiro, _, ultimo = args.jogadores.partition("-")
+    jogadores = range(int(primeiro), int(ultimo or primeiro) + 1)
+    inicio = time.perf_counter()
+    blocos = construir(jogadores, args.max_cartas, args.rodadas, args.seed, args.politica, args.workers, args.bloco,
+                       ao_receber_bloco=lambda feitos, total: print(f"\r{feitos}/{total} blocos", end="", flush=True))
+    salvar(args.out, blocos, rodadas=args.rodadas, seed=args.seed, politica=args.politica)
+    duracao = time.perf_counter() - inicio
+    linhas = sum(c[..., 0].size for c in blocos.values())
+    print(f"\n{len(blocos)} tabelas, {linhas} linhas, {os.path.getsize(args.out) / 1e6:.1f} MB em {duracao:.1f}s -> {args.out}")
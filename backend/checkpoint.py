@@ -0,0 +1,156 @@
+# backend/checkpoint.py
+"""
+Periodic checkpoints of live lobbies, and warm restart from them.
+
+The checkpoint is a JSON-lines file, one record per changed lobby:
+
+    {"room_id": "AB12CD", "lobby": {"players": [...], "host_sid": ..., "version": 7, "tokens": {...}, "game": {...}}}
+    {"room_id": "AB12CD", "lobby": null}                          <- lobby removed
+
+Loading keeps the last record of each room. Handlers only add the room_id to
+LobbyServer.salas_alteradas; once per interval the Checkpointer turns those
+lobbies into dicts (FodinhaGame.to_dict, a few microseconds each) between
+handlers, and a writer thread encodes, appends and fsyncs them. When the file
+grows well past its live size, the writer rewrites it from the latest record
+of every room and swaps it in atomically.
+
+The snapshot step runs in the server's own concurrency model (an eventlet
+greenthread in app.py, an asyncio task in async_app.py) and, given the
+server's RoomLocks, takes each lobby's lock while copying it, so it never sees
+a half-applied action even when handlers run on real threads.
+
+Only MemoryStore needs this; SQLiteStore lobbies already survive restarts.
+"""
+import os
+import json
+import queue
+import asyncio
+import logging
+import threading
+import contextlib
+from lobbies import lobby_to_dict, lobby_from_dict
+
+log = logging.getLogger("fodinha.checkpoint")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ARQUIVO_PADRAO = os.path.join(HERE, "lobbies.checkpoint.jsonl")
+COMPACTAR_ACIMA = 1 << 20 # Characters appended before the file may be compacted
+
+def _linha(room_id, lobby):
+    return json.dumps({"room_id": room_id, "lobby": lobby}, ensure_ascii=False, separators=(",", ":"))
+
+def checkpointer_do_ambiente(server, travas=None):
+    """Checkpointer configured by FODINHA_CHECKPOINT (a path, or "off"), or None when not needed."""
+    path = os.environ.get("FODINHA_CHECKPOINT", ARQUIVO_PADRAO)
+    if path == "off" or server.store.duravel:
+        return None
+    return Checkpointer(server, path, travas=travas)
+
+class Checkpointer:
+    def __init__(self, server, path, interval=1.0, compactar_acima=COMPACTAR_ACIMA, travas=None):
+        self.server = server
+        self.path = path
+        self.travas = travas # room_locks.RoomLocks of a threaded server; None when snapshots can't interleave with handlers
+        self.interval = interval
+        self.compactar_acima = compactar_acima
+        server.salas_alteradas = set()
+        # Writer thread state
+        self._fila = queue.SimpleQueue()
+        self._ultimas = {} # room_id -> latest encoded line, what a compacted file holds
+        self._escritos = 0 # Characters in the file (close enough to bytes for deciding when to compact)
+        self._escritor = None
+
+    def restaurar(self):
+        """Loads the checkpoint into the server's games (call before serving). Returns how many lobbies came back."""
+        registros = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for linha in f:
+                    try:
+                        registro = json.loads(linha)
+                    except ValueError:
+                        continue # A torn last line from a crash
+                    registros[registro["room_id"]] = registro["lobby"]
+        for room_id, lobby in registros.items():
+            if lobby is None:
+                continue
+            self.server.games[room_id] = lobby_from_dict(lobby, self.server.verbose_games)
+            self._ultimas[room_id] = _linha(room_id, lobby)
+        self._compactar()
+        log.info(f"Restored {len(self._ultimas)} lobbies from {self.path}")
+        return len(self._ultimas)
+
+    def iniciar(self):
+        self._escritor = threading.Thread(target=self._escrever, name="checkpoint-writer", daemon=True)
+        self._escritor.start()
+
+    def ciclo(self):
+        """Snapshots the lobbies changed since the last cycle and hands them to the writer thread."""
+        alteradas = self.server.salas_alteradas
+        games = self.server.games
+        registros = []
+        while alteradas:
+            room_id = alteradas.pop() # Handlers may mark rooms meanwhile; those are picked up here or next cycle
+            with self.travas.travar(lambda: (room_id,), "checkpoint") if self.travas else contextlib.nullcontext():
+                lobby_data = games.get(room_id)
+                registros.append((room_id, lobby_to_dict(lobby_data) if lobby_data else None))
+        if registros:
+            self._fila.put(registros)
+
+    def rodar(self, sleep):
+        """Background loop for app.py: socketio.start_background_task(checkpointer.rodar, socketio.sleep)."""
+        while True:
+            sleep(self.interval)
+            self.ciclo()
+
+    async def rodar_async(self):
+        """Background task for async_app.py."""
+        while True:
+            await asyncio.sleep(self.interval)
+            self.ciclo()
+
+    def fechar(self):
+        """Writes what changed since the last cycle and stops the writer (clean shutdown)."""
+        self.ciclo()
+        if self._escritor is not None:
+            self._fila.put(None)
+            self._escritor.join()
+
+    # ── Writer thread ──────────────────────────────────────────────────────────
+    def _escrever(self):
+        arquivo = open(self.path, "a", encoding="utf-8")
+        try:
+            while True:
+                registros = self._fila.get()
+                if registros is None:
+                    return
+                linhas = []
+                for room_id, lobby in registros:
+                    linha = _linha(room_id, lobby)
+                    if lobby is None:
+                        self._ultimas.pop(room_id, None)
+                    else:
+                        self._ultimas[room_id] = linha
+                    linhas.append(linha)
+                bloco = "\n".join(linhas) + "\n"
+                arquivo.write(bloco)
+                arquivo.flush()
+                os.fsync(arquivo.fileno())
+                self._escritos += len(bloco)
+                if self._escritos > self.compactar_acima and self._escritos > 4 * sum(map(len, self._ultimas.values())):
+                    arquivo.close()
+                    self._compactar()
+                    arquivo = open(self.path, "a", encoding="utf-8")
+        finally:
+            arquivo.close()
+
+    def _compactar(self):
+        """Rewrites the file with only the latest record of each live lobby."""
+        temporario = self.path + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            for linha in self._ultimas.values():
+                f.write(linha + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, self.path)
+        self._escritos = sum(len(linha) + 1 for linha in self._ultimas.values())
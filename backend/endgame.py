@@ -0,0 +1,359 @@
+# backend/endgame.py
+"""
+Exact endgame solver for the card-play phase of a round.
+
+With every hand known (perfect information) and the bids made, the solver
+answers: how many lives can this player be sure to lose at most, and which
+card gets them there? It searches the rest of the round under the exact
+trick rules of FodinhaGame._determine_trick_winner (a tie outside the last
+trick scores nobody, raises truco_multiplier and the last player to play
+leads; in the last trick ties go by suit).
+
+Fodinha has more than two players and no zero-sum score, so the search is
+"paranoid": the player being solved for minimizes their own life loss while
+every other player is assumed to play against them. That makes it a plain
+two-sided alpha-beta search with a guaranteed result. On top of it:
+
+    transposition table   keyed by one packed int (hands, table, turn, the
+                          player's tricks, multiplier), storing bounds
+    move ordering         the table's best move, then strong or weak cards
+                          depending on whether the player still needs tricks
+    equivalent cards      two cards of one hand with no live card between
+                          them win and lose the same tricks: only one is tried
+    bounds                the loss is known once the points left can't change it
+
+benchmark.py's endgame_melhor_jogada case times the first card play of
+3-card rounds. With 6 players the median over its 40 deals was 20-50 ms
+depending on the seed (49 ms with the default seed), and single deals
+took up to about 0.4 s.
+
+    jogar_por_solver             play policy for simulation.py (falls back to
+                                 jogar_carta_mais_forte in long endgames)
+    python endgame.py games.log.jsonl --sala AB12CD   plays of a logged game that lost lives
+                                                      they didn't have to
+"""
+import json
+import argparse
+from game_logic import N_CARTAS_BARALHO, DESEMPATE_POR_CODIGO, INICIO_RODADA
+from simulation import jogar_carta_mais_forte
+from replay import reproduzir
+
+MAX_CARTAS_SOLVER = 3 # Cards per hand up to which jogar_por_solver searches
+_LARGURA = N_CARTAS_BARALHO # Bits per hand in the packed hands
+_MAO = (1 << _LARGURA) - 1
+_EXATO, _MINIMO, _MAXIMO = 0, 1, 2 # Transposition table entry: exact value, lower bound, upper bound
+
+def _cartas(mascara):
+    """Ranks of the cards in a hand mask, weakest first."""
+    while mascara:
+        bit = mascara & -mascara
+        yield bit.bit_length() - 1
+        mascara ^= bit
+
+class EndgameSolver:
+    """
+    Solver for the current round of a FodinhaGame in the waiting_card_play
+    phase. Cards are renumbered by rank, (strength, suit) under this round's
+    manilha, so comparisons and "no card in between" are bit operations.
+    The solver reads the game once; build a new one after the game moves on.
+    """
+    def __init__(self, game):
+        if game.round_phase != "waiting_card_play":
+            raise ValueError(f"Nothing to solve in phase {game.round_phase!r}")
+        self.game = game
+        self.jogadores = list(game.jogadores)
+        self.n = len(self.jogadores)
+        forcas = game.forcas_rodada_atual
+        ordem = sorted(range(N_CARTAS_BARALHO), key=lambda c: (forcas[c], DESEMPATE_POR_CODIGO[c]))
+        self._rank = {codigo: r for r, codigo in enumerate(ordem)}
+        self._forca = [forcas[c] for c in ordem] # Strength of each rank
+        # Lowest and highest rank with the same strength as each rank (the cards it can tie with)
+        self._inicio = [self._forca.index(f) for f in self._forca]
+        self._fim = [N_CARTAS_BARALHO - 1 - self._forca[::-1].index(f) for f in self._forca]
+        self.maos = 0
+        for assento, j in enumerate(self.jogadores):
+            for carta in game.maos_rodada_atual[j]:
+                self.maos |= 1 << (assento * _LARGURA + self._rank[carta.codigo])
+        self.mesa = tuple(self._rank[c.codigo] for _, c in game.cartas_na_mesa_rodada_atual)
+        self.vez = self.jogadores.index(game.jogador_da_vez_acao)
+        self._bits_vez = self.n.bit_length()
+        self.nos = 0 # Positions searched, for benchmarks
+        self._tt = {}  # assento -> {packed state: (valor, tipo, melhor rank)}
+
+    def perdas_por_jogada(self, player_id):
+        """{card index in the player's hand: guaranteed life loss if they play it now}; it must be their turn."""
+        assento = self._assento_da_vez(player_id)
+        mao = self.game.maos_rodada_atual[player_id]
+        return {i: self._resolver(assento, self._rank[c.codigo]) for i, c in enumerate(mao)}
+
+    def melhor_jogada(self, player_id):
+        """(card index, guaranteed life loss) of the best card for the player to move."""
+        assento = self._assento_da_vez(player_id)
+        indices = {}
+        for i, c in enumerate(self.game.maos_rodada_atual[player_id]):
+            indices.setdefault(self._rank[c.codigo], i)
+        melhor, perda = None, N_CARTAS_BARALHO + 1
+        for rank in self._resolver_ordem(assento):
+            # Only a strictly smaller loss matters, so each later card is searched with beta = best so far
+            valor = self._resolver(assento, rank, perda)
+            if valor < perda:
+                melhor, perda = indices[rank], valor
+                if perda == 0:
+                    break
+        return melhor, perda
+
+    def perda_garantida(self, player_id):
+        """The fewest lives the player can be sure to lose this round, whoever is to move."""
+        return self._resolver(self.jogadores.index(player_id))
+
+    def _assento_da_vez(self, player_id):
+        assento = self.jogadores.index(player_id)
+        if assento != self.vez:
+            raise ValueError(f"It is not {player_id}'s turn")
+        return assento
+
+    def _resolver(self, eu, rank=None, beta=N_CARTAS_BARALHO + 1):
+        """Search for player seat `eu`, optionally with the card the player to move plays fixed to `rank`."""
+        jogador = self.jogadores[eu]
+        return self._busca(self._tt.setdefault(eu, {}), eu, self.game.palpites_feitos_rodada_atual[jogador],
+                           self.maos, self.mesa, self.vez, self.game.vitorias_rodada_atual[jogador],
+                           self.game.truco_multiplier, -1, beta, rank)
+
+    def _resolver_ordem(self, eu):
+        jogador = self.jogadores[eu]
+        mao = (self.maos >> (eu * _LARGURA)) & _MAO
+        return self._ordem(self.game.palpites_feitos_rodada_atual[jogador], self.maos, self.mesa, eu,
+                           self.game.vitorias_rodada_atual[jogador], mao, -1)
+
+    # ── Search ─────────────────────────────────────────────────────────────────
+    def _busca(self, tt, eu, palpite, maos, mesa, vez, vitorias, mult, alpha, beta, apenas=None):
+        """
+        Fail-soft alpha-beta over the rest of the round, returning eu's life
+        loss. vez moves next; apenas restricts their move to one card (the root
+        of perdas_por_jogada), and such searches skip the transposition table.
+        """
+        self.nos += 1
+        n = self.n
+        mao = (maos >> (vez * _LARGURA)) & _MAO
+        cartas = mao.bit_count()
+        if cartas == 1:
+            # Last trick: every play is forced and the highest rank on the table wins it
+            vence = self._vence_ultima(eu, maos, mesa, vez)
+            return abs(vitorias + (mult if vence else 0) - palpite)
+        # Points still to be scored: one per trick left, plus the ties carried by the multiplier
+        restantes = cartas + mult - 1
+        minimo = max(0, palpite - vitorias - restantes, vitorias - palpite)
+        maximo = max(abs(vitorias - palpite), abs(vitorias + restantes - palpite))
+        if minimo == maximo or minimo >= beta:
+            return minimo
+        if maximo <= alpha:
+            return maximo
+
+        melhor_antes = -1
+        if apenas is None:
+            if mesa:
+                chave = ((((maos << 6 * n) | self._mesa_packed(mesa)) << self._bits_vez | vez) << 6 | vitorias) << 6 | mult
+                vivas = 0
+            else:
+                vivas, chave = self._chave_canonica(maos)
+                chave = ((chave << self._bits_vez | vez) << 6 | vitorias) << 6 | mult
+            entrada = tt.get(chave)
+            if entrada is not None:
+                valor, tipo, melhor_antes = entrada
+                if vivas and melhor_antes >= 0:
+                    melhor_antes = self._descanonizar(vivas, melhor_antes)
+                if tipo == _EXATO or (tipo == _MINIMO and valor >= beta) or (tipo == _MAXIMO and valor <= alpha):
+                    return valor
+                if tipo == _MINIMO:
+                    alpha = max(alpha, valor)
+                else:
+                    beta = min(beta, valor)
+            jogadas = self._ordem(palpite, maos, mesa, vez, vitorias, mao, melhor_antes)
+        else:
+            jogadas = (apenas,)
+
+        minimizando = vez == eu
+        alpha_inicial, beta_inicial = alpha, beta
+        melhor_valor = N_CARTAS_BARALHO + 1 if minimizando else -1
+        melhor_rank = -1
+        fecha = len(mesa) == n - 1
+        proximo = (vez + 1) % n
+        forca, inicio = self._forca, self._inicio
+        for rank in jogadas:
+            depois = maos ^ (1 << (vez * _LARGURA + rank))
+            if not fecha:
+                valor = self._busca(tt, eu, palpite, depois, mesa + (rank,), proximo, vitorias, mult, alpha, beta)
+            else:
+                # Trick complete (never the last one: that is handled above). The seat after vez led it.
+                cheia = mesa + (rank,)
+                maior = max(cheia)
+                if sum(r >= inicio[maior] for r in cheia) == 1:
+                    vencedor = (proximo + cheia.index(maior)) % n
+                    valor = self._busca(tt, eu, palpite, depois, (), vencedor,
+                                        vitorias + mult if vencedor == eu else vitorias, 1, alpha, beta)
+                else:
+                    # Tie: nobody scores, the multiplier goes up and vez, who played last, leads
+                    valor = self._busca(tt, eu, palpite, depois, (), vez, vitorias, mult + 1, alpha, beta)
+            if minimizando:
+                if valor < melhor_valor:
+                    melhor_valor, melhor_rank = valor, rank
+                    beta = min(beta, valor)
+            elif valor > melhor_valor:
+                melhor_valor, melhor_rank = valor, rank
+                alpha = max(alpha, valor)
+            if alpha >= beta:
+                break
+
+        if apenas is None:
+            if melhor_valor <= alpha_inicial:
+                tipo = _MAXIMO
+            elif melhor_valor >= beta_inicial:
+                tipo = _MINIMO
+            else:
+                tipo = _EXATO
+            if vivas and melhor_rank >= 0:
+                melhor_rank = (vivas & ((1 << melhor_rank) - 1)).bit_count()
+            tt[chave] = (melhor_valor, tipo, melhor_rank)
+        return melhor_valor
+
+    def _vence_ultima(self, eu, maos, mesa, vez):
+        """Whether `eu` takes the last trick, given the cards still in hand and those already on the table."""
+        lider = (vez - len(mesa)) % self.n
+        jogou = (eu - lider) % self.n
+        if jogou < len(mesa):
+            minha = mesa[jogou]
+        else:
+            minha = ((maos >> (eu * _LARGURA)) & _MAO).bit_length() - 1
+        if mesa and max(mesa) > minha:
+            return False
+        for assento in range(self.n):
+            if (maos >> (assento * _LARGURA)) & _MAO > (1 << minha):
+                return False
+        return True
+
+    def _chave_canonica(self, maos):
+        """
+        (live cards, key) between tricks. Only the order of the live cards, which
+        of them share a strength and who holds them matter, so ranks are closed
+        up over the cards already played: rounds that differ only in those
+        share an entry. Best moves in such entries are stored as closed-up ranks.
+        """
+        vivas = 0
+        for assento in range(self.n):
+            vivas |= (maos >> (assento * _LARGURA)) & _MAO
+        forca = self._forca
+        fronteiras = 0 # Bit k: the k-th live card is stronger than the one before it
+        anterior = None
+        k = 0
+        resto = vivas
+        while resto:
+            bit = resto & -resto
+            rank = bit.bit_length() - 1
+            if forca[rank] != anterior:
+                fronteiras |= 1 << k
+                anterior = forca[rank]
+            k += 1
+            resto ^= bit
+        chave = fronteiras
+        for assento in range(self.n):
+            mao = (maos >> (assento * _LARGURA)) & _MAO
+            fechada = 0
+            while mao:
+                bit = mao & -mao
+                fechada |= 1 << (vivas & (bit - 1)).bit_count()
+                mao ^= bit
+            chave = chave << k | fechada
+        return vivas, chave << 6 | k
+
+    @staticmethod
+    def _descanonizar(vivas, k):
+        """Rank of the k-th live card."""
+        for _ in range(k):
+            vivas &= vivas - 1
+        return (vivas & -vivas).bit_length() - 1
+
+    @staticmethod
+    def _mesa_packed(mesa):
+        packed = 0
+        for rank in mesa:
+            packed = packed << 6 | (rank + 1)
+        return packed
+
+    def _ordem(self, palpite, maos, mesa, vez, vitorias, mao, melhor_antes):
+        """Moves of `vez`: one card per run of equivalent cards, best guess first."""
+        vivas = 0
+        for assento in range(self.n):
+            if assento != vez:
+                vivas |= (maos >> (assento * _LARGURA)) & _MAO
+        for rank in mesa:
+            vivas |= 1 << rank
+        jogadas = []
+        anterior = -1
+        for rank in _cartas(mao):
+            # Same run as the previous card if no live card of anyone else lies between them, counting
+            # the cards either one ties with outside the last trick
+            if anterior >= 0 and self._forca[anterior] != self._forca[rank]:
+                de, ate = self._inicio[anterior], self._fim[rank]
+            else:
+                de, ate = anterior + 1, rank - 1
+            if anterior < 0 or (vivas >> de) & ((1 << (ate - de + 1)) - 1):
+                jogadas.append(rank)
+            else:
+                jogadas[-1] = rank # Keep the strongest of the run
+            anterior = rank
+        # Under their bid the player wants tricks and the others want to take them away;
+        # at or over it, everyone tries to leave the tricks to the player
+        if vitorias < palpite:
+            jogadas.reverse()
+        if melhor_antes in jogadas:
+            jogadas.remove(melhor_antes)
+            jogadas.insert(0, melhor_antes)
+        return jogadas
+
+# ── Bot policy ─────────────────────────────────────────────────────────────────
+def jogar_por_solver(game, player_id, rng):
+    """Play policy (simulation.py signature): the card with the smallest guaranteed loss once hands are short."""
+    if len(game.maos_rodada_atual[player_id]) > MAX_CARTAS_SOLVER:
+        return jogar_carta_mais_forte(game, player_id, rng)
+    return EndgameSolver(game).melhor_jogada(player_id)[0]
+
+# ── Post-game analysis ─────────────────────────────────────────────────────────
+def analisar_partida(registro, max_cartas=MAX_CARTAS_SOLVER):
+    """
+    Replays a game log record and solves every card play made with at most
+    max_cartas cards in hand. Returns the plays that risked more lives than
+    the best card would have: [(passo, jogador, indice jogado, perda garantida, melhor indice, melhor perda)].
+    """
+    game = reproduzir(dict(registro, acoes=[]))
+    erros = []
+    for passo, acao in enumerate(registro["acoes"]):
+        if acao != INICIO_RODADA and game.round_phase == "waiting_card_play":
+            jogador = game.jogador_da_vez_acao
+            if len(game.maos_rodada_atual[jogador]) <= max_cartas:
+                perdas = EndgameSolver(game).perdas_por_jogada(jogador)
+                melhor = min(perdas, key=perdas.get)
+                if perdas[acao] > perdas[melhor]:
+                    erros.append((passo, jogador, acao, perdas[acao], melhor, perdas[melhor]))
+        if acao == INICIO_RODADA:
+            game.start_new_round()
+        elif game.round_phase == "waiting_palpites":
+            game.submit_palpite(game.jogador_da_vez_acao, acao)
+        else:
+            game.submit_card_play(game.jogador_da_vez_acao, acao)
+    return erros
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find card plays that lost avoidable lives in a logged Fodinha game.")
+    parser.add_argument("path")
+    parser.add_argument("--sala", required=True, help="Room of the game (the last one logged for it)")
+    parser.add_argument("--max-cartas", type=int, default=MAX_CARTAS_SOLVER)
+    args = parser.parse_args()
+
+    with open(args.path, encoding="utf-8") as f:
+        registros = [r for r in map(json.loads, filter(str.strip, f)) if r["room_id"] == args.sala]
+    if not registros:
+        raise SystemExit(f"No game logged for room {args.sala}")
+    erros = analisar_partida(registros[-1], args.max_cartas)
+    for passo, jogador, jogada, perda, melhor, melhor_perda in erros:
+        print(f"acao {passo}: {jogador} jogou a carta {jogada} (perde ate {perda}), a carta {melhor} perderia ate {melhor_perda}")
+    print(f"{len(erros)} jogadas evitaveis")
@@ -7,22 +7,73 @@ ORDEM_CARTAS = {v: i for i, v in enumerate(VALORES)}
 ORDEM_NAIPE_MANILHA = {'♦': 0, '♠': 1, '♥': 2, '♣': 3}
 ORDEM_NAIPE_DESEMPATE = {'♣': 3, '♥': 2, '♠': 1, '♦': 0}
 
+# ── Integer card encoding ──────────────────────────────────────────────────────
+# Every card has a code 0..39: codigo = indice_do_valor * 4 + indice_do_naipe,
+# which is also its position in the unshuffled deck built by criar_baralho.
+N_CARTAS_BARALHO = len(VALORES) * len(NAIPES)
+SEM_MANILHA = len(VALORES) # Row of FORCA_POR_MANILHA used when there is no manilha
+
+def _forca_do_codigo(codigo, manilha_idx):
+    valor_idx, naipe = codigo // len(NAIPES), NAIPES[codigo % len(NAIPES)]
+    if valor_idx == manilha_idx:
+        return 100 + ORDEM_NAIPE_MANILHA[naipe]
+    return valor_idx
+
+# FORCA_POR_MANILHA[indice_da_manilha][codigo] -> card strength (same values as Carta.forca)
+FORCA_POR_MANILHA = tuple(tuple(_forca_do_codigo(c, m) for c in range(N_CARTAS_BARALHO)) for m in range(len(VALORES) + 1))
+DESEMPATE_POR_CODIGO = tuple(ORDEM_NAIPE_DESEMPATE[NAIPES[c % len(NAIPES)]] for c in range(N_CARTAS_BARALHO))
+MANILHA_POR_CODIGO = tuple((c // len(NAIPES) + 1) % len(VALORES) for c in range(N_CARTAS_BARALHO))
+
+# ── Action log ─────────────────────────────────────────────────────────────────
+# FodinhaGame.acoes records every accepted action, in order: INICIO_RODADA for
+# start_new_round, and a bare int for a bid (during waiting_palpites) or for the
+# index of the card played (during waiting_card_play). Who acted follows from
+# the turn order, so seed + acoes rebuild the whole game (see replay.py).
+INICIO_RODADA = "R"
+
 class Carta:
+    __slots__ = ("valor", "naipe", "codigo", "nome")
     def __init__(self, valor, naipe):
         self.valor, self.naipe = valor, naipe
-    def __repr__(self): return f'{self.valor}{self.naipe}'
+        self.codigo = ORDEM_CARTAS[valor] * len(NAIPES) + NAIPES.index(naipe)
+        self.nome = f'{valor}{naipe}' # Precomputed string form used at the serialization boundary
+    def __repr__(self): return self.nome
+    def __reduce__(self): return (carta_por_codigo, (self.codigo,)) # Unpickles to the shared singleton
     def forca(self, manilha=None):
-        if manilha and self.valor == manilha:
-            return 100 + ORDEM_NAIPE_MANILHA[self.naipe]
-        return ORDEM_CARTAS[self.valor]
+        return FORCA_POR_MANILHA[ORDEM_CARTAS[manilha] if manilha else SEM_MANILHA][self.codigo]
+
+# One shared, immutable Carta per code; decks are shuffled lists of these.
+CARTAS = tuple(Carta(v, n) for v in VALORES for n in NAIPES)
+
+def carta_por_codigo(codigo):
+    return CARTAS[codigo]
+
+def forcas_da_manilha(manilha):
+    """Strength table (indexed by card code) for a round whose manilha is `manilha`."""
+    return FORCA_POR_MANILHA[ORDEM_CARTAS[manilha] if manilha else SEM_MANILHA]
 
-def criar_baralho():
-    baralho = [Carta(v, n) for v in VALORES for n in NAIPES]
-    random.shuffle(baralho)
+def criar_baralho(rng=random):
+    baralho = list(CARTAS)
+    rng.shuffle(baralho)
     return deque(baralho)
 
 def definir_manilha(carta_meio):
-    return VALORES[(VALORES.index(carta_meio.valor)+1) % len(VALORES)]
+    return VALORES[MANILHA_POR_CODIGO[carta_meio.codigo]]
+
+def proxima_quantidade_cartas(cartas, crescendo, n_cartas_jogadas, max_cartas):
+    """Card count progression between rounds: returns (cartas, crescendo) for the next round."""
+    cartas += 1 if crescendo else -1
+    if cartas >= max_cartas:
+        crescendo = False
+        cartas = max_cartas # Adjust to play max_cartas then decrease
+        if n_cartas_jogadas == max_cartas: # if we just played max cards
+            cartas = max_cartas - 1
+    elif cartas < 1: # Should be 1
+        crescendo = True
+        cartas = 1 # Adjust to play 1 then increase
+        if n_cartas_jogadas == 1 and not crescendo: # if we just played 1 card going down
+            cartas = 2
+    return cartas, crescendo
 
 def simular_rodada(jogadores, n_cartas, vidas, dealer_idx):
     print("\n🎲 Nova Rodada")
@@ -121,15 +172,25 @@ def simular_rodada(jogadores, n_cartas, vidas, dealer_idx):
     return True
 
 class FodinhaGame:
-    def __init__(self, player_ids, initial_lives=3):
+    def __init__(self, player_ids, initial_lives=3, rng=None, verbose=True, seed=None):
+        # rng: any object with random.Random's shuffle/randint (e.g. random.Random(seed)).
+        # seed: deal from random.Random(seed) when no rng is given; seed + acoes then reproduce the game.
+        # verbose=False silences every print, which is what headless simulations want.
+        if rng is None and seed is not None:
+            rng = random.Random(seed)
+        self.rng = rng if rng is not None else random
+        self.seed = seed
+        self.acoes = [] # Append-only action log, see INICIO_RODADA
+        self.verbose = verbose
         self.jogadores = player_ids
         self.initial_lives = initial_lives
         self.vidas = {j: initial_lives for j in self.jogadores}
         
-        self.dealer_idx_global = random.randint(0, len(self.jogadores) - 1) # Overall game dealer index
+        self.dealer_idx_global = self.rng.randint(0, len(self.jogadores) - 1) # Overall game dealer index
         self.cartas_global = 1 # Overall game card count progression
         self.crescendo_global = True # Overall game card count direction
-        self.max_cartas_global = len(VALORES) * len(NAIPES) // len(self.jogadores) if self.jogadores else 0
+        # One card is always set aside as carta_meio, so it can't be dealt
+        self.max_cartas_global = (len(VALORES) * len(NAIPES) - 1) // len(self.jogadores) if self.jogadores else 0
         self.game_over_global = False
 
         # --- Round-specific state ---
@@ -138,6 +199,7 @@ class FodinhaGame:
         self.n_cartas_rodada_atual = 0
         self.carta_meio_rodada_atual = None
         self.manilha_rodada_atual = None
+        self.forcas_rodada_atual = FORCA_POR_MANILHA[SEM_MANILHA] # Strength table for manilha_rodada_atual
         self.maos_rodada_atual = {}
         
         self.ordem_palpites_rodada_atual = deque()
@@ -152,17 +214,111 @@ class FodinhaGame:
         self.truco_multiplier = 1 # For future truco implementation
         self.rodada_atual_num_tricks = 0 # How many tricks played in current round
 
+        # --- View caches ---
+        # state_version goes up on every mutation; get_game_state/get_player_game_state
+        # rebuild only when it changed, so repeated reads between actions are free.
+        self.state_version = 0
+        self._public_state_cache = None
+        self._player_view_cache = {}
+
+    # Pickled by multi-process lobby stores (stores.py). Caches and the strength table
+    # are rebuilt on load, and the global random module (the default rng) can't be pickled.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_public_state_cache"], state["_player_view_cache"], state["forcas_rodada_atual"]
+        if state["rng"] is random:
+            state["rng"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault("seed", None) # Pickled before games had an action log
+        self.__dict__.setdefault("acoes", [])
+        if self.rng is None:
+            self.rng = random
+        self.forcas_rodada_atual = forcas_da_manilha(self.manilha_rodada_atual)
+        self._public_state_cache = None
+        self._player_view_cache = {}
+
+    # Compact JSON-ready form (cards as integer codes) used by checkpoints (checkpoint.py).
+    def to_dict(self):
+        carta_meio = self.carta_meio_rodada_atual
+        return {
+            "jogadores": list(self.jogadores),
+            "initial_lives": self.initial_lives,
+            "vidas": dict(self.vidas),
+            "dealer_idx_global": self.dealer_idx_global,
+            "cartas_global": self.cartas_global,
+            "crescendo_global": self.crescendo_global,
+            "max_cartas_global": self.max_cartas_global,
+            "game_over_global": self.game_over_global,
+            "round_phase": self.round_phase,
+            "dealer_rodada_atual": self.dealer_rodada_atual,
+            "n_cartas_rodada_atual": self.n_cartas_rodada_atual,
+            "carta_meio_rodada_atual": carta_meio.codigo if carta_meio is not None else None,
+            "maos_rodada_atual": {j: [c.codigo for c in mao] for j, mao in self.maos_rodada_atual.items()},
+            "ordem_palpites_rodada_atual": list(self.ordem_palpites_rodada_atual),
+            "palpites_feitos_rodada_atual": dict(self.palpites_feitos_rodada_atual),
+            "soma_palpites_rodada_atual": self.soma_palpites_rodada_atual,
+            "jogador_da_vez_palpite": self.jogador_da_vez_palpite,
+            "vitorias_rodada_atual": dict(self.vitorias_rodada_atual),
+            "cartas_na_mesa_rodada_atual": [[j, c.codigo] for j, c in self.cartas_na_mesa_rodada_atual],
+            "historico_cartas_rodada": {j: list(nomes) for j, nomes in self.historico_cartas_rodada.items()},
+            "jogador_da_vez_acao": self.jogador_da_vez_acao,
+            "truco_multiplier": self.truco_multiplier,
+            "rodada_atual_num_tricks": self.rodada_atual_num_tricks,
+            "state_version": self.state_version,
+            "seed": self.seed,
+            "acoes": list(self.acoes),
+        }
+
+    @classmethod
+    def from_dict(cls, data, rng=None, verbose=True):
+        """Rebuilds a game saved with to_dict(); it continues exactly where it stopped."""
+        game = cls(data["jogadores"], data["initial_lives"], rng=rng, verbose=verbose, seed=data.get("seed"))
+        game.acoes = list(data.get("acoes", ()))
+        if rng is None and game.seed is not None:
+            # Advance the seeded rng past the deals already made, so later rounds deal as they would have
+            for _ in range(game.acoes.count(INICIO_RODADA)):
+                criar_baralho(game.rng)
+        for campo in ("dealer_idx_global", "cartas_global", "crescendo_global", "max_cartas_global", "game_over_global",
+                      "round_phase", "dealer_rodada_atual", "n_cartas_rodada_atual", "soma_palpites_rodada_atual",
+                      "jogador_da_vez_palpite", "jogador_da_vez_acao", "truco_multiplier", "rodada_atual_num_tricks",
+                      "state_version"):
+            setattr(game, campo, data[campo])
+        game.vidas = dict(data["vidas"])
+        carta_meio = data["carta_meio_rodada_atual"]
+        game.carta_meio_rodada_atual = CARTAS[carta_meio] if carta_meio is not None else None
+        game.manilha_rodada_atual = definir_manilha(game.carta_meio_rodada_atual) if carta_meio is not None else None
+        game.forcas_rodada_atual = forcas_da_manilha(game.manilha_rodada_atual)
+        game.maos_rodada_atual = {j: [CARTAS[c] for c in mao] for j, mao in data["maos_rodada_atual"].items()}
+        game.ordem_palpites_rodada_atual = deque(data["ordem_palpites_rodada_atual"])
+        game.palpites_feitos_rodada_atual = dict(data["palpites_feitos_rodada_atual"])
+        game.vitorias_rodada_atual = dict(data["vitorias_rodada_atual"])
+        game.cartas_na_mesa_rodada_atual = [(j, CARTAS[c]) for j, c in data["cartas_na_mesa_rodada_atual"]]
+        game.historico_cartas_rodada = {j: list(nomes) for j, nomes in data["historico_cartas_rodada"].items()}
+        return game
+
+    def _bump_version(self):
+        """Marks the state as changed, dropping views cached for older versions."""
+        self.state_version += 1
+        self._public_state_cache = None
+        self._player_view_cache = {}
+
     def start_new_round(self):
         if self.game_over_global:
             return False # Game is over
 
+        self._bump_version()
+        self.acoes.append(INICIO_RODADA)
         self.round_phase = "waiting_palpites"
         self.dealer_rodada_atual = self.jogadores[self.dealer_idx_global]
         self.n_cartas_rodada_atual = self.cartas_global
 
-        baralho = criar_baralho()
+        baralho = criar_baralho(self.rng)
         self.carta_meio_rodada_atual = baralho.popleft()
         self.manilha_rodada_atual = definir_manilha(self.carta_meio_rodada_atual)
+        self.forcas_rodada_atual = forcas_da_manilha(self.manilha_rodada_atual)
         
         self.maos_rodada_atual = {j: [baralho.popleft() for _ in range(self.n_cartas_rodada_atual)] for j in self.jogadores}
         
@@ -184,9 +340,10 @@ class FodinhaGame:
             self.jogador_da_vez_acao = None
             self.round_phase = "error" # Or handle appropriately
         
-        print(f"🎲 Nova Rodada Iniciada. Dealer: {self.dealer_rodada_atual}, Cartas: {self.n_cartas_rodada_atual}, Manilha: {self.manilha_rodada_atual}")
-        print(f"Mãos: {self.maos_rodada_atual}")
-        print(f"Primeiro a palpitar: {self.jogador_da_vez_acao}")
+        if self.verbose:
+            print(f"🎲 Nova Rodada Iniciada. Dealer: {self.dealer_rodada_atual}, Cartas: {self.n_cartas_rodada_atual}, Manilha: {self.manilha_rodada_atual}")
+            print(f"Mãos: {self.maos_rodada_atual}")
+            print(f"Primeiro a palpitar: {self.jogador_da_vez_acao}")
         return True
 
     def submit_palpite(self, player_id, palpite):
@@ -207,9 +364,11 @@ class FodinhaGame:
         if is_ultimo_a_palpitar and (self.soma_palpites_rodada_atual + palpite_num == self.n_cartas_rodada_atual):
             return {"success": False, "error": "Último palpite não pode fazer a soma igual ao número de cartas."}
 
+        self._bump_version()
+        self.acoes.append(palpite_num)
         self.palpites_feitos_rodada_atual[player_id] = palpite_num
         self.soma_palpites_rodada_atual += palpite_num
-        print(f"Palpite de {player_id}: {palpite_num}. Palpites feitos: {self.palpites_feitos_rodada_atual}")
+        if self.verbose: print(f"Palpite de {player_id}: {palpite_num}. Palpites feitos: {self.palpites_feitos_rodada_atual}")
 
         if self.ordem_palpites_rodada_atual:
             self.jogador_da_vez_acao = self.ordem_palpites_rodada_atual.popleft()
@@ -221,7 +380,7 @@ class FodinhaGame:
             # This needs to follow actual game rules for who starts playing.
             idx_primeiro_palpite = (self.dealer_idx_global + 1) % len(self.jogadores)
             self.jogador_da_vez_acao = self.jogadores[idx_primeiro_palpite] # Placeholder for actual play order start
-            print(f"Todos palpitaram. Próxima fase: Jogar cartas. Começa: {self.jogador_da_vez_acao}")
+            if self.verbose: print(f"Todos palpitaram. Próxima fase: Jogar cartas. Começa: {self.jogador_da_vez_acao}")
 
 
         return {"success": True, "next_player_to_bet": self.jogador_da_vez_acao if self.round_phase == "waiting_palpites" else None, "all_palpites_done": self.round_phase == "waiting_card_play"}
@@ -242,17 +401,19 @@ class FodinhaGame:
         if card_index < 0 or card_index >= len(player_hand):
             return {"success": False, "error": f"Índice de carta inválido: {card_index}"}
         
+        self._bump_version()
+        self.acoes.append(card_index)
         # Get the played card and remove it from hand
         card_played = player_hand.pop(card_index)
-        print(f"Jogador {player_id} jogou a carta {card_played}")
+        if self.verbose: print(f"Jogador {player_id} jogou a carta {card_played}")
         
         # Add card to mesa_rodada_atual with player who played it
         self.cartas_na_mesa_rodada_atual.append((player_id, card_played))
         # Add to round history
         if player_id in self.historico_cartas_rodada:
-            self.historico_cartas_rodada[player_id].append(str(card_played))
+            self.historico_cartas_rodada[player_id].append(card_played.nome)
         else: # Should not happen if initialized correctly in start_new_round
-            self.historico_cartas_rodada[player_id] = [str(card_played)]
+            self.historico_cartas_rodada[player_id] = [card_played.nome]
         
         # Determine next player
         next_player_idx = (self.jogadores.index(player_id) + 1) % len(self.jogadores)
@@ -302,14 +463,15 @@ class FodinhaGame:
         if not self.cartas_na_mesa_rodada_atual:
             return None
             
-        print(f"Determining winner for trick: {self.cartas_na_mesa_rodada_atual}")
+        if self.verbose: print(f"Determining winner for trick: {self.cartas_na_mesa_rodada_atual}")
         
-        # Find highest card based on manilha rules
+        # Find highest card based on manilha rules (precomputed per-manilha strength table)
+        forcas = self.forcas_rodada_atual
         highest_strength = -1
         current_winners = []
         
         for player_id, card in self.cartas_na_mesa_rodada_atual:
-            card_strength = card.forca(self.manilha_rodada_atual)
+            card_strength = forcas[card.codigo]
             
             if card_strength > highest_strength:
                 highest_strength = card_strength
@@ -321,13 +483,13 @@ class FodinhaGame:
         if len(current_winners) == 1:
             winner_id = current_winners[0][0]
             winner_card = current_winners[0][1]
-            print(f"Player {winner_id} wins the trick with {winner_card}")
+            if self.verbose: print(f"Player {winner_id} wins the trick with {winner_card}")
             self.vitorias_rodada_atual[winner_id] += self.truco_multiplier  # Award points based on multiplier
             self.truco_multiplier = 1  # Reset multiplier
             return winner_id
             
         # If there's a tie, handle based on rules
-        print(f"Tie between cards: {current_winners}")
+        if self.verbose: print(f"Tie between cards: {current_winners}")
         
         # For the last trick, resolve by naipe
         if self.rodada_atual_num_tricks == self.n_cartas_rodada_atual - 1:
@@ -336,18 +498,18 @@ class FodinhaGame:
             best_naipe_value = -1
             
             for player_id, card in current_winners:
-                naipe_value = ORDEM_NAIPE_DESEMPATE[card.naipe]
+                naipe_value = DESEMPATE_POR_CODIGO[card.codigo]
                 if naipe_value > best_naipe_value:
                     best_naipe_value = naipe_value
                     best_naipe_player = player_id
                     
-            print(f"Last trick tie resolved by naipe. Winner: {best_naipe_player}")
+            if self.verbose: print(f"Last trick tie resolved by naipe. Winner: {best_naipe_player}")
             self.vitorias_rodada_atual[best_naipe_player] += self.truco_multiplier
             self.truco_multiplier = 1
             return best_naipe_player
         
         # For non-last tricks, no winner, increase multiplier
-        print(f"No winner for this trick. Increasing multiplier to {self.truco_multiplier + 1}")
+        if self.verbose: print(f"No winner for this trick. Increasing multiplier to {self.truco_multiplier + 1}")
         self.truco_multiplier += 1
         
         # Next player is the last who played in the trick
@@ -356,34 +518,23 @@ class FodinhaGame:
     def _calculate_round_results(self):
         # This function will be called after all cards in a round are played
         # It replaces the scoring logic from the end of old simular_rodada
-        print("\n📊 Calculando resultados da rodada...")
+        self._bump_version()
+        if self.verbose: print("\n📊 Calculando resultados da rodada...")
         for j_id in self.jogadores:
             diff = abs(self.vitorias_rodada_atual.get(j_id, 0) - self.palpites_feitos_rodada_atual.get(j_id, -1)) # -1 if palpite somehow missing
             self.vidas[j_id] -= diff
-            print(f"Jogador {j_id}: Vitórias {self.vitorias_rodada_atual.get(j_id,0)}, Palpite {self.palpites_feitos_rodada_atual.get(j_id,'N/A')} → Vidas: {self.vidas[j_id]}")
+            if self.verbose: print(f"Jogador {j_id}: Vitórias {self.vitorias_rodada_atual.get(j_id,0)}, Palpite {self.palpites_feitos_rodada_atual.get(j_id,'N/A')} → Vidas: {self.vidas[j_id]}")
 
         mortos = [j for j, v in self.vidas.items() if v <= 0]
         if mortos:
-            print("\n💀 Jogadores eliminados:", ", ".join(map(str, mortos)), ". Fim de jogo.")
+            if self.verbose: print("\n💀 Jogadores eliminados:", ", ".join(map(str, mortos)), ". Fim de jogo.")
             self.game_over_global = True
             self.round_phase = "game_over"
             return False # Indicates game is over
 
         # Update global game state for the next round
-        self.cartas_global += 1 if self.crescendo_global else -1
-        if self.cartas_global >= self.max_cartas_global:
-            self.crescendo_global = False
-            self.cartas_global = self.max_cartas_global # Adjust to play max_cartas then decrease
-            if self.n_cartas_rodada_atual == self.max_cartas_global : # if we just played max cards
-                 self.cartas_global = self.max_cartas_global -1
-
-
-        elif self.cartas_global < 1: # Should be 1
-            self.crescendo_global = True
-            self.cartas_global = 1 # Adjust to play 1 then increase
-            if self.n_cartas_rodada_atual == 1 and not self.crescendo_global: # if we just played 1 card going down
-                 self.cartas_global = 2
-
+        self.cartas_global, self.crescendo_global = proxima_quantidade_cartas(
+            self.cartas_global, self.crescendo_global, self.n_cartas_rodada_atual, self.max_cartas_global)
 
         self.dealer_idx_global = (self.dealer_idx_global + 1) % len(self.jogadores)
         self.round_phase = "round_over" # Ready for a new round to be started
@@ -393,9 +544,16 @@ class FodinhaGame:
         # Sensitive information like full hands of other players should be filtered by the server
         # before sending to a specific client.
         # For now, this sends more than it should for simplicity of backend.
+        # Built once per state_version; callers get a shallow copy they may add keys to.
+        if self._public_state_cache is None:
+            self._public_state_cache = self._build_game_state()
+        return dict(self._public_state_cache)
+
+    def _build_game_state(self):
+        # Containers are copied so cached views never change under a reader
         return {
-            'players': self.jogadores,
-            'lives': self.vidas,
+            'players': list(self.jogadores),
+            'lives': dict(self.vidas),
             'current_dealer_global': self.jogadores[self.dealer_idx_global], # Overall game dealer
             'cards_next_round_global': self.cartas_global, # Cards for next round
             'game_over_global': self.game_over_global,
@@ -404,15 +562,15 @@ class FodinhaGame:
             'round_phase': self.round_phase,
             'dealer_rodada_atual': self.dealer_rodada_atual,
             'n_cartas_rodada_atual': self.n_cartas_rodada_atual,
-            'carta_meio_rodada_atual': str(self.carta_meio_rodada_atual) if self.carta_meio_rodada_atual else None,
+            'carta_meio_rodada_atual': self.carta_meio_rodada_atual.nome if self.carta_meio_rodada_atual else None,
             'manilha_rodada_atual': self.manilha_rodada_atual,
-            'maos_rodada_atual': {p: [str(c) for c in hand] for p, hand in self.maos_rodada_atual.items()}, # Convert cards to string for serialization
-            'palpites_feitos_rodada_atual': self.palpites_feitos_rodada_atual,
+            'maos_rodada_atual': {p: [c.nome for c in hand] for p, hand in self.maos_rodada_atual.items()}, # Convert cards to string for serialization
+            'palpites_feitos_rodada_atual': dict(self.palpites_feitos_rodada_atual),
             'soma_palpites_rodada_atual': self.soma_palpites_rodada_atual,
             'jogador_da_vez_acao': self.jogador_da_vez_acao, # Player whose turn it is for current action
-            'vitorias_rodada_atual': self.vitorias_rodada_atual, # Trick wins in current round
-            'cartas_na_mesa_rodada_atual': [(p, str(c)) for p, c in self.cartas_na_mesa_rodada_atual], # Cards on table for current trick
-            'historico_cartas_rodada': self.historico_cartas_rodada # All cards played in the round
+            'vitorias_rodada_atual': dict(self.vitorias_rodada_atual), # Trick wins in current round
+            'cartas_na_mesa_rodada_atual': [(p, c.nome) for p, c in self.cartas_na_mesa_rodada_atual], # Cards on table for current trick
+            'historico_cartas_rodada': {p: list(h) for p, h in self.historico_cartas_rodada.items()} # All cards played in the round
         }
         
     def get_player_game_state(self, player_id):
@@ -422,13 +580,21 @@ class FodinhaGame:
         - In 1-card rounds during palpite phase: Players can't see their own card but can see all others'
         - In 1-card rounds during card play phase: Players can see all cards including their own
         - In 2+ card rounds: Players can only see their own cards
+        Views are cached per player until the next state change.
         """
+        cached_view = self._player_view_cache.get(player_id)
+        if cached_view is None:
+            cached_view = self._player_view_cache[player_id] = self._build_player_game_state(player_id)
+        return dict(cached_view)
+
+    def _build_player_game_state(self, player_id):
         # Start with the base game state
         game_state = self.get_game_state()
         
         # Debug what we're starting with
-        print(f"[DEBUG] get_player_game_state for {player_id}, n_cartas={self.n_cartas_rodada_atual}, phase={self.round_phase}")
-        print(f"[DEBUG] Original maos_rodada_atual: {game_state['maos_rodada_atual']}")
+        if self.verbose:
+            print(f"[DEBUG] get_player_game_state for {player_id}, n_cartas={self.n_cartas_rodada_atual}, phase={self.round_phase}")
+            print(f"[DEBUG] Original maos_rodada_atual: {game_state['maos_rodada_atual']}")
         
         # Apply card visibility rules - filter maos_rodada_atual
         filtered_hands = {}
@@ -441,31 +607,31 @@ class FodinhaGame:
                     if p == player_id:
                         # Hide the player's own card during betting
                         filtered_hands[p] = ["HIDDEN"]
-                        print(f"[DEBUG] Hiding {player_id}'s own card in 1-card round during palpite phase")
+                        if self.verbose: print(f"[DEBUG] Hiding {player_id}'s own card in 1-card round during palpite phase")
                     else:
                         # Show other players' cards
                         filtered_hands[p] = hand
-                        print(f"[DEBUG] Showing {p}'s card to {player_id}: {hand}")
+                        if self.verbose: print(f"[DEBUG] Showing {p}'s card to {player_id}: {hand}")
             else:
                 # During card play or other phases: Show all cards including player's own
                 filtered_hands = game_state['maos_rodada_atual']
-                print(f"[DEBUG] Showing all cards including own in 1-card round during {self.round_phase} phase")
+                if self.verbose: print(f"[DEBUG] Showing all cards including own in 1-card round during {self.round_phase} phase")
         else:
             # In 2+ card rounds, only show player's own cards
             for p in self.jogadores:
                 if p == player_id:
                     # Show the player's own hand
                     filtered_hands[p] = game_state['maos_rodada_atual'].get(p, [])
-                    print(f"[DEBUG] Showing {player_id}'s own cards in multi-card round: {filtered_hands[p]}")
+                    if self.verbose: print(f"[DEBUG] Showing {player_id}'s own cards in multi-card round: {filtered_hands[p]}")
                 else:
                     # Hide other players' cards, but indicate count
                     cards_count = len(game_state['maos_rodada_atual'].get(p, []))
                     filtered_hands[p] = ["HIDDEN"] * cards_count
-                    print(f"[DEBUG] Hiding {p}'s {cards_count} cards from {player_id}")
+                    if self.verbose: print(f"[DEBUG] Hiding {p}'s {cards_count} cards from {player_id}")
         
         # Replace the hands in the game state
         game_state['maos_rodada_atual'] = filtered_hands
-        print(f"[DEBUG] Final filtered hands for {player_id}: {filtered_hands}")
+        if self.verbose: print(f"[DEBUG] Final filtered hands for {player_id}: {filtered_hands}")
         
         # Add metadata about what the player can see based on current phase
         game_state['can_see_own_cards'] = (self.n_cartas_rodada_atual > 1) or (self.round_phase != "waiting_palpites")
@@ -473,6 +639,22 @@ class FodinhaGame:
         
         return game_state
 
+    def get_public_game_state(self):
+        """
+        Game state with only what everyone may see, for spectators (see spectators.py).
+        Hands are hidden card counts, except in 1-card rounds once bidding is over,
+        when every player sees every card anyway. Cached like the player views.
+        """
+        cached_view = self._player_view_cache.get(None)
+        if cached_view is None:
+            game_state = self.get_game_state()
+            if self.n_cartas_rodada_atual != 1 or self.round_phase == "waiting_palpites":
+                game_state['maos_rodada_atual'] = {p: ["HIDDEN"] * len(hand) for p, hand in game_state['maos_rodada_atual'].items()}
+            game_state['can_see_own_cards'] = False
+            game_state['can_see_others_cards'] = self.n_cartas_rodada_atual == 1 and self.round_phase != "waiting_palpites"
+            cached_view = self._player_view_cache[None] = game_state
+        return dict(cached_view)
+
 # --- This part is for local command-line testing if needed, not directly used by server ---
 if __name__ == "__main__":
     # Example usage for testing FodinhaGame directly (won't use simular_rodada)
@@ -0,0 +1,226 @@
+# backend/load_test.py
+"""
+Load generator: keeps M concurrent tables playing against a running app.py.
+
+Every simulated player is a real Socket.IO client speaking the same protocol
+as static/player.html (create_lobby, join_lobby, start_game,
+submit_palpite_action, submit_card_action, request_next_round_action). Bots
+make legal bids and play their first card; hosts start a new round (or a new
+game) as soon as one ends, so tables never go idle.
+
+Reports actions/sec, end-to-end action latency percentiles (from emitting an
+action to receiving the game_update it caused) and error rates.
+
+    python app.py &
+    python load_test.py --tables 50 --players 4 --duration 60
+
+--url takes a comma-separated list to spread each table's players over several
+worker processes sharing a store (see stores.py). --batch makes the bots ask
+for one message per action (see batching.py), --binary for binary game-state
+payloads with compression (see wire.py). --spectators N adds N watching
+sockets per table (see spectators.py) and counts the updates they get.
+
+Bots with no think time act far faster than people, so the server's rate
+limits (see rate_limits.py) refuse some of their actions. Those count as
+errors and are retried once the limit allows.
+Start the server with FODINHA_RATE_LIMITS=off to measure raw throughput.
+
+Needs the asyncio Socket.IO client: pip install "python-socketio[asyncio_client]"
+"""
+import time
+import random
+import asyncio
+import argparse
+import socketio
+from wire import decodificar
+
+class Stats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.actions = 0
+        self.latencies = []
+        self.errors = 0
+        self.rounds = 0
+        self.games = 0
+        self.spectator_updates = 0
+
+    def percentile(self, q):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def report(self, title):
+        elapsed = time.perf_counter() - self.started
+        error_rate = self.errors / (self.actions + self.errors) if self.actions + self.errors else 0.0
+        print(f"[{title}] {elapsed:6.1f}s  actions={self.actions} ({self.actions / elapsed:.1f}/s)  "
+              f"rounds={self.rounds}  games={self.games}  "
+              f"p50={self.percentile(0.5) * 1000:.1f}ms p90={self.percentile(0.9) * 1000:.1f}ms "
+              f"p99={self.percentile(0.99) * 1000:.1f}ms max={max(self.latencies, default=0) * 1000:.1f}ms  "
+              f"errors={self.errors} ({error_rate:.2%})  spectator_updates={self.spectator_updates}")
+
+class BotPlayer:
+    def __init__(self, player_id, url, stats, rng, think_time, is_host):
+        self.player_id = player_id
+        self.url = url
+        self.stats = stats
+        self.rng = rng
+        self.think_time = think_time
+        self.is_host = is_host
+        self.room_id = None
+        self.state = None
+        self.pending_since = None # perf_counter of the action we are waiting on
+        self.in_flight = False    # An action is being sent or awaits its answer; every game_update calls act()
+        self.requested_round = False
+        self.joined = asyncio.Event()
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.handlers = {event: self.on_state for event in
+                         ("game_started", "game_update", "prompt_palpite", "prompt_card_play", "round_results")}
+        self.handlers.update(lobby_created=self.on_lobby_created, lobby_joined=self.on_lobby_joined,
+                             action_error=self.on_error, error=self.on_error, rate_limited=self.on_rate_limited)
+        for event, handler in self.handlers.items():
+            self.sio.on(event, self.decoding(handler))
+        self.sio.on("batch", self.decoding(self.on_batch))
+
+    @staticmethod
+    def decoding(handler):
+        # Binary payloads (--binary) arrive as bytes; handlers always get the JSON value
+        async def wrapper(data):
+            await handler(decodificar(data) if isinstance(data, bytes) else data)
+        return wrapper
+
+    async def connect(self):
+        await self.sio.connect(self.url, transports=["websocket"])
+
+    async def on_batch(self, batch):
+        for entry in batch["events"]:
+            data = entry["data"] if "state" not in entry else {**batch["states"][entry["state"]], **entry["data"]}
+            handler = self.handlers.get(entry["event"])
+            if handler:
+                await handler(data)
+
+    async def on_lobby_created(self, data):
+        self.room_id = data["room_id"]
+        self.joined.set()
+
+    async def on_lobby_joined(self, data):
+        self.joined.set()
+
+    async def on_error(self, data):
+        self.stats.errors += 1
+        self.pending_since = None # Wait for the next state instead of retrying on a stale one
+        self.in_flight = False
+
+    async def on_rate_limited(self, data):
+        self.stats.errors += 1
+        await asyncio.sleep(data["retry_after"]) # Still in flight meanwhile, so only this retries the refused action
+        self.pending_since = None
+        self.in_flight = False
+        await self.act()
+
+    async def on_state(self, state):
+        acted_by = state.get("player_who_bade") or state.get("player_who_played")
+        if acted_by == self.player_id and self.pending_since is not None:
+            self.stats.latencies.append(time.perf_counter() - self.pending_since)
+            self.stats.actions += 1
+            self.pending_since = None
+            self.in_flight = False
+        self.state = state
+        await self.act()
+
+    async def act(self):
+        state = self.state
+        if not state or self.in_flight:
+            return
+        phase = state.get("round_phase")
+        if phase in ("round_over", "game_over"):
+            if self.is_host and not self.requested_round:
+                self.requested_round = True
+                self.stats.rounds += 1
+                self.stats.games += phase == "game_over"
+                await asyncio.sleep(self.think_time)
+                await self.sio.emit("request_next_round_action", {"room_id": self.room_id})
+            return
+        self.requested_round = False
+        if state.get("jogador_da_vez_acao") != self.player_id:
+            return
+        if phase == "waiting_palpites":
+            n_cartas = state["n_cartas_rodada_atual"]
+            is_last = len(state["palpites_feitos_rodada_atual"]) == len(state["players"]) - 1
+            allowed = [p for p in range(n_cartas + 1)
+                       if not (is_last and state["soma_palpites_rodada_atual"] + p == n_cartas)]
+            event, payload = "submit_palpite_action", {"room_id": self.room_id, "palpite": self.rng.choice(allowed)}
+        elif phase == "waiting_card_play":
+            event, payload = "submit_card_action", {"room_id": self.room_id, "card_index": 0}
+        else:
+            return
+        self.in_flight = True # Before the think time: concurrent act() calls must not send this twice
+        await asyncio.sleep(self.think_time)
+        self.pending_since = time.perf_counter()
+        await self.sio.emit(event, payload)
+
+class Spectator:
+    def __init__(self, url, stats):
+        self.url = url
+        self.stats = stats
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.sio.on("spectator_update", self.on_update)
+
+    async def on_update(self, data):
+        self.stats.spectator_updates += 1
+
+async def run_table(index, args, stats, rng):
+    urls = args.url.split(",")
+    players = [BotPlayer(f"T{index}P{i + 1}", urls[(index + i) % len(urls)], stats, random.Random(rng.random()), args.think_time, i == 0)
+               for i in range(args.players)]
+    options = {"batch": args.batch}
+    if args.binary:
+        options.update(encoding="binary", compression="deflate")
+    host = players[0]
+    for player in players:
+        await player.connect()
+    await host.sio.emit("create_lobby", {"player_id": host.player_id, **options})
+    await host.joined.wait()
+    for player in players[1:]:
+        player.room_id = host.room_id
+        await player.sio.emit("join_lobby", {"room_id": host.room_id, "player_id": player.player_id, **options})
+        await player.joined.wait()
+    spectators = [Spectator(urls[(index + i) % len(urls)], stats) for i in range(args.spectators)]
+    for spectator in spectators:
+        await spectator.sio.connect(spectator.url, transports=["websocket"])
+        await spectator.sio.emit("spectate_lobby", {"room_id": host.room_id, **options})
+    await host.sio.emit("start_game", {"room_id": host.room_id})
+    return players + spectators
+
+async def main(args):
+    stats = Stats()
+    rng = random.Random(args.seed)
+    tables = []
+    for start in range(0, args.tables, args.ramp_batch):
+        batch = range(start, min(start + args.ramp_batch, args.tables))
+        tables += await asyncio.gather(*(run_table(i, args, stats, rng) for i in batch))
+    print(f"{len(tables)} tables with {args.players} players each are running.")
+
+    deadline = time.perf_counter() + args.duration
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(min(args.report_every, max(0.0, deadline - time.perf_counter())))
+        stats.report("progress")
+    stats.report("final")
+    for players in tables:
+        for player in players:
+            await player.sio.disconnect()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent-lobby load generator for the Fodinha backend.")
+    parser.add_argument("--url", default="http://localhost:5050")
+    parser.add_argument("--tables", type=int, default=10, help="Concurrent tables (M)")
+    parser.add_argument("--players", type=int, default=4, choices=range(2, 7), help="Players per table")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to keep the tables playing")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds a bot waits before acting")
+    parser.add_argument("--ramp-batch", type=int, default=10, help="Tables set up concurrently during ramp-up")
+    parser.add_argument("--report-every", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch", action="store_true", help="Ask for one batched message per action")
+    parser.add_argument("--binary", action="store_true", help="Ask for binary, compressed game-state payloads")
+    parser.add_argument("--spectators", type=int, default=0, help="Sockets watching each table")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,959 @@
+# backend/lobbies.py
+"""
+Lobby and game event handling shared by the Flask server (app.py) and the
+asyncio server (async_app.py).
+
+Handlers never talk to a Socket.IO server directly. Each call gets an Outbox
+and records what it wants sent (emits, room joins and leaves) in order; the
+transport adapter then flushes the outbox with its own server. Handlers do
+no I/O, so the same code runs unchanged in a thread or on an event loop.
+
+    server = LobbyServer(metrics)
+    out = server.dispatch("join_lobby", sid, {"room_id": "ABC123", "player_id": "P2"})
+    for kind, *args in out: ...
+"""
+import time
+import uuid
+import random
+import secrets
+import logging
+from game_logic import FodinhaGame
+from stores import MemoryStore
+from protocol import PROTOCOLO_COMPLETO, PROTOCOLO_DELTA, PROTOCOLOS, sala_delta, ops_palpite, ops_carta
+from batching import Vista, agrupar
+from wire import CODIFICACAO_JSON, codificacao_pedida, codificar_ops
+from spectators import sala_espectadores, vista_publica, marca, transmitir
+from matchmaking import FilaDePartidas, TAMANHO_PADRAO
+from turn_timers import vez_do_jogo, palpite_padrao, jogada_padrao
+
+log = logging.getLogger("fodinha.lobbies")
+
+MAX_PLAYERS_PER_LOBBY = 6
+
+# Socket.IO events handled by LobbyServer, registered by both transports
+EVENTOS = (
+    "connect", "disconnect", "create_lobby", "join_lobby", "start_game",
+    "submit_palpite_action", "submit_card_action", "request_next_round_action", "request_resync",
+    "spectate_lobby", "join_matchmaking", "leave_matchmaking",
+)
+
+def generate_room_id():
+    """Generates a short, unique room ID."""
+    # Simple 6-char ID for now, you might want something more robust for production
+    return uuid.uuid4().hex[:6].upper()
+
+def generate_rejoin_token():
+    """Secret given to a seat's player, who must send it to take the seat from another socket (see on_join_lobby)."""
+    return secrets.token_urlsafe(16)
+
+class Outbox:
+    """
+    What one handler call wants the transport to do, in order:
+      ("emit", event, payload, room)
+      ("join", sid, room)
+      ("leave", sid, room)
+    `room` may be a sid, like in Socket.IO. Payloads are sent after the handler
+    returns, so they must not share mutable lobby state (copy lists like players).
+    """
+    __slots__ = ("ops", "vistas")
+
+    def __init__(self):
+        self.ops = []
+        self.vistas = {} # (game, player_id) -> player view shared by this call's emits, see LobbyServer.player_view
+
+    def __iter__(self):
+        return iter(self.ops)
+
+    def __len__(self):
+        return len(self.ops)
+
+    def emit(self, event, payload, room):
+        self.ops.append(("emit", event, payload, room))
+
+    def join(self, sid, room):
+        self.ops.append(("join", sid, room))
+
+    def leave(self, sid, room):
+        self.ops.append(("leave", sid, room))
+
+def lobby_to_dict(lobby_data):
+    """Compact JSON-ready lobby record (see checkpoint.py)."""
+    game_instance = lobby_data["game_instance"]
+    return {"players": list(lobby_data["players"]), "host_sid": lobby_data["host_sid"], "version": lobby_data["version"],
+            "tokens": dict(lobby_data["tokens"]), "game": game_instance.to_dict() if game_instance else None}
+
+def lobby_from_dict(data, verbose_games=True):
+    return {
+        "players": list(data["players"]),
+        "game_instance": FodinhaGame.from_dict(data["game"], verbose=verbose_games) if data["game"] else None,
+        "host_sid": data["host_sid"],
+        "version": data["version"],
+        "tokens": dict(data.get("tokens", {})), # Checkpoints from before rejoin tokens have none
+        "ativo_em": time.time(), # Restored lobbies get a full idle TTL for their players to come back
+    }
+
+class LobbyServer:
+    def __init__(self, metrics, store=None, verbose_games=True):
+        # games will store: { room_id: {"players": [player_id_1, player_id_2, ...], "game_instance": FodinhaGame_instance, "host_sid": sid, "version": n, "tokens": {player_id: token}, "ativo_em": t} }
+        # "tokens" are the seats' rejoin tokens (see on_join_lobby)
+        # "version" counts the delta-protocol patches sent for the lobby (see protocol.py)
+        # "ativo_em" is when a handler last touched the lobby (see sweeper.py)
+        self.store = store if store is not None else MemoryStore() # See stores.py for multi-process deployments
+        self.games = self.store.games
+        self.sessions = self.store.sessions # sid <-> (room_id, player_id) indexes, see sessions.py
+        self.espectadores = self.store.espectadores # Sockets watching a lobby, see spectators.py
+        self.matchmaking = FilaDePartidas() # Sockets waiting to be seated, see matchmaking.py
+        self.metrics = metrics
+        self.verbose_games = verbose_games # FodinhaGame prints its progress; keep it off on the event loop
+        self.sementes = random.SystemRandom() # Seeds new games; a seeded random.Random makes deals reproducible (benchmark.py)
+        self.salas_alteradas = None # Set of room_ids changed since the last checkpoint, once a Checkpointer is attached
+        self.registro_partidas = None # replay.GameLog that retired games are written to, if any
+        self.limites = None # rate_limits.RateLimiter checked by limitar(), set by the transport
+        self.saida = None   # backpressure.FilasDeSaida for slow consumers, set by the transport
+        self.turnos = None  # turn_timers.RelogioDeTurnos holding every table's turn deadline, set by the transport
+
+        metrics.register_gauge("lobbies", "Lobbies in memory.", lambda: len(self.games))
+        metrics.register_gauge("games_running", "Lobbies with a game instance.", self.store.lobbies_em_jogo)
+        metrics.register_gauge("sessions", "Sockets bound to a lobby.", lambda: len(self.sessions))
+        metrics.register_gauge("spectators", "Sockets watching a lobby.", lambda: len(self.espectadores))
+        metrics.register_gauge("matchmaking_queued", "Sockets waiting in the matchmaking queue.", lambda: len(self.matchmaking))
+        metrics.register_gauge("outbound_held", "game_updates held back for slow consumers.", lambda: len(self.saida) if self.saida else 0)
+        metrics.register_gauge("turn_timers", "Tables with a turn deadline pending.", lambda: len(self.turnos) if self.turnos else 0)
+
+    def limitar(self, event, sid, data):
+        """
+        Rate limits (see rate_limits.py), for the transport to check before it
+        takes any lock: None if the event may run, else the Outbox to send
+        instead of running it (a "rate_limited" notice, once per run of refusals).
+        """
+        if self.limites is None or sid is None:
+            return None
+        # The room bucket is only charged for the sender's own lobby: naming a room mustn't drain it for its players
+        sessao = self.sessions.get(sid)
+        room_id = data.get("room_id") if isinstance(data, dict) else None
+        recusa = self.limites.admitir(event, sid, room_id if sessao and sessao["room_id"] == room_id else None)
+        if recusa is None:
+            return None
+        escopo, retry_after, avisar = recusa
+        self.metrics.rate_limited[event, escopo] += 1
+        out = Outbox()
+        if avisar:
+            out.emit("rate_limited", {"event": event, "scope": escopo, "retry_after": round(retry_after, 3)}, sid)
+        return out
+
+    def dispatch(self, event, sid, data=None):
+        """Runs the handler for `event` and returns its Outbox."""
+        out = Outbox()
+        with self.store.transacao():
+            antes = self.sessions.get(sid)
+            assistidas = self._salas_assistidas(sid, data)
+            getattr(self, f"on_{event}")(out, sid, data)
+            self._tocar(sid, data, antes)
+            self.update_spectators(out, assistidas)
+            if self.saida is not None:
+                out.ops = self.saida.filtrar(out.ops, self.em_lote) # Slow consumers only get the newest game_update (backpressure.py)
+            out.ops = agrupar(out.ops, self.em_lote, self.metrics.batched_events) # Sockets that asked for it get one message per action (batching.py)
+            out.ops = codificar_ops(out.ops, self.codificacao, self.metrics) # ... and binary game-state payloads (wire.py)
+        return out
+
+    def em_lote(self, sid):
+        sessao = self.sessions.get(sid)
+        return sessao is not None and sessao["batch"]
+
+    def codificacao(self, sid):
+        sessao = self.sessions.get(sid) or self.espectadores.get(sid)
+        return sessao["encoding"] if sessao is not None else CODIFICACAO_JSON
+
+    def _tocar(self, sid, data, antes):
+        # Rooms a handler may have changed: the sid's room before (disconnect) and after (create/join) it,
+        # and the room_id the event names. Live ones count as active now; all of them need a new checkpoint.
+        depois = self.sessions.get(sid)
+        agora = time.time()
+        for room_id in (antes and antes["room_id"], depois and depois["room_id"],
+                        data.get("room_id") if isinstance(data, dict) else None):
+            if not room_id:
+                continue
+            lobby_data = self.games.get(room_id)
+            if lobby_data is not None:
+                lobby_data["ativo_em"] = agora
+            if self.salas_alteradas is not None and (lobby_data is not None or room_id == (antes and antes["room_id"])):
+                self.salas_alteradas.add(room_id)
+
+    def salas_do_evento(self, sid, data):
+        """Lobbies a handler call may touch: the room_id the event names and the sid's current lobby (see room_locks.py)."""
+        sessao = self.sessions.get(sid)
+        return (data.get("room_id") if isinstance(data, dict) else None, sessao and sessao["room_id"])
+
+    def sala_do_destino(self, destino):
+        """Lobby an emit target (a lobby, one of its delta/spectator sub-rooms or a sid) belongs to, or None."""
+        if not destino:
+            return None
+        sessao = self.sessions.get(destino) or self.espectadores.get(destino)
+        if sessao:
+            return sessao["room_id"]
+        return destino.partition("#")[0] # Sub-rooms are "<room_id>#..."
+
+    def new_game(self, player_ids):
+        # Seeded so the game can be replayed from its action log (see replay.py)
+        return FodinhaGame(player_ids=player_ids, verbose=self.verbose_games, seed=self.sementes.getrandbits(64))
+
+    def close_lobby(self, out, room_id, reason):
+        """Removes a lobby that still has sockets, telling them why, and logs its game."""
+        out.emit("lobby_closed", {"room_id": room_id, "reason": reason}, room_id)
+        for sid in self.sessions.remover_sala(room_id):
+            out.leave(sid, room_id)
+            out.leave(sid, sala_delta(room_id))
+        self.dismiss_spectators(out, room_id, reason)
+        self.retire_game(room_id, self.games[room_id]["game_instance"])
+        del self.games[room_id]
+        self.schedule_turn(room_id, None)
+        if self.salas_alteradas is not None:
+            self.salas_alteradas.add(room_id)
+
+    def dismiss_spectators(self, out, room_id, reason):
+        """Tells a lobby's spectators it is going away and takes them out of its sub-rooms."""
+        espectadores = self.espectadores.remover_sala(room_id)
+        for codificacao in set(espectadores.values()):
+            out.emit("lobby_closed", {"room_id": room_id, "reason": reason}, sala_espectadores(room_id, codificacao))
+        for spectator_sid, codificacao in espectadores.items():
+            out.leave(spectator_sid, sala_espectadores(room_id, codificacao))
+
+    def stop_spectating(self, out, sid):
+        """Takes sid out of the lobby it watches, if any (it is about to play or watch another one)."""
+        info = self.espectadores.remover(sid)
+        if info is not None:
+            out.leave(sid, sala_espectadores(info["room_id"], info["encoding"]))
+
+    def seat_match(self, out, motivo, entradas):
+        """
+        Opens a lobby for a group the matchmaking queue put together, seats
+        them in queue order (the first one hosts) and starts its game.
+        """
+        games = self.games
+        room_id = generate_room_id()
+        while room_id in games:
+            room_id = generate_room_id()
+
+        players = []
+        for entrada in entradas:
+            player_id, n = entrada.player_id, 2
+            while player_id in players: # Strangers may have picked the same name
+                player_id, n = f"{entrada.player_id} ({n})", n + 1
+            players.append(player_id)
+        games[room_id] = {
+            "players": list(players),
+            "game_instance": None,
+            "host_sid": entradas[0].sid,
+            "version": 0,
+            "tokens": {player_id: generate_rejoin_token() for player_id in players},
+            "ativo_em": time.time(),
+        }
+        agora = self.matchmaking.relogio()
+        for entrada, player_id in zip(entradas, players):
+            out.join(entrada.sid, room_id)
+            protocol = self.get_protocol(entrada.opcoes)
+            self.sessions.registrar(entrada.sid, room_id, player_id, protocol, bool(entrada.opcoes.get("batch")),
+                                    codificacao_pedida(entrada.opcoes))
+            self.bind_protocol_room(out, entrada.sid, room_id, protocol)
+            self.metrics.observe_match_wait(len(entradas), agora - entrada.desde)
+        for entrada, player_id in zip(entradas, players):
+            out.emit("lobby_joined", {"room_id": room_id, "players": list(players), "your_player_id": player_id,
+                                      "game_state": None, "matchmaking": motivo, "rejoin_token": games[room_id]["tokens"][player_id]},
+                     entrada.sid)
+        self.metrics.matches[len(entradas), motivo] += 1
+        if self.salas_alteradas is not None:
+            self.salas_alteradas.add(room_id)
+        log.info(f"Matchmaking seated {players} in lobby {room_id} ({motivo}).")
+        self.on_start_game(out, entradas[0].sid, {"room_id": room_id})
+
+    def _salas_assistidas(self, sid, data):
+        # Watched lobbies this event may change: room_id -> (encodings their spectators use, marca before the handler)
+        assistidas = {}
+        for room_id in self.salas_do_evento(sid, data):
+            if not room_id or room_id in assistidas:
+                continue
+            codificacoes = self.espectadores.codificacoes(room_id)
+            lobby_data = self.games.get(room_id) if codificacoes else None
+            if lobby_data is not None:
+                assistidas[room_id] = (codificacoes, marca(lobby_data))
+        return assistidas
+
+    def update_spectators(self, out, assistidas):
+        """One spectator_update per watched lobby the handler changed, whatever it emitted to players."""
+        for room_id, (codificacoes, antes) in assistidas.items():
+            lobby_data = self.games.get(room_id)
+            if lobby_data is not None and marca(lobby_data) != antes:
+                transmitir(out, room_id, lobby_data, codificacoes)
+
+    def schedule_turn(self, room_id, game_instance):
+        """Starts the room's turn deadline if its game waits on a player, else drops it (see turn_timers.py)."""
+        if self.turnos is None:
+            return
+        segundos = self.turnos.prazo(game_instance.round_phase) if game_instance is not None else None
+        if segundos is not None and game_instance.jogador_da_vez_acao:
+            self.turnos.agendar(room_id, vez_do_jogo(game_instance), segundos)
+        else:
+            self.turnos.cancelar(room_id)
+
+    def schedule_turns(self):
+        """Deadlines for every game waiting on a player, e.g. after a warm restart brought games back."""
+        for room_id, lobby_data in list(self.games.items()):
+            self.schedule_turn(room_id, lobby_data["game_instance"])
+
+    def retire_game(self, room_id, game_instance):
+        """Logs a game instance the lobby is about to drop, if it got as far as a deal."""
+        if self.registro_partidas is not None and game_instance is not None and game_instance.acoes:
+            self.registro_partidas.registrar(game_instance, room_id)
+
+    # ── Helpers ────────────────────────────────────────────────────────────────
+    def get_valid_game(self, out, room_id, sid_check=None):
+        """Game instance of a lobby, or None (reporting why to sid_check)."""
+        if room_id not in self.games:
+            if sid_check: out.emit("error", {"msg": f"Lobby {room_id} not found."}, sid_check)
+            return None
+        lobby_data = self.games[room_id]
+        if not lobby_data or "game_instance" not in lobby_data:
+            if sid_check: out.emit("error", {"msg": f"Game instance not found in lobby {room_id}."}, sid_check)
+            return None
+        return lobby_data["game_instance"]
+
+    @staticmethod
+    def player_view(out, game_instance, player_id, **extras):
+        """
+        Payload with a player's view of the game plus event fields. The view is
+        built once per handler call and shared by its emits (take views only
+        after the handler's action), so a batch encodes it once.
+        """
+        chave = (id(game_instance), player_id)
+        base = out.vistas.get(chave)
+        if base is None:
+            base = out.vistas[chave] = game_instance.get_player_game_state(player_id)
+        return Vista(base, **extras)
+
+    @staticmethod
+    def report_engine_error(out, sid, room_id, msg):
+        """action_error for an action the engine refused; server-made moves (sid None) only log it."""
+        if sid is not None:
+            out.emit("action_error", {"msg": msg, "room_id": room_id}, sid)
+        else:
+            log.warning(f"Engine refused a server-made move in lobby {room_id}: {msg}")
+
+    @staticmethod
+    def get_protocol(data):
+        """Protocol requested by a client in create_lobby/join_lobby ("full" unless it opts in to "delta")."""
+        protocol = data.get("protocol", PROTOCOLO_COMPLETO)
+        return protocol if protocol in PROTOCOLOS else PROTOCOLO_COMPLETO
+
+    @staticmethod
+    def bind_protocol_room(out, sid, room_id, protocol):
+        # Delta sockets also sit in a sub-room so one broadcast reaches all of them
+        if protocol == PROTOCOLO_DELTA:
+            out.join(sid, sala_delta(room_id))
+        else:
+            out.leave(sid, sala_delta(room_id))
+
+    def full_state_sids(self, room_id, player_id):
+        """SIDs of a player that get full game_update payloads (everyone not on the delta protocol)."""
+        return [sid for sid in self.sessions.sids_do_jogador(room_id, player_id)
+                if self.sessions.get(sid)["protocol"] != PROTOCOLO_DELTA]
+
+    def send_patch(self, out, room_id, ops):
+        """Broadcasts one versioned patch to every delta-protocol socket in the lobby."""
+        lobby_data = self.games[room_id]
+        lobby_data["version"] += 1
+        out.emit("game_patch", {"room_id": room_id, "version": lobby_data["version"], "ops": ops}, sala_delta(room_id))
+
+    def send_snapshots(self, out, room_id, sids=None):
+        """Sends the full player view to delta-protocol sockets (join, new round, resync)."""
+        lobby_data = self.games[room_id]
+        game_instance = lobby_data["game_instance"]
+        for sid in (sids if sids is not None else self.sessions.sids_da_sala(room_id)):
+            info = self.sessions.get(sid)
+            if not info or info["protocol"] != PROTOCOLO_DELTA:
+                continue
+            game_state = game_instance.get_player_game_state(info["player_id"]) if game_instance else None
+            out.emit("game_snapshot", {"room_id": room_id, "version": lobby_data["version"], "game_state": game_state}, sid)
+
+    # ── Handlers ───────────────────────────────────────────────────────────────
+    def on_connect(self, out, sid, data=None):
+        # Let the client know they're connected.
+        # We don't assign them to a room here yet, they need to create or join.
+        out.emit("connected", {"msg": "✨ Connected to Fodinha backend. Create or join a lobby!", "sid": sid}, sid)
+
+    def on_create_lobby(self, out, sid, data):
+        """
+        Host creates a new lobby.
+        data = {"player_id": "P1", "protocol": "full" | "delta" (optional), "batch": true (optional, see batching.py),
+                "encoding": "binary", "compression": "deflate" (optional, see wire.py)}
+        """
+        games = self.games
+        player_id = data.get("player_id")
+        if not player_id:
+            out.emit("error", {"msg": "Player ID is required to create a lobby."}, sid)
+            return
+
+        room_id = generate_room_id()
+        while room_id in games: # Ensure unique room_id
+            room_id = generate_room_id()
+
+        out.join(sid, room_id)
+        # Game instance created when game starts, not on lobby creation
+        games[room_id] = {
+            "players": [player_id],
+            "game_instance": None,
+            "host_sid": sid, # Store host SID
+            "version": 0,
+            "tokens": {player_id: generate_rejoin_token()},
+            "ativo_em": time.time(),
+        }
+        protocol = self.get_protocol(data)
+        self.stop_spectating(out, sid)
+        self.matchmaking.sair(sid)
+        self.sessions.registrar(sid, room_id, player_id, protocol, bool(data.get("batch")), codificacao_pedida(data))
+        self.bind_protocol_room(out, sid, room_id, protocol)
+
+        log.info(f"Lobby {room_id} created by {player_id} (SID: {sid}). Current lobbies: {len(games)}")
+        out.emit("lobby_created", {"room_id": room_id, "players": list(games[room_id]["players"]), "your_player_id": player_id,
+                                   "rejoin_token": games[room_id]["tokens"][player_id]}, sid)
+        out.emit("lobby_state", {"room_id": room_id, "players": list(games[room_id]["players"]), "game_state": None}, room_id)
+
+    def on_join_lobby(self, out, sid, data):
+        """
+        Player joins an existing lobby.
+        data = {"room_id": "XYZ123", "player_id": "P2", "protocol": "full" | "delta" (optional), "batch": true (optional),
+                "encoding": "binary", "compression": "deflate" (optional),
+                "rejoin_token": "..." (to take back a seat, as given in lobby_created/lobby_joined)}
+        """
+        games = self.games
+        room_id = data.get("room_id")
+        player_id = data.get("player_id")
+
+        if not room_id or not player_id:
+            out.emit("error", {"msg": "Room ID and Player ID are required to join."}, sid)
+            return
+
+        if room_id not in games:
+            out.emit("error", {"msg": f"Lobby {room_id} not found."}, sid)
+            return
+
+        if player_id in games[room_id]["players"]:
+            # Player is already in the lobby, perhaps rejoining (also mid-game, e.g. after a restart).
+            # Only with the seat's token: the room code and a name are no secret.
+            token = games[room_id]["tokens"].get(player_id)
+            rejoin_token = data.get("rejoin_token")
+            if token is None:
+                # A seat from before rejoin tokens: only between rounds, as before
+                game_instance = games[room_id]["game_instance"]
+                if game_instance is not None and game_instance.round_phase not in [None, "round_over", "game_over"]:
+                    out.emit("error", {"msg": f"Game in lobby {room_id} has already started."}, sid)
+                    return
+            elif not isinstance(rejoin_token, str) or not secrets.compare_digest(rejoin_token, token):
+                out.emit("error", {"msg": f"Player {player_id} is already in lobby {room_id}."}, sid)
+                return
+            # Just ensure they are in the socket.io room and update them.
+            out.join(sid, room_id)
+            # The host's old socket is gone (reconnect or warm restart): this one takes over
+            if player_id == games[room_id]["players"][0] and games[room_id]["host_sid"] not in self.sessions:
+                games[room_id]["host_sid"] = sid
+            protocol = self.get_protocol(data)
+            self.stop_spectating(out, sid)
+            self.matchmaking.sair(sid)
+            self.sessions.registrar(sid, room_id, player_id, protocol, bool(data.get("batch")), codificacao_pedida(data))
+            self.bind_protocol_room(out, sid, room_id, protocol)
+            current_game_state = None
+            if games[room_id]["game_instance"]:
+                current_game_state = games[room_id]["game_instance"].get_player_game_state(player_id)
+            out.emit("lobby_state", {"room_id": room_id, "players": list(games[room_id]["players"]), "game_state": current_game_state}, sid)
+            self.send_snapshots(out, room_id, [sid])
+            log.info(f"Player {player_id} re-joined lobby {room_id}.")
+            return
+
+        if games[room_id]["game_instance"] is not None and games[room_id]["game_instance"].round_phase not in [None, "round_over", "game_over"]:
+            out.emit("error", {"msg": f"Game in lobby {room_id} has already started."}, sid)
+            return
+
+        if len(games[room_id]["players"]) >= MAX_PLAYERS_PER_LOBBY:
+            out.emit("error", {"msg": f"Lobby {room_id} is full."}, sid)
+            return
+
+        out.join(sid, room_id)
+        games[room_id]["players"].append(player_id)
+        games[room_id]["tokens"][player_id] = generate_rejoin_token()
+        protocol = self.get_protocol(data)
+        self.stop_spectating(out, sid)
+        self.matchmaking.sair(sid)
+        self.sessions.registrar(sid, room_id, player_id, protocol, bool(data.get("batch")), codificacao_pedida(data))
+        self.bind_protocol_room(out, sid, room_id, protocol)
+        log.info(f"Player {player_id} (SID: {sid}) joined/re-joined lobby {room_id}. Players: {games[room_id]['players']}")
+        current_game_state = None
+        if games[room_id]["game_instance"]:
+            current_game_state = games[room_id]["game_instance"].get_player_game_state(player_id)
+        out.emit("lobby_joined", {"room_id": room_id, "players": list(games[room_id]["players"]), "your_player_id": player_id,
+                                  "game_state": current_game_state, "rejoin_token": games[room_id]["tokens"][player_id]}, sid)
+        self.send_snapshots(out, room_id, [sid])
+
+        # For all players (including the one who just joined), send lobby update
+        # This ensures everyone sees the updated player list
+        out.emit("lobby_state", {"room_id": room_id, "players": list(games[room_id]["players"]), "game_state": None}, room_id)
+
+    def on_start_game(self, out, sid, data):
+        """
+        Host starts the game in their lobby.
+        data = {"room_id": "XYZ123"} (player_id who is starting can be inferred from the sid if needed,
+                                       but good practice to ensure they are the host or in the lobby)
+        """
+        room_id = data.get("room_id")
+        player_info = self.sessions.get(sid)
+
+        if not player_info or player_info["room_id"] != room_id:
+            out.emit("error", {"msg": "You are not part of this lobby or invalid request."}, sid)
+            return
+
+        if room_id not in self.games:
+            out.emit("error", {"msg": f"Lobby {room_id} not found."}, sid)
+            return
+
+        lobby_data = self.games[room_id]
+        # Optional: Check if starter is the host: if sid != lobby_data["host_sid"]:
+
+        if lobby_data["game_instance"] and lobby_data["game_instance"].round_phase not in [None, "round_over", "game_over"]:
+            out.emit("error", {"msg": "Game already running in this lobby."}, sid)
+            return
+
+        current_players_in_lobby = lobby_data["players"]
+        if len(current_players_in_lobby) < 2: # Min players for Fodinha
+            out.emit("error", {"msg": "Need at least 2 players to start."}, sid)
+            # Also emit to room so everyone knows
+            out.emit("lobby_message", {"msg": "Need at least 2 players to start."}, room_id)
+            return
+
+        # Create and store the game instance for this room
+        self.retire_game(room_id, lobby_data["game_instance"])
+        lobby_data["game_instance"] = self.new_game(current_players_in_lobby)
+
+        # Initialize the first round immediately
+        start_success = self.metrics.engine_call("start_new_round", lobby_data["game_instance"].start_new_round)
+        if not start_success:
+            out.emit("error", {"msg": "Failed to start the game."}, sid)
+            return
+
+        log.info(f"Game started in lobby {room_id} with players: {current_players_in_lobby}")
+
+        # For each player, send their player-specific game state
+        for player_id in current_players_in_lobby:
+            if not self.sessions.sids_do_jogador(room_id, player_id):
+                log.warning(f"No SIDs found for player {player_id}")
+                continue
+            # Delta-protocol SIDs get a game_snapshot below instead
+            player_sids = self.full_state_sids(room_id, player_id)
+            if not player_sids:
+                continue
+
+            # Add room_id to the game state for client-side handling
+            player_game_state = self.player_view(out, lobby_data["game_instance"], player_id, room_id=room_id)
+
+            # Send to each player's connected SID
+            for player_sid in player_sids:
+                log.debug(f"Sending game_started to {player_id} with SID {player_sid}")
+                out.emit("game_started", player_game_state, player_sid)
+                # Also send a general update to ensure UI transitions
+                out.emit("game_update", player_game_state, player_sid)
+
+        self.send_snapshots(out, room_id)
+        self.schedule_turn(room_id, lobby_data["game_instance"])
+        log.info(f"Game started, personalized game states sent to {len(current_players_in_lobby)} players")
+
+    def on_disconnect(self, out, sid, data=None):
+        log.info(f"Player with SID {sid} disconnected.")
+        if self.limites is not None:
+            self.limites.esquecer(sid)
+        if self.saida is not None:
+            self.saida.esquecer(sid)
+
+        if self.espectadores.remover(sid) is not None or self.matchmaking.sair(sid) is not None:
+            return # Was only watching, or waiting for a table
+
+        session = self.sessions.remover(sid)
+        if not session:
+            return # Never created or joined a lobby
+
+        # Remove the lobby once its last player socket is gone (spectators don't keep it alive)
+        room_id = session["room_id"]
+        if room_id in self.games and not self.sessions.tem_sessoes(room_id):
+            log.info(f"Lobby {room_id} is empty, removing.")
+            self.sessions.remover_sala(room_id)
+            self.dismiss_spectators(out, room_id, "empty")
+            self.retire_game(room_id, self.games[room_id]["game_instance"])
+            del self.games[room_id]
+            self.schedule_turn(room_id, None)
+
+    def on_spectate_lobby(self, out, sid, data):
+        """
+        Socket starts watching a lobby without a seat (see spectators.py).
+        data = {"room_id": "XYZ123", "encoding": "binary", "compression": "deflate" (optional, see wire.py)}
+        """
+        room_id = data.get("room_id")
+        if not room_id:
+            out.emit("error", {"msg": "Room ID is required to spectate."}, sid)
+            return
+
+        lobby_data = self.games.get(room_id)
+        if lobby_data is None:
+            out.emit("error", {"msg": f"Lobby {room_id} not found."}, sid)
+            return
+
+        if sid in self.sessions:
+            out.emit("error", {"msg": "You are playing in a lobby and can't spectate from this connection."}, sid)
+            return
+
+        self.stop_spectating(out, sid)
+        self.matchmaking.sair(sid)
+        codificacao = codificacao_pedida(data)
+        self.espectadores.registrar(sid, room_id, codificacao)
+        out.join(sid, sala_espectadores(room_id, codificacao))
+        log.info(f"SID {sid} is spectating lobby {room_id}.")
+        out.emit("spectating", {**vista_publica(room_id, lobby_data), "spectators": self.espectadores.contagem(room_id)}, sid)
+
+    def on_join_matchmaking(self, out, sid, data):
+        """
+        Socket asks to be seated at a new table (see matchmaking.py).
+        data = {"player_id": "P1", "size": 4 (optional, 2..MAX_PLAYERS_PER_LOBBY), "bracket": 3 (optional),
+                "protocol", "batch", "encoding", "compression" (optional, as in create_lobby)}
+        """
+        player_id = data.get("player_id")
+        tamanho = data.get("size", TAMANHO_PADRAO)
+        faixa = data.get("bracket")
+        if not player_id:
+            out.emit("error", {"msg": "Player ID is required for matchmaking."}, sid)
+            return
+
+        if type(tamanho) is not int or not 2 <= tamanho <= MAX_PLAYERS_PER_LOBBY:
+            out.emit("error", {"msg": f"Table size must be between 2 and {MAX_PLAYERS_PER_LOBBY}."}, sid)
+            return
+
+        if faixa is not None and type(faixa) is not int:
+            out.emit("error", {"msg": "Skill bracket must be an integer."}, sid)
+            return
+
+        if sid in self.sessions:
+            out.emit("error", {"msg": "You are already in a lobby on this connection."}, sid)
+            return
+
+        self.stop_spectating(out, sid)
+        opcoes = {chave: data[chave] for chave in ("protocol", "batch", "encoding", "compression") if chave in data}
+        mesas = self.matchmaking.entrar(sid, player_id, tamanho, faixa, opcoes)
+        out.emit("matchmaking_queued", {"size": tamanho, "bracket": faixa, "waiting": self.matchmaking.esperando(tamanho, faixa),
+                                        "wait_target": self.matchmaking.alvo_espera}, sid)
+        for motivo, entradas in mesas:
+            self.seat_match(out, motivo, entradas)
+
+    def on_leave_matchmaking(self, out, sid, data=None):
+        if self.matchmaking.sair(sid) is not None:
+            out.emit("matchmaking_left", {}, sid)
+
+    def on_matchmaking_tick(self, out, sid, data):
+        """Internal (no socket event): seats the players whose wait target passed (see matchmaking.py)."""
+        for motivo, entradas in self.matchmaking.vencidas():
+            self.seat_match(out, motivo, entradas)
+
+    def on_drain_outbound(self, out, sid, data):
+        """
+        Internal (no socket event): sends the game_update held back for a slow consumer whose queue drained (see backpressure.py).
+        data = {"room_id": "XYZ123", "sid": sid}
+        """
+        op = self.saida.liberar(data["sid"]) if self.saida is not None else None
+        if op is not None:
+            out.ops.append(op)
+
+    def on_turn_timeout(self, out, sid, data):
+        """
+        Internal (no socket event): a turn deadline passed (see turn_timers.py), so the server plays for the player.
+        data = {"room_id": "XYZ123", "vez": (seed, n_acoes)}
+        """
+        room_id = data["room_id"]
+        lobby_data = self.games.get(room_id)
+        game_instance = lobby_data["game_instance"] if lobby_data is not None else None
+        if game_instance is None or vez_do_jogo(game_instance) != data["vez"]:
+            return # Gone, or the turn was played meanwhile
+        player_id = game_instance.jogador_da_vez_acao
+        phase = game_instance.round_phase
+        log.info(f"Turn timed out in lobby {room_id}: playing for {player_id} ({phase}).")
+        self.metrics.turn_timeouts[phase] += 1
+        out.emit("turn_timeout", {"room_id": room_id, "player_id": player_id, "phase": phase}, room_id)
+        if phase == "waiting_palpites":
+            self.apply_palpite(out, None, room_id, game_instance, player_id, palpite_padrao(game_instance, player_id))
+        elif phase == "waiting_card_play":
+            self.apply_card_play(out, None, room_id, game_instance, player_id, jogada_padrao(game_instance, player_id))
+
+    def on_evict_lobby(self, out, sid, data):
+        """
+        Internal (no socket event): the sweeper closing an idle lobby, or the least recently active one when over capacity.
+        data = {"room_id": "XYZ123", "reason": "idle" | "capacity", "ativo_ate": t}
+        """
+        room_id = data["room_id"]
+        lobby_data = self.games.get(room_id)
+        if lobby_data is None or lobby_data.get("ativo_em", 0) > data["ativo_ate"]:
+            return # Gone already, or active again since the sweeper picked it
+        log.info(f"Closing lobby {room_id} ({data['reason']}).")
+        self.metrics.evictions[data["reason"]] += 1
+        self.close_lobby(out, room_id, data["reason"])
+
+    def on_submit_palpite_action(self, out, sid, data):
+        """
+        Player submits a palpite (bet).
+        data = {"room_id": "XYZ123", "palpite": 2}
+        """
+        room_id = data.get("room_id")
+        palpite = data.get("palpite")
+        player_info = self.sessions.get(sid)
+
+        if not player_info or player_info["room_id"] != room_id:
+            out.emit("action_error", {"msg": "You are not part of this lobby.", "room_id": room_id}, sid)
+            return
+
+        player_id = player_info["player_id"]
+        game_instance = self.get_valid_game(out, room_id, sid)
+        if not game_instance:
+            return
+
+        if game_instance.round_phase != "waiting_palpites":
+            out.emit("action_error", {"msg": "Not in palpite phase.", "room_id": room_id}, sid)
+            return
+
+        if game_instance.jogador_da_vez_acao != player_id:
+            out.emit("action_error", {"msg": "Not your turn to make a palpite.", "room_id": room_id}, sid)
+            return
+
+        self.apply_palpite(out, sid, room_id, game_instance, player_id, palpite)
+
+    def apply_palpite(self, out, sid, room_id, game_instance, player_id, palpite):
+        """Submits a validated player's palpite and sends everyone the result (sid hears about engine errors)."""
+        result = self.metrics.engine_call("submit_palpite", game_instance.submit_palpite, player_id, palpite)
+
+        if not result["success"]:
+            self.report_engine_error(out, sid, room_id, result.get("error", "Unknown error processing palpite."))
+            return
+
+        self.send_patch(out, room_id, ops_palpite(game_instance, player_id))
+        # In 1-card rounds players see their own card once bidding ends, which a public patch can't carry
+        if result.get("all_palpites_done") and game_instance.n_cartas_rodada_atual == 1:
+            self.send_snapshots(out, room_id)
+
+        # Send personalized game state to each player in the room
+        for pl_id in game_instance.jogadores:
+            # Find all SIDs associated with this player
+            player_sids = self.full_state_sids(room_id, pl_id)
+            if not player_sids:
+                continue
+
+            # Create personalized game state for this player
+            player_game_state = self.player_view(out, game_instance, pl_id, event_type="palpite_submitted",
+                                                 player_who_bade=player_id, palpite_value=palpite, room_id=room_id)
+
+            # Debug logging for card visibility
+            log.debug(f"Player {pl_id} game state - cards: {player_game_state['maos_rodada_atual']}")
+            log.debug(f"Is 1-card round: {player_game_state['n_cartas_rodada_atual'] == 1}, Can see others: {player_game_state.get('can_see_others_cards', False)}")
+
+            # Send to all SIDs for this player
+            for player_sid in player_sids:
+                out.emit("game_update", player_game_state, player_sid)
+
+        # If all palpites are done, transition to card playing phase
+        if result.get("all_palpites_done"):
+            for pl_id in game_instance.jogadores:
+                player_sids = self.full_state_sids(room_id, pl_id)
+                if not player_sids:
+                    continue
+
+                player_game_state = self.player_view(out, game_instance, pl_id, event_type="all_palpites_completed", room_id=room_id)
+
+                for player_sid in player_sids:
+                    out.emit("game_update", player_game_state, player_sid)
+
+        # If there's a next player to make a palpite, send them a prompt
+        if result.get("next_player_to_bet"):
+            next_player = result["next_player_to_bet"]
+            next_player_sids = self.full_state_sids(room_id, next_player)
+
+            for player_sid in next_player_sids:
+                player_game_state = self.player_view(out, game_instance, next_player, jogador_da_vez_acao=next_player, room_id=room_id)
+                out.emit("prompt_palpite", player_game_state, player_sid)
+
+        self.schedule_turn(room_id, game_instance)
+
+    def on_submit_card_action(self, out, sid, data):
+        """
+        Player plays a card.
+        data = {"room_id": "XYZ123", "card_index": 0}
+        """
+        room_id = data.get("room_id")
+        card_index = data.get("card_index")
+        player_info = self.sessions.get(sid)
+
+        if not player_info or player_info["room_id"] != room_id:
+            out.emit("action_error", {"msg": "You are not part of this lobby.", "room_id": room_id}, sid)
+            return
+
+        player_id = player_info["player_id"]
+        game_instance = self.get_valid_game(out, room_id, sid)
+        if not game_instance:
+            return
+
+        if game_instance.round_phase != "waiting_card_play":
+            out.emit("action_error", {"msg": "Not in card playing phase.", "room_id": room_id}, sid)
+            return
+
+        if game_instance.jogador_da_vez_acao != player_id:
+            out.emit("action_error", {"msg": "Not your turn to play a card.", "room_id": room_id}, sid)
+            return
+
+        self.apply_card_play(out, sid, room_id, game_instance, player_id, card_index)
+
+    def apply_card_play(self, out, sid, room_id, game_instance, player_id, card_index):
+        """Plays a validated player's card and sends everyone the result (sid hears about engine errors)."""
+        result = self.metrics.engine_call("submit_card_play", game_instance.submit_card_play, player_id, card_index)
+
+        if not result["success"]:
+            self.report_engine_error(out, sid, room_id, result.get("error", "Unknown error processing card play."))
+            return
+
+        self.send_patch(out, room_id, ops_carta(game_instance, player_id, card_index, result))
+
+        # Send personalized game state to each player in the room
+        for pl_id in game_instance.jogadores:
+            # Find all SIDs associated with this player
+            player_sids = self.full_state_sids(room_id, pl_id)
+            if not player_sids:
+                continue
+
+            # Create personalized game state for this player
+            player_game_state = self.player_view(out, game_instance, pl_id, event_type="card_played",
+                                                 player_who_played=player_id, room_id=room_id)
+
+            # Send to all SIDs for this player
+            for player_sid in player_sids:
+                out.emit("game_update", player_game_state, player_sid)
+
+        # If trick is completed, send update
+        if result.get("trick_completed"):
+            trick_winner = result.get("trick_winner")
+
+            for pl_id in game_instance.jogadores:
+                player_sids = self.full_state_sids(room_id, pl_id)
+                if not player_sids:
+                    continue
+
+                player_game_state = self.player_view(out, game_instance, pl_id, trick_winner=trick_winner,
+                                                     event_type="trick_completed", room_id=room_id)
+
+                for player_sid in player_sids:
+                    out.emit("game_update", player_game_state, player_sid)
+
+        # If round is over, send results
+        if result.get("round_over"):
+            for pl_id in game_instance.jogadores:
+                player_sids = self.full_state_sids(room_id, pl_id)
+                if not player_sids:
+                    continue
+
+                player_game_state = self.player_view(out, game_instance, pl_id, event_type="round_over", room_id=room_id)
+
+                for player_sid in player_sids:
+                    out.emit("round_results", player_game_state, player_sid)
+
+        # If there's a next player to play a card, send them a prompt
+        if game_instance.round_phase == "waiting_card_play" and game_instance.jogador_da_vez_acao:
+            next_player = game_instance.jogador_da_vez_acao
+            next_player_sids = self.full_state_sids(room_id, next_player)
+
+            for player_sid in next_player_sids:
+                player_game_state = self.player_view(out, game_instance, next_player, jogador_da_vez_acao=next_player, room_id=room_id)
+                out.emit("prompt_card_play", player_game_state, player_sid)
+
+        self.schedule_turn(room_id, game_instance)
+
+    def on_request_next_round_action(self, out, sid, data):
+        """
+        Host requests to start the next round.
+        data = {"room_id": "XYZ123"}
+        """
+        room_id = data.get("room_id")
+        player_info = self.sessions.get(sid)
+
+        if not player_info or player_info["room_id"] != room_id:
+            out.emit("action_error", {"msg": "You are not part of this lobby.", "room_id": room_id}, sid)
+            return
+
+        lobby_data = self.games.get(room_id)
+
+        if not lobby_data:
+            out.emit("action_error", {"msg": f"Lobby {room_id} not found.", "room_id": room_id}, sid)
+            return
+
+        if sid != lobby_data.get("host_sid"):
+            out.emit("action_error", {"msg": "Only the host can start the next round.", "room_id": room_id}, sid)
+            return
+
+        game_instance = lobby_data.get("game_instance")
+        if not game_instance:
+            out.emit("action_error", {"msg": "No game instance found.", "room_id": room_id}, sid)
+            return
+
+        if game_instance.round_phase not in ["round_over", "game_over"]:
+            out.emit("action_error", {"msg": "Current round is not over yet.", "room_id": room_id}, sid)
+            return
+
+        # If the game is over (all players eliminated), create a new game instance
+        if game_instance.game_over_global:
+            self.retire_game(room_id, game_instance)
+            lobby_data["game_instance"] = self.new_game(lobby_data["players"])
+            game_instance = lobby_data["game_instance"]
+
+        # Start a new round
+        success = self.metrics.engine_call("start_new_round", game_instance.start_new_round)
+
+        if not success:
+            out.emit("action_error", {"msg": "Failed to start new round.", "room_id": room_id}, sid)
+            return
+
+        # New hands were dealt: delta-protocol clients get a fresh snapshot
+        self.send_snapshots(out, room_id)
+
+        # Send personalized game state to each player in the room
+        for pl_id in game_instance.jogadores:
+            # Find all SIDs associated with this player
+            player_sids = self.full_state_sids(room_id, pl_id)
+            if not player_sids:
+                continue
+
+            # Create personalized game state for this player
+            player_game_state = self.player_view(out, game_instance, pl_id, event_type="next_round_started", room_id=room_id)
+
+            # Send to all SIDs for this player
+            for player_sid in player_sids:
+                out.emit("game_update", player_game_state, player_sid)
+
+        # Send prompt to first player to make a palpite
+        if game_instance.round_phase == "waiting_palpites" and game_instance.jogador_da_vez_acao:
+            first_player = game_instance.jogador_da_vez_acao
+            player_sids = self.full_state_sids(room_id, first_player)
+
+            for player_sid in player_sids:
+                player_game_state = self.player_view(out, game_instance, first_player, room_id=room_id)
+                out.emit("prompt_palpite", player_game_state, player_sid)
+
+        self.schedule_turn(room_id, game_instance)
+
+    def on_request_resync(self, out, sid, data):
+        """
+        Delta-protocol client asks for a full snapshot (e.g. after a version gap).
+        data = {"room_id": "XYZ123"}
+        """
+        room_id = data.get("room_id")
+        player_info = self.sessions.get(sid)
+
+        if not player_info or player_info["room_id"] != room_id or room_id not in self.games:
+            out.emit("action_error", {"msg": "You are not part of this lobby.", "room_id": room_id}, sid)
+            return
+
+        self.send_snapshots(out, room_id, [sid])
@@ -0,0 +1,153 @@
+# backend/matchmaking.py
+"""
+Matchmaking queue: seats players at new tables without trading room codes.
+
+A socket emits "join_matchmaking" {"player_id", "size" (2..MAX_PLAYERS_PER_LOBBY,
+default TAMANHO_PADRAO), "bracket" (optional int skill bracket), plus the
+create_lobby options} and gets "matchmaking_queued". Players wait in one FIFO
+bucket per (size, bracket); the enqueue that fills a bucket seats its players
+at a new lobby whose game starts right away (LobbyServer.seat_match), so a
+bucket never holds more than size - 1 players and matching costs O(size)
+whatever the queue length. "leave_matchmaking", a disconnect, or creating,
+joining or watching a lobby takes the socket out of the queue.
+
+Players who have waited `alvo_espera` seconds are matched with the nearest
+brackets of their size too, oldest players first (players without a
+bracket match any). After twice that, their table starts short-handed with
+whoever wants that size, as long as that makes at least 2. A tick every
+`interval` seconds (the internal "matchmaking_tick" event, run like any
+handler) only looks at the oldest player of each bucket.
+
+The queue lives in the process, like Socket.IO's own rooms: with several
+worker processes (FODINHA_STORE=sqlite), each matches the sockets connected
+to it.
+
+    FODINHA_MATCH_WAIT=30   seconds before a player's bracket, then size, is relaxed
+"""
+import os
+import time
+import asyncio
+from collections import OrderedDict
+
+TAMANHO_PADRAO = 4
+ALVO_ESPERA_PADRAO = 30.0
+
+def fila_do_ambiente(server):
+    """The server's queue, with its wait target from FODINHA_MATCH_WAIT."""
+    server.matchmaking.alvo_espera = float(os.environ.get("FODINHA_MATCH_WAIT", ALVO_ESPERA_PADRAO))
+    return server.matchmaking
+
+class Entrada:
+    """A queued socket; opcoes are its create_lobby options (protocol, batch, encoding, compression)."""
+    __slots__ = ("sid", "player_id", "tamanho", "faixa", "opcoes", "desde")
+
+    def __init__(self, sid, player_id, tamanho, faixa, opcoes, desde):
+        self.sid = sid
+        self.player_id = player_id
+        self.tamanho = tamanho
+        self.faixa = faixa
+        self.opcoes = opcoes
+        self.desde = desde
+
+def distancia(faixa, outra):
+    return 0 if faixa is None or outra is None else abs(faixa - outra)
+
+class FilaDePartidas:
+    def __init__(self, alvo_espera=ALVO_ESPERA_PADRAO, interval=1.0, relogio=time.monotonic):
+        self.alvo_espera = alvo_espera
+        self.interval = interval
+        self.relogio = relogio
+        self._baldes = {}  # (tamanho, faixa) -> OrderedDict sid -> Entrada, oldest first
+        self._faixas = {}  # tamanho -> set of faixas with a bucket
+        self._por_sid = {} # sid -> Entrada
+
+    def __len__(self):
+        return len(self._por_sid)
+
+    def __contains__(self, sid):
+        return sid in self._por_sid
+
+    def esperando(self, tamanho, faixa):
+        """Players in one bucket."""
+        balde = self._baldes.get((tamanho, faixa))
+        return len(balde) if balde else 0
+
+    def entrar(self, sid, player_id, tamanho, faixa=None, opcoes=None, agora=None):
+        """
+        Queues sid (again, if it was queued) and returns the tables this made:
+        [("full", [Entrada, ...])] when it filled its bucket, else [].
+        """
+        self.sair(sid)
+        entrada = Entrada(sid, player_id, tamanho, faixa, opcoes or {}, self.relogio() if agora is None else agora)
+        balde = self._baldes.get((tamanho, faixa))
+        if balde is None:
+            balde = self._baldes[tamanho, faixa] = OrderedDict()
+            self._faixas.setdefault(tamanho, set()).add(faixa)
+        balde[sid] = entrada
+        self._por_sid[sid] = entrada
+        if len(balde) < tamanho:
+            return []
+        return [("full", [self.sair(s) for s in list(balde)])]
+
+    def sair(self, sid):
+        """Takes sid out of the queue. Returns its Entrada, or None if it wasn't queued."""
+        entrada = self._por_sid.pop(sid, None)
+        if entrada is None:
+            return None
+        chave = (entrada.tamanho, entrada.faixa)
+        balde = self._baldes[chave]
+        del balde[sid]
+        if not balde:
+            del self._baldes[chave]
+            faixas = self._faixas[entrada.tamanho]
+            faixas.discard(entrada.faixa)
+            if not faixas:
+                del self._faixas[entrada.tamanho]
+        return entrada
+
+    def vencidas(self, agora=None):
+        """Tables made by relaxing the wait of players past alvo_espera: [("bracket" | "short", [Entrada, ...])]."""
+        agora = self.relogio() if agora is None else agora
+        cabecas = sorted((next(iter(balde.values())) for balde in self._baldes.values()), key=lambda e: e.desde)
+        mesas = []
+        for cabeca in cabecas:
+            esperou = agora - cabeca.desde
+            if esperou < self.alvo_espera:
+                break # Sorted: nobody after this one is overdue either
+            if cabeca.sid not in self._por_sid:
+                continue # Seated at an earlier table of this tick
+            while cabeca.sid in self._por_sid:
+                grupo = self._mais_proximos(cabeca)
+                if len(grupo) == cabeca.tamanho:
+                    mesas.append(("bracket", [self.sair(e.sid) for e in grupo]))
+                elif esperou >= 2 * self.alvo_espera and len(grupo) >= 2:
+                    mesas.append(("short", [self.sair(e.sid) for e in grupo]))
+                else:
+                    break
+        return mesas
+
+    def _mais_proximos(self, cabeca):
+        """cabeca plus up to tamanho - 1 players of its size, nearest bracket first, oldest first within one."""
+        tamanho = cabeca.tamanho
+        grupo = [cabeca]
+        for faixa in sorted(self._faixas[tamanho], key=lambda f: (distancia(cabeca.faixa, f), f is None, f or 0)):
+            for entrada in self._baldes[tamanho, faixa].values():
+                if len(grupo) == tamanho:
+                    return grupo
+                if entrada is not cabeca:
+                    grupo.append(entrada)
+        return grupo
+
+    def rodar(self, sleep, executar):
+        """Background loop for app.py; executar(event, sid, data) runs an event like a socket handler."""
+        while True:
+            sleep(self.interval)
+            if self._por_sid:
+                executar("matchmaking_tick", None, {})
+
+    async def rodar_async(self, executar):
+        """Background task for async_app.py; executar is the coroutine version."""
+        while True:
+            await asyncio.sleep(self.interval)
+            if self._por_sid:
+                await executar("matchmaking_tick", None, {})
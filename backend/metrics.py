@@ -0,0 +1,202 @@
+# backend/metrics.py
+"""
+Low-overhead runtime metrics rendered in the Prometheus text format.
+
+- Handler latency histograms and error counts per Socket.IO event (Metrics.instrument)
+- Emit counts and payload bytes per outgoing event (CountingJSON, hooked into packet encoding),
+  and events coalesced into per-socket batches (batching.py)
+- Game engine call latencies (Metrics.engine_call)
+- Room lock acquisitions and contended waits per event (room_locks.py)
+- Lobbies closed by the idle sweeper per reason (sweeper.py)
+- Tables seated by the matchmaking queue, and how long their players waited (matchmaking.py)
+- Events refused by rate limits (rate_limits.py), and events dropped for slow consumers (backpressure.py)
+- Turns the server played for players whose deadline passed (turn_timers.py)
+- Gauges computed at scrape time (Metrics.register_gauge)
+
+Recording is a perf_counter call plus a few dict/list increments, cheap enough
+to leave on in production. Counts may be off by a few under heavy thread
+contention; that is the price of not taking a lock on the hot path.
+"""
+import json
+import time
+import inspect
+import functools
+from bisect import bisect_left
+from collections import Counter
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+WAIT_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 45.0, 60.0, 90.0, 120.0)
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+class Metrics:
+    def __init__(self, prefix="fodinha"):
+        self.prefix = prefix
+        self.handler_latency = {}   # event -> Histogram
+        self.handler_errors = Counter()
+        self.engine_latency = {}    # engine method -> Histogram
+        self.emits = Counter()      # outgoing event -> packets encoded
+        self.emit_bytes = Counter() # outgoing event -> encoded payload bytes
+        self.batched_events = Counter() # event -> events sent inside a "batch" packet (batching.py)
+        self.binary_bytes = Counter()   # event -> binary payload bytes, not seen by CountingJSON (wire.py)
+        self.compressed_payloads = Counter() # event -> binary payloads sent zlib-compressed
+        self.lock_acquisitions = Counter() # (event, contended) -> room lock acquisitions
+        self.lock_wait = {}         # event -> Histogram of waits for a contended room lock
+        self.evictions = Counter()  # reason -> lobbies closed by the sweeper (sweeper.py)
+        self.matches = Counter()    # (table size, reason) -> tables seated by matchmaking (matchmaking.py)
+        self.match_wait = {}        # table size -> Histogram of seconds its players spent queued
+        self.rate_limited = Counter()   # (event, scope) -> events refused before their handler ran (rate_limits.py)
+        self.dropped_events = Counter() # event -> emits to slow consumers superseded or cut off (backpressure.py)
+        self.slow_consumer_disconnects = 0
+        self.turn_timeouts = Counter()  # round_phase -> turns played by the server after their deadline (turn_timers.py)
+        self._gauges = {}           # name -> (help, callable)
+
+    # ── Recording ──────────────────────────────────────────────────────────────
+    def instrument(self, event):
+        """Decorator timing a Socket.IO handler (plain or async). Apply it below @socketio.on(event)."""
+        histogram = self.handler_latency.setdefault(event, Histogram())
+
+        def decorator(handler):
+            # Flask-SocketIO probes the arity of some handlers (connect gets auth), so pass through exactly what fits
+            n_args = len(inspect.signature(handler).parameters)
+
+            if inspect.iscoroutinefunction(handler):
+                @functools.wraps(handler)
+                async def async_wrapper(*args):
+                    start = time.perf_counter()
+                    try:
+                        return await handler(*args[:n_args])
+                    except Exception:
+                        self.handler_errors[event] += 1
+                        raise
+                    finally:
+                        histogram.observe(time.perf_counter() - start)
+                return async_wrapper
+
+            @functools.wraps(handler)
+            def wrapper(*args):
+                start = time.perf_counter()
+                try:
+                    return handler(*args[:n_args])
+                except Exception:
+                    self.handler_errors[event] += 1
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def engine_call(self, name, method, *args):
+        """Calls a game engine method and records its latency under `name`."""
+        histogram = self.engine_latency.get(name)
+        if histogram is None:
+            histogram = self.engine_latency[name] = Histogram()
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+
+    def observe_lock_wait(self, event, seconds):
+        histogram = self.lock_wait.get(event)
+        if histogram is None:
+            histogram = self.lock_wait[event] = Histogram()
+        histogram.observe(seconds)
+
+    def observe_match_wait(self, tamanho, seconds):
+        histogram = self.match_wait.get(tamanho)
+        if histogram is None:
+            histogram = self.match_wait[tamanho] = Histogram(WAIT_BUCKETS)
+        histogram.observe(seconds)
+
+    def register_gauge(self, name, help_text, fn):
+        """fn() is called on each scrape and returns the current value."""
+        self._gauges[name] = (help_text, fn)
+
+    # ── Prometheus text format ─────────────────────────────────────────────────
+    def render(self):
+        lines = []
+        self._render_histograms(lines, "handler_latency_seconds", "Socket.IO handler latency.", "event", self.handler_latency)
+        self._render_counter(lines, "handler_errors_total", "Socket.IO handlers that raised.", ("event",), self.handler_errors)
+        self._render_histograms(lines, "engine_latency_seconds", "FodinhaGame method latency.", "method", self.engine_latency)
+        self._render_counter(lines, "emits_total", "Socket.IO packets encoded per event.", ("event",), self.emits)
+        self._render_counter(lines, "emit_bytes_total", "Encoded payload bytes per event.", ("event",), self.emit_bytes)
+        self._render_counter(lines, "batched_events_total", "Events delivered inside a batch packet instead of their own.", ("event",), self.batched_events)
+        self._render_counter(lines, "binary_payload_bytes_total", "Binary-encoded payload bytes per event.", ("event",), self.binary_bytes)
+        self._render_counter(lines, "compressed_payloads_total", "Binary payloads sent zlib-compressed per event.", ("event",), self.compressed_payloads)
+        self._render_counter(lines, "room_lock_acquisitions_total", "Room locks taken per event, and whether they were held by another handler.",
+                             ("event", "contended"), Counter({(e, str(c).lower()): n for (e, c), n in self.lock_acquisitions.items()}))
+        self._render_counter(lines, "lobbies_evicted_total", "Lobbies closed by the sweeper.", ("reason",), self.evictions)
+        self._render_counter(lines, "matchmaking_tables_total", "Tables seated by matchmaking per size and reason (full, bracket, short).",
+                             ("size", "reason"), self.matches)
+        self._render_histograms(lines, "matchmaking_wait_seconds", "Time players spent in the matchmaking queue, per table size.", "size", self.match_wait)
+        self._render_counter(lines, "rate_limited_total", "Events refused by a rate limit before their handler ran, per bucket scope (sid, room).",
+                             ("event", "scope"), self.rate_limited)
+        self._render_counter(lines, "outbound_dropped_total", "Emits to slow consumers that were superseded or cut off.", ("event",), self.dropped_events)
+        self._render_counter(lines, "slow_consumer_disconnects_total", "Sockets disconnected for letting their outbound queue fill up.", (),
+                             Counter({(): self.slow_consumer_disconnects}))
+        self._render_counter(lines, "turn_timeouts_total", "Turns the server played for a player whose deadline passed, per phase.",
+                             ("phase",), self.turn_timeouts)
+        self._render_histograms(lines, "room_lock_wait_seconds", "Time spent waiting for a contended room lock.", "event", self.lock_wait)
+        for name, (help_text, fn) in self._gauges.items():
+            metric = f"{self.prefix}_{name}"
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge", f"{metric} {fn()}"]
+        return "\n".join(lines) + "\n"
+
+    def _render_counter(self, lines, name, help_text, label_names, counter):
+        metric = f"{self.prefix}_{name}"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        for key, value in sorted(counter.items(), key=lambda kv: str(kv[0])):
+            values = key if isinstance(key, tuple) else (key,)
+            lines.append(f"{metric}{_labels(zip(label_names, values))} {value}")
+
+    def _render_histograms(self, lines, name, help_text, label, histograms):
+        metric = f"{self.prefix}_{name}"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+        for key, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_labels([(label, key), ('le', bound)])} {cumulative}")
+            lines.append(f"{metric}_bucket{_labels([(label, key), ('le', '+Inf')])} {histogram.count}")
+            lines.append(f"{metric}_sum{_labels([(label, key)])} {histogram.total}")
+            lines.append(f"{metric}_count{_labels([(label, key)])} {histogram.count}")
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(pairs):
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}" if body else ""
+
+class CountingJSON:
+    """
+    json module stand-in for python-socketio (SocketIO(json=...)). Every outgoing
+    event packet is encoded exactly once through dumps, as [event, payload], so
+    counting there measures real wire bytes without serializing anything twice.
+    """
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def dumps(self, obj, *args, **kwargs):
+        encoded = json.dumps(obj, *args, **kwargs)
+        if type(obj) is list and obj and type(obj[0]) is str:
+            self.metrics.emits[obj[0]] += 1
+            self.metrics.emit_bytes[obj[0]] += len(encoded)
+        return encoded
+
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return json.loads(s, *args, **kwargs)
@@ -0,0 +1,134 @@
+# backend/monte_carlo.py
+"""
+Multiprocess Monte Carlo runner for simulated Fodinha matches.
+
+Game i is always played with seed_da_partida(seed, i), whichever worker runs
+it, and workers only return integer counters that are merged by addition.
+The aggregate for a given seed is therefore bit-identical for any number of
+workers or block size.
+
+Policies must be picklable (module-level functions, not lambdas), since they
+are shipped to the worker processes.
+
+    python monte_carlo.py --partidas 100000 --jogadores 4 --workers 8 --seed 1
+"""
+import os
+import time
+import argparse
+import multiprocessing
+from collections import Counter
+import simulation
+from simulation import MAX_RODADAS_POR_PARTIDA, simular_partidas
+
+class Estatisticas:
+    """Integer counters over a set of games; merge() is plain addition."""
+    def __init__(self):
+        self.partidas = 0
+        self.partidas_terminadas = 0 # Games that ended by elimination (not by max_rodadas)
+        self.rodadas = 0
+        self.vitorias = Counter()            # player -> games finished with the most lives (ties count for each)
+        self.eliminacoes = Counter()         # player -> games where the player ended with <= 0 lives
+        self.vidas_perdidas_por_cartas = Counter() # n_cartas -> lives lost, summed over players
+        self.amostras_por_cartas = Counter()       # n_cartas -> player-rounds played
+        self.palpites_certos_por_cartas = Counter() # n_cartas -> bids that matched tricks won
+
+    def adicionar_partida(self, registro):
+        self.partidas += 1
+        self.partidas_terminadas += registro["game_over"]
+        self.rodadas += registro["rodadas"]
+        self.vitorias.update(registro["vencedores"])
+        self.eliminacoes.update(registro["eliminados"])
+        for rodada in registro["historico"]:
+            n = rodada["n_cartas"]
+            vitorias = rodada["vitorias"]
+            self.vidas_perdidas_por_cartas[n] += sum(rodada["vidas_perdidas"].values())
+            self.amostras_por_cartas[n] += len(vitorias)
+            self.palpites_certos_por_cartas[n] += sum(1 for j, p in rodada["palpites"].items() if vitorias[j] == p)
+
+    def merge(self, outra):
+        self.partidas += outra.partidas
+        self.partidas_terminadas += outra.partidas_terminadas
+        self.rodadas += outra.rodadas
+        # Counter.update adds counts (and keeps zeros, unlike Counter + Counter)
+        self.vitorias.update(outra.vitorias)
+        self.eliminacoes.update(outra.eliminacoes)
+        self.vidas_perdidas_por_cartas.update(outra.vidas_perdidas_por_cartas)
+        self.amostras_por_cartas.update(outra.amostras_por_cartas)
+        self.palpites_certos_por_cartas.update(outra.palpites_certos_por_cartas)
+        return self
+
+    def resumo(self):
+        """Rates derived from the counters."""
+        amostras = sum(self.amostras_por_cartas.values())
+        return {
+            "partidas": self.partidas,
+            "partidas_terminadas": self.partidas_terminadas,
+            "rodadas": self.rodadas,
+            "taxa_de_vitoria": {j: v / self.partidas for j, v in sorted(self.vitorias.items())} if self.partidas else {},
+            "taxa_de_eliminacao": {j: v / self.partidas for j, v in sorted(self.eliminacoes.items())} if self.partidas else {},
+            "vidas_perdidas_por_cartas": {n: self.vidas_perdidas_por_cartas[n] / a for n, a in sorted(self.amostras_por_cartas.items())},
+            "acerto_de_palpite_por_cartas": {n: self.palpites_certos_por_cartas[n] / a for n, a in sorted(self.amostras_por_cartas.items())},
+            "acerto_de_palpite": sum(self.palpites_certos_por_cartas.values()) / amostras if amostras else 0.0,
+        }
+
+def _simular_bloco(tarefa):
+    """Worker entry point: plays games [inicio, inicio + n) and returns their counters."""
+    inicio, n, player_ids, bid_policy, play_policy, seed, initial_lives, max_rodadas = tarefa
+    estatisticas = Estatisticas()
+    for registro in simular_partidas(n, player_ids, bid_policy, play_policy, seed, initial_lives, max_rodadas,
+                                     primeiro_indice=inicio):
+        estatisticas.adicionar_partida(registro)
+    return estatisticas
+
+def executar(n_partidas, player_ids=("P1", "P2", "P3", "P4"), bid_policy=simulation.palpite_aleatorio,
+             play_policy=simulation.jogar_carta_aleatoria, seed=0, n_workers=None, tamanho_bloco=1000,
+             initial_lives=3, max_rodadas=MAX_RODADAS_POR_PARTIDA, ao_receber_bloco=None):
+    """
+    Shards n_partidas games into blocks of tamanho_bloco across n_workers
+    processes (default: all cores) and merges the counters as blocks stream
+    back. ao_receber_bloco(parcial, total_acumulado, blocos_feitos, n_blocos)
+    is called after each merge, e.g. for progress reporting.
+    """
+    tarefas = [(inicio, min(tamanho_bloco, n_partidas - inicio), tuple(player_ids), bid_policy, play_policy,
+                seed, initial_lives, max_rodadas) for inicio in range(0, n_partidas, tamanho_bloco)]
+    n_workers = n_workers or os.cpu_count() or 1
+    total = Estatisticas()
+
+    def _receber(resultados):
+        for feitos, parcial in enumerate(resultados, 1):
+            total.merge(parcial)
+            if ao_receber_bloco:
+                ao_receber_bloco(parcial, total, feitos, len(tarefas))
+
+    if n_workers == 1 or len(tarefas) == 1:
+        _receber(map(_simular_bloco, tarefas))
+    else:
+        with multiprocessing.Pool(min(n_workers, len(tarefas))) as pool:
+            _receber(pool.imap_unordered(_simular_bloco, tarefas))
+    return total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of Fodinha matches.")
+    parser.add_argument("--partidas", type=int, default=100_000)
+    parser.add_argument("--jogadores", type=int, default=4)
+    parser.add_argument("--vidas", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--bloco", type=int, default=1000)
+    parser.add_argument("--palpite", default="palpite_aleatorio", help="Bid policy name in simulation.py")
+    parser.add_argument("--jogada", default="jogar_carta_aleatoria", help="Play policy name in simulation.py")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    estatisticas = executar(args.partidas, [f"P{i + 1}" for i in range(args.jogadores)],
+                            getattr(simulation, args.palpite), getattr(simulation, args.jogada),
+                            seed=args.seed, n_workers=args.workers, tamanho_bloco=args.bloco,
+                            initial_lives=args.vidas)
+    duracao = time.perf_counter() - inicio
+    resumo = estatisticas.resumo()
+    print(f"{resumo['partidas']} partidas, {resumo['rodadas']} rodadas em {duracao:.2f}s "
+          f"({resumo['partidas'] / duracao:.0f} partidas/s, {resumo['rodadas'] / duracao:.0f} rodadas/s)")
+    print(f"Taxa de vitória: {resumo['taxa_de_vitoria']}")
+    print(f"Acerto de palpite: {resumo['acerto_de_palpite']:.3f}")
+    for n, vidas in resumo["vidas_perdidas_por_cartas"].items():
+        print(f"  {n} cartas: {vidas:.3f} vidas perdidas por jogador, acerto {resumo['acerto_de_palpite_por_cartas'][n]:.3f}")
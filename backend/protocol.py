@@ -0,0 +1,55 @@
+# backend/protocol.py
+"""
+Delta protocol: versioned patches instead of full game state snapshots.
+
+Clients opt in by sending "protocol": "delta" with create_lobby/join_lobby.
+They then get one "game_snapshot" (full player view + version) on join, at
+the start of every round and on request_resync, and a "game_patch" per
+action in between:
+
+    {"room_id": ..., "version": 7, "ops": [{"op": "card_played", ...}, {"op": "turn", ...}]}
+
+Patches carry only public information, so one patch is broadcast to every
+delta socket of a lobby. Versions increase by one per patch; a client that
+sees a gap should emit request_resync.
+
+Ops:
+    bid_made       player, palpite, soma_palpites_rodada_atual
+    card_played    player, card_index, card
+    trick_won      trick_winner, vitorias_rodada_atual, truco_multiplier
+    lives_changed  lives, current_dealer_global, cards_next_round_global, game_over_global
+    turn           round_phase, jogador_da_vez_acao
+"""
+
+PROTOCOLO_COMPLETO = "full"
+PROTOCOLO_DELTA = "delta"
+PROTOCOLOS = (PROTOCOLO_COMPLETO, PROTOCOLO_DELTA)
+
+def sala_delta(room_id):
+    """Socket.IO room holding the delta-protocol sockets of a lobby."""
+    return f"{room_id}#delta"
+
+def op_vez(game):
+    return {"op": "turn", "round_phase": game.round_phase, "jogador_da_vez_acao": game.jogador_da_vez_acao}
+
+def ops_palpite(game, player_id):
+    return [
+        {"op": "bid_made", "player": player_id, "palpite": game.palpites_feitos_rodada_atual[player_id],
+         "soma_palpites_rodada_atual": game.soma_palpites_rodada_atual},
+        op_vez(game),
+    ]
+
+def ops_carta(game, player_id, card_index, result):
+    ops = [{"op": "card_played", "player": player_id, "card_index": card_index,
+            "card": game.historico_cartas_rodada[player_id][-1]}]
+    if result.get("trick_completed"):
+        ops.append({"op": "trick_won", "trick_winner": result["trick_winner"],
+                    "vitorias_rodada_atual": dict(game.vitorias_rodada_atual),
+                    "truco_multiplier": game.truco_multiplier})
+    if result.get("round_over"):
+        ops.append({"op": "lives_changed", "lives": dict(game.vidas),
+                    "current_dealer_global": game.jogadores[game.dealer_idx_global],
+                    "cards_next_round_global": game.cartas_global,
+                    "game_over_global": game.game_over_global})
+    ops.append(op_vez(game))
+    return ops
@@ -0,0 +1,123 @@
+# backend/rate_limits.py
+"""
+Token-bucket limits on incoming socket events.
+
+Every sid has a bucket per group of events, and every lobby a bucket for the
+actions its own players aim at it:
+
+    action   submit_palpite_action, submit_card_action, request_next_round_action,
+             start_game, request_resync                          (per sid)
+    lobby    create_lobby, join_lobby, spectate_lobby,
+             join_matchmaking, leave_matchmaking                 (per sid)
+    room     the action group again, per lobby, for events that name the
+             sender's own lobby (other sockets can't drain it)
+
+The transport asks LobbyServer.limitar before it takes the event's room
+lock, so an event over its limit never reaches the handler, the store or the
+lock queue. It is only counted (rate_limited_total) and the sender gets one
+"rate_limited" {"event", "scope", "retry_after"} per run of refused events
+rather than an action_error each. connect, disconnect and internal events
+are never limited.
+
+A full bucket is the same as no bucket, so buckets that have refilled are
+dropped every PODAR_A_CADA checks.
+
+    FODINHA_RATE_LIMITS="action=10/20,lobby=2/10,room=40/80"   rate per second/burst, any subset; "off" disables them
+"""
+import os
+import time
+
+GRUPOS = {
+    "submit_palpite_action": "action", "submit_card_action": "action", "request_next_round_action": "action",
+    "start_game": "action", "request_resync": "action",
+    "create_lobby": "lobby", "join_lobby": "lobby", "spectate_lobby": "lobby",
+    "join_matchmaking": "lobby", "leave_matchmaking": "lobby",
+}
+LIMITES_PADRAO = {"action": (10.0, 20), "lobby": (2.0, 10), "room": (40.0, 80)}
+PODAR_A_CADA = 10_000
+
+def limites_do_ambiente():
+    """A RateLimiter configured from FODINHA_RATE_LIMITS, or None when it is "off"."""
+    valor = os.environ.get("FODINHA_RATE_LIMITS", "")
+    if valor.strip().lower() == "off":
+        return None
+    limites = {}
+    for item in filter(None, valor.split(",")):
+        grupo, _, limite = item.partition("=")
+        taxa, _, capacidade = limite.partition("/")
+        if grupo.strip() not in LIMITES_PADRAO:
+            raise ValueError(f"Unknown group in FODINHA_RATE_LIMITS: {grupo}")
+        limites[grupo.strip()] = (float(taxa), int(capacidade or max(1, float(taxa))))
+    return RateLimiter(limites)
+
+class Balde:
+    __slots__ = ("fichas", "em")
+
+    def __init__(self, fichas, em):
+        self.fichas = fichas
+        self.em = em
+
+class RateLimiter:
+    def __init__(self, limites=None, relogio=time.monotonic):
+        self.limites = dict(LIMITES_PADRAO, **(limites or {})) # grupo -> (tokens per second, burst)
+        self.relogio = relogio
+        self._baldes = {}     # (sid, grupo) or (room_id, "room") -> Balde
+        self._avisados = set() # sids told about their current run of refused events
+        self._checagens = 0
+
+    def __len__(self):
+        return len(self._baldes)
+
+    def admitir(self, event, sid, room_id=None):
+        """
+        Takes a token for event from sid's bucket (and room_id's, for actions).
+        Returns None when the event may run, else (scope, retry_after, avisar):
+        the bucket that refused it ("sid" or "room"), seconds until it has a
+        token again, and whether this is the first refusal of a run.
+        """
+        grupo = GRUPOS.get(event)
+        if grupo is None:
+            return None
+        agora = self.relogio()
+        self._checagens += 1
+        if self._checagens % PODAR_A_CADA == 0:
+            self.podar(agora)
+        baldes = [((sid, grupo), self.limites[grupo])]
+        if grupo == "action" and isinstance(room_id, str):
+            baldes.append(((room_id, "room"), self.limites["room"]))
+        for chave, (taxa, capacidade) in baldes:
+            balde = self._encher(chave, taxa, capacidade, agora)
+            if balde.fichas < 1:
+                avisar = sid not in self._avisados
+                self._avisados.add(sid)
+                return ("sid" if chave[1] == grupo else "room"), (1 - balde.fichas) / taxa, avisar
+        for chave, _ in baldes:
+            self._baldes[chave].fichas -= 1
+        self._avisados.discard(sid)
+        return None
+
+    def _encher(self, chave, taxa, capacidade, agora):
+        balde = self._baldes.get(chave)
+        if balde is None:
+            balde = self._baldes[chave] = Balde(capacidade, agora)
+        else:
+            balde.fichas = min(capacidade, balde.fichas + (agora - balde.em) * taxa)
+            balde.em = agora
+        return balde
+
+    def esquecer(self, sid):
+        """Drops a disconnected sid's buckets."""
+        for grupo in ("action", "lobby"):
+            self._baldes.pop((sid, grupo), None)
+        self._avisados.discard(sid)
+
+    def podar(self, agora=None):
+        """Drops the buckets that are full again."""
+        agora = self.relogio() if agora is None else agora
+        cheios = []
+        for chave, balde in self._baldes.items():
+            taxa, capacidade = self.limites[chave[1]]
+            if balde.fichas + (agora - balde.em) * taxa >= capacidade:
+                cheios.append(chave)
+        for chave in cheios:
+            del self._baldes[chave]
@@ -0,0 +1,178 @@
+# backend/replay.py
+"""
+Game records and the replay engine.
+
+Every FodinhaGame the server creates has an explicit seed and an append-only
+action log (FodinhaGame.acoes, see INICIO_RODADA in game_logic.py). When a
+game instance is retired (a new game replaces it, or its lobby goes away) the
+server appends one JSON line to the game log:
+
+    {"room_id": "AB12CD", "terminada": 1760000000.0, "seed": 123..., "jogadores": ["P1", "P2"],
+     "initial_lives": 3, "acoes": ["R", 0, 0, "R", 1, ...], "vidas": {...}, "game_over": true,
+     "state_version": 57}
+
+reproduzir() rebuilds the game from seed + acoes alone, with no prints and no
+sockets, and can stop after any number of actions, e.g. to check a disputed
+hand. vidas, game_over and state_version are what the live game ended with,
+so a replay can be checked against them.
+
+    python replay.py games.log.jsonl --workers 8           # replay and verify a whole log
+    python replay.py games.log.jsonl --sala AB12CD --passo 40   # state of a game after 40 actions
+"""
+import os
+import json
+import time
+import queue
+import argparse
+import logging
+import threading
+import multiprocessing
+from game_logic import FodinhaGame, INICIO_RODADA
+
+log = logging.getLogger("fodinha.replay")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ARQUIVO_PADRAO = os.path.join(HERE, "games.log.jsonl")
+
+def registro_da_partida(game, room_id=None):
+    """Game log record for a finished (or abandoned) game."""
+    return {
+        "room_id": room_id,
+        "terminada": time.time(),
+        "seed": game.seed,
+        "jogadores": list(game.jogadores),
+        "initial_lives": game.initial_lives,
+        "acoes": list(game.acoes),
+        "vidas": dict(game.vidas),
+        "game_over": game.game_over_global,
+        "state_version": game.state_version,
+    }
+
+# ── Replay engine ──────────────────────────────────────────────────────────────
+def aplicar_acoes(game, acoes):
+    """Applies logged actions to a game, each for the player whose turn it is. Raises ValueError if one is rejected."""
+    for passo, acao in enumerate(acoes):
+        if acao == INICIO_RODADA:
+            if not game.start_new_round():
+                raise ValueError(f"Action {passo}: round start after the game was over")
+            continue
+        jogador = game.jogador_da_vez_acao
+        if game.round_phase == "waiting_palpites":
+            result = game.submit_palpite(jogador, acao)
+        else:
+            result = game.submit_card_play(jogador, acao)
+        if not result["success"]:
+            raise ValueError(f"Action {passo} ({acao!r} by {jogador}) rejected: {result['error']}")
+    return game
+
+def reproduzir(registro, ate=None):
+    """Rebuilds the game of a record from its seed and the first `ate` actions (all of them by default)."""
+    if registro["seed"] is None:
+        raise ValueError("Game has no seed; it was dealt from the global random module")
+    game = FodinhaGame(list(registro["jogadores"]), registro["initial_lives"], seed=registro["seed"], verbose=False)
+    acoes = registro["acoes"]
+    return aplicar_acoes(game, acoes if ate is None else acoes[:ate])
+
+def confere(registro, game):
+    """True if a full replay ended exactly where the live game did."""
+    return (game.vidas == registro["vidas"] and game.game_over_global == registro["game_over"]
+            and game.state_version == registro["state_version"])
+
+def _reproduzir_bloco(linhas):
+    """Worker entry point: replays a block of log lines and returns (partidas, acoes, divergentes)."""
+    partidas = acoes = 0
+    divergentes = []
+    for linha in linhas:
+        registro = json.loads(linha)
+        try:
+            iguais = confere(registro, reproduzir(registro))
+        except ValueError:
+            iguais = False
+        if not iguais:
+            divergentes.append((registro["room_id"], registro["terminada"]))
+        partidas += 1
+        acoes += len(registro["acoes"])
+    return partidas, acoes, divergentes
+
+def reproduzir_arquivo(path, n_workers=None, tamanho_bloco=2000):
+    """Replays every game in a log across n_workers processes. Returns (partidas, acoes, divergentes)."""
+    with open(path, encoding="utf-8") as f:
+        linhas = [linha for linha in f if linha.strip()]
+    blocos = [linhas[i:i + tamanho_bloco] for i in range(0, len(linhas), tamanho_bloco)]
+    n_workers = n_workers or os.cpu_count() or 1
+    if n_workers == 1 or len(blocos) <= 1:
+        resultados = list(map(_reproduzir_bloco, blocos))
+    else:
+        with multiprocessing.Pool(min(n_workers, len(blocos))) as pool:
+            resultados = pool.map(_reproduzir_bloco, blocos)
+    divergentes = [d for _, _, ds in resultados for d in ds]
+    return sum(r[0] for r in resultados), sum(r[1] for r in resultados), divergentes
+
+# ── Game log writer ────────────────────────────────────────────────────────────
+def registro_do_ambiente(server):
+    """GameLog configured by FODINHA_GAME_LOG (a path, or "off"), attached to the server; None when off."""
+    path = os.environ.get("FODINHA_GAME_LOG", ARQUIVO_PADRAO)
+    if path == "off":
+        return None
+    server.registro_partidas = GameLog(path)
+    return server.registro_partidas
+
+class GameLog:
+    """
+    Appends game records from a writer thread; handlers only build the record.
+    Each batch is a single O_APPEND write, so worker processes sharing a
+    SQLiteStore can share one log file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._fila = queue.SimpleQueue()
+        self._escritor = threading.Thread(target=self._escrever, name="game-log-writer", daemon=True)
+        self._escritor.start()
+
+    def registrar(self, game, room_id=None):
+        self._fila.put(registro_da_partida(game, room_id))
+
+    def fechar(self):
+        self._fila.put(None)
+        self._escritor.join()
+
+    def _escrever(self):
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            while True:
+                registros = [self._fila.get()]
+                while not self._fila.empty():
+                    registros.append(self._fila.get())
+                fim = None in registros
+                linhas = [json.dumps(r, ensure_ascii=False, separators=(",", ":")) for r in registros if r is not None]
+                if linhas:
+                    os.write(fd, ("\n".join(linhas) + "\n").encode("utf-8"))
+                if fim:
+                    return
+        finally:
+            os.close(fd)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay Fodinha games from a game log.")
+    parser.add_argument("path", nargs="?", default=ARQUIVO_PADRAO)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--sala", help="Show one game (the last one logged for this room) instead of replaying the log")
+    parser.add_argument("--passo", type=int, default=None, help="With --sala: stop after this many actions")
+    args = parser.parse_args()
+
+    if args.sala:
+        with open(args.path, encoding="utf-8") as f:
+            registros = [r for r in map(json.loads, filter(str.strip, f)) if r["room_id"] == args.sala]
+        if not registros:
+            raise SystemExit(f"No game logged for room {args.sala}")
+        game = reproduzir(registros[-1], args.passo)
+        print(json.dumps(game.get_game_state(), ensure_ascii=False, indent=2))
+        print(json.dumps({j: [c.nome for c in mao] for j, mao in game.maos_rodada_atual.items()}, ensure_ascii=False))
+    else:
+        inicio = time.perf_counter()
+        partidas, acoes, divergentes = reproduzir_arquivo(args.path, args.workers)
+        duracao = time.perf_counter() - inicio
+        print(f"{partidas} partidas, {acoes} acoes em {duracao:.2f}s "
+              f"({partidas / duracao:.0f} partidas/s, {acoes / duracao:.0f} acoes/s), {len(divergentes)} divergentes")
+        for room_id, terminada in divergentes[:20]:
+            print(f"  diverge: sala {room_id}, terminada {terminada}")
@@ -0,0 +1,150 @@
+# backend/room_locks.py
+"""
+Per-room serialization of Socket.IO handlers.
+
+Every handler call holds the lock of each lobby it may touch (the room_id the
+event names and the sid's current lobby, see LobbyServer.salas_do_evento)
+from dispatch until its emits are flushed. Actions in one room run strictly
+one after another and leave in order; handlers in different rooms never wait
+for each other.
+
+Locks are created on first use and dropped as soon as no handler holds or
+waits for them, so idle and removed lobbies cost nothing. When a handler
+needs two rooms (a socket moving to another lobby) they are taken in sorted
+order, so two such handlers can't deadlock.
+
+    RoomLocks        app.py: threads, or green threads through QueueLock
+    AsyncRoomLocks   async_app.py: asyncio.Lock per room
+
+Contention shows up in /metrics as room_lock_acquisitions_total{contended}
+and the room_lock_wait_seconds histogram, per event.
+"""
+import time
+import asyncio
+import threading
+import contextlib
+
+class QueueLock:
+    """
+    Lock on an engine.io queue, so it blocks green threads (eventlet, gevent)
+    the way threading.Lock blocks threads. eio is socketio.server.eio.
+    """
+    def __init__(self, eio):
+        self._fila = eio.create_queue()
+        self._vazia = eio.get_queue_empty_exception()
+        self._fila.put(None)
+
+    def acquire(self, blocking=True):
+        try:
+            self._fila.get(blocking)
+        except self._vazia:
+            return False
+        return True
+
+    def release(self):
+        self._fila.put(None)
+
+def _ordenar(salas):
+    return tuple(sorted({s for s in salas if s}))
+
+class RoomLocks:
+    def __init__(self, metrics, nova_trava=threading.Lock):
+        self.metrics = metrics
+        self._nova_trava = nova_trava # Called once per room that gets a lock
+        self._travas = {}             # room_id -> [lock, handlers holding or waiting for it]
+        self._mutex = threading.Lock() # Guards _travas; never held while waiting for a room
+        self._esperando = 0
+        metrics.register_gauge("room_locks", "Rooms with a handler holding or waiting for their lock.", lambda: len(self._travas))
+        metrics.register_gauge("room_lock_waiters", "Handlers waiting for a room lock.", lambda: self._esperando)
+
+    def _reservar(self, salas):
+        """[(lock, contended)] for the rooms; contended if another handler already holds or waits for it."""
+        with self._mutex:
+            travas = []
+            for sala in salas:
+                entrada = self._travas.get(sala)
+                if entrada is None:
+                    entrada = self._travas[sala] = [self._nova_trava(), 0]
+                entrada[1] += 1
+                travas.append((entrada[0], entrada[1] > 1))
+            return travas
+
+    def _devolver(self, salas):
+        with self._mutex:
+            for sala in salas:
+                entrada = self._travas[sala]
+                entrada[1] -= 1
+                if not entrada[1]:
+                    del self._travas[sala]
+
+    def _registrar(self, event, espera):
+        """espera: seconds waited, or None if the lock was free."""
+        self.metrics.lock_acquisitions[(event, espera is not None)] += 1
+        if espera is not None:
+            self.metrics.observe_lock_wait(event, espera)
+
+    @contextlib.contextmanager
+    def travar(self, salas_de, event=None):
+        """
+        Holds the locks of the rooms salas_de() returns. The rooms are looked up
+        again once locked, and the locks retaken if they changed in the meantime.
+        """
+        while True:
+            salas = _ordenar(salas_de())
+            travas = self._reservar(salas)
+            adquiridas = 0
+            try:
+                for trava, disputada in travas:
+                    if not disputada:
+                        trava.acquire()
+                        adquiridas += 1
+                        self._registrar(event, None)
+                        continue
+                    self._esperando += 1
+                    inicio = time.perf_counter()
+                    try:
+                        trava.acquire()
+                    finally:
+                        self._esperando -= 1
+                    adquiridas += 1
+                    self._registrar(event, time.perf_counter() - inicio)
+                if _ordenar(salas_de()) == salas:
+                    yield
+                    return
+            finally:
+                for trava, _ in reversed(travas[:adquiridas]):
+                    trava.release()
+                self._devolver(salas)
+
+class AsyncRoomLocks(RoomLocks):
+    def __init__(self, metrics):
+        super().__init__(metrics, asyncio.Lock)
+
+    @contextlib.asynccontextmanager
+    async def travar(self, salas_de, event=None):
+        while True:
+            salas = _ordenar(salas_de())
+            travas = self._reservar(salas)
+            adquiridas = 0
+            try:
+                for trava, disputada in travas:
+                    if not disputada:
+                        await trava.acquire() # Nobody else holds or waits for it: returns without suspending
+                        adquiridas += 1
+                        self._registrar(event, None)
+                        continue
+                    self._esperando += 1
+                    inicio = time.perf_counter()
+                    try:
+                        await trava.acquire()
+                    finally:
+                        self._esperando -= 1
+                    adquiridas += 1
+                    self._registrar(event, time.perf_counter() - inicio)
+                if _ordenar(salas_de()) == salas:
+                    yield
+                    return
+            finally:
+                for trava, _ in reversed(travas[:adquiridas]):
+                    trava.release()
+                self._devolver(salas)
@@ -0,0 +1,123 @@
+# backend/sessions.py
+"""Session registries: O(1) lookups from sid to player and from player to sids, and the spectators of each lobby."""
+from collections import Counter
+
+class SessionRegistry:
+    """
+    Keeps three indexes over connected sockets consistent with each other:
+      sid -> {"room_id": room_id, "player_id": player_id, "protocol": protocol, "batch": bool, "encoding": encoding}
+      (room_id, player_id) -> sids of that player (a player may have several tabs open)
+      room_id -> sids registered in that lobby
+    """
+    def __init__(self):
+        self._por_sid = {}
+        self._por_jogador = {}
+        self._por_sala = {}
+
+    def __len__(self):
+        return len(self._por_sid)
+
+    def __contains__(self, sid):
+        return sid in self._por_sid
+
+    def get(self, sid):
+        """Session info for sid ({"room_id", "player_id", "protocol", "batch", "encoding"}), or None."""
+        return self._por_sid.get(sid)
+
+    def registrar(self, sid, room_id, player_id, protocol="full", batch=False, encoding="json"):
+        """Binds sid to (room_id, player_id), moving it if it was bound elsewhere (join and rejoin)."""
+        if sid in self._por_sid:
+            self.remover(sid)
+        self._por_sid[sid] = {"room_id": room_id, "player_id": player_id, "protocol": protocol, "batch": batch, "encoding": encoding}
+        self._por_jogador.setdefault((room_id, player_id), []).append(sid)
+        self._por_sala.setdefault(room_id, set()).add(sid)
+
+    def remover(self, sid):
+        """Unbinds sid (disconnect). Returns its session info, or None if it had none."""
+        info = self._por_sid.pop(sid, None)
+        if info is None:
+            return None
+        chave = (info["room_id"], info["player_id"])
+        sids = self._por_jogador[chave]
+        sids.remove(sid)
+        if not sids:
+            del self._por_jogador[chave]
+        sala = self._por_sala[info["room_id"]]
+        sala.discard(sid)
+        if not sala:
+            del self._por_sala[info["room_id"]]
+        return info
+
+    def remover_sala(self, room_id):
+        """Drops every session of a lobby that is being removed. Returns the sids that were bound to it."""
+        sids = self._por_sala.pop(room_id, set())
+        for sid in sids:
+            info = self._por_sid.pop(sid)
+            self._por_jogador.pop((room_id, info["player_id"]), None)
+        return sids
+
+    def sids_do_jogador(self, room_id, player_id):
+        return tuple(self._por_jogador.get((room_id, player_id), ()))
+
+    def sids_da_sala(self, room_id):
+        return frozenset(self._por_sala.get(room_id, ()))
+
+    def tem_sessoes(self, room_id):
+        return room_id in self._por_sala
+
+class SpectatorRegistry:
+    """
+    Sockets watching a lobby (see spectators.py). They are not players, so they
+    live apart from the sessions:
+      sid -> {"room_id": room_id, "encoding": encoding}
+      room_id -> {sid: encoding}
+      room_id -> Counter of encodings, so codificacoes() doesn't grow with the audience
+    """
+    def __init__(self):
+        self._por_sid = {}
+        self._por_sala = {}
+        self._codificacoes = {}
+
+    def __len__(self):
+        return len(self._por_sid)
+
+    def get(self, sid):
+        return self._por_sid.get(sid)
+
+    def registrar(self, sid, room_id, encoding="json"):
+        if sid in self._por_sid:
+            self.remover(sid)
+        self._por_sid[sid] = {"room_id": room_id, "encoding": encoding}
+        self._por_sala.setdefault(room_id, {})[sid] = encoding
+        self._codificacoes.setdefault(room_id, Counter())[encoding] += 1
+
+    def remover(self, sid):
+        """Unbinds sid. Returns its info, or None if it wasn't watching."""
+        info = self._por_sid.pop(sid, None)
+        if info is None:
+            return None
+        room_id = info["room_id"]
+        sala = self._por_sala[room_id]
+        del sala[sid]
+        codificacoes = self._codificacoes[room_id]
+        codificacoes[info["encoding"]] -= 1
+        if not codificacoes[info["encoding"]]:
+            del codificacoes[info["encoding"]]
+        if not sala:
+            del self._por_sala[room_id], self._codificacoes[room_id]
+        return info
+
+    def remover_sala(self, room_id):
+        """Drops the spectators of a lobby that is going away. Returns {sid: encoding}."""
+        sala = self._por_sala.pop(room_id, {})
+        self._codificacoes.pop(room_id, None)
+        for sid in sala:
+            del self._por_sid[sid]
+        return sala
+
+    def codificacoes(self, room_id):
+        """Encodings the lobby's spectators asked for; empty if nobody is watching."""
+        return frozenset(self._codificacoes.get(room_id, ()))
+
+    def contagem(self, room_id):
+        return len(self._por_sala.get(room_id, ()))
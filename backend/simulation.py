@@ -0,0 +1,157 @@
+# backend/simulation.py
+"""
+Headless simulation of complete Fodinha games.
+
+Drives FodinhaGame through the same start_new_round / submit_palpite /
+submit_card_play calls the server uses, but with bot policies instead of
+sockets, no prints, and one seedable RNG per game.
+
+A bid policy is any callable (game, player_id, rng) -> palpite and a play
+policy is any callable (game, player_id, rng) -> card index into the
+player's current hand. Both are called only when it is player_id's turn.
+
+Each round runs through the real engine, one Python call per action, so
+this does thousands of rounds per second (about 5-9k with the random bots,
+python simulation.py). For bulk runs batch_engine.py plays the same rules
+as NumPy array operations, at about 100k rounds per second.
+"""
+import random
+from game_logic import FodinhaGame, DESEMPATE_POR_CODIGO, N_CARTAS_BARALHO
+
+MAX_RODADAS_POR_PARTIDA = 500 # Safety cap for bots that never miss a bid
+
+# ── Bot policies ───────────────────────────────────────────────────────────────
+def palpites_permitidos(game):
+    """Legal bids for the player whose turn it is (applies the last-bid rule)."""
+    n_cartas = game.n_cartas_rodada_atual
+    is_ultimo = not game.ordem_palpites_rodada_atual and len(game.palpites_feitos_rodada_atual) == len(game.jogadores) - 1
+    proibido = n_cartas - game.soma_palpites_rodada_atual if is_ultimo else -1
+    return [p for p in range(n_cartas + 1) if p != proibido]
+
+def palpite_aleatorio(game, player_id, rng):
+    return rng.choice(palpites_permitidos(game))
+
+def palpite_por_manilhas(game, player_id, rng):
+    """
+    Bids one trick per manilha in hand, bumped by one if the last-bid rule forbids it.
+    In a 1-card round the own card is hidden, so it bids 1 when more than half of
+    the cards it could hold beat every card the others show.
+    """
+    forcas = game.forcas_rodada_atual
+    if game.n_cartas_rodada_atual == 1:
+        vencem, possiveis = _vencem_as_visiveis(game, player_id)
+        palpite = int(2 * vencem > possiveis)
+    else:
+        palpite = sum(1 for c in game.maos_rodada_atual[player_id] if forcas[c.codigo] >= 100)
+    if palpite not in palpites_permitidos(game):
+        palpite = (palpite + 1) % (game.n_cartas_rodada_atual + 1)
+    return palpite
+
+def _vencem_as_visiveis(game, player_id):
+    """1-card round: (cards player_id could hold that beat every card the others show, cards it could hold)."""
+    forcas = game.forcas_rodada_atual
+    chave = lambda c: (forcas[c], DESEMPATE_POR_CODIGO[c]) # The only trick is the last one, so ties go by suit
+    outras = [mao[0].codigo for j, mao in game.maos_rodada_atual.items() if j != player_id and mao]
+    melhor = max(chave(c) for c in outras)
+    vistas = set(outras)
+    vistas.add(game.carta_meio_rodada_atual.codigo)
+    vencem = sum(1 for c in range(N_CARTAS_BARALHO) if c not in vistas and chave(c) > melhor)
+    return vencem, N_CARTAS_BARALHO - len(vistas)
+
+def jogar_primeira_carta(game, player_id, rng):
+    return 0
+
+def jogar_carta_aleatoria(game, player_id, rng):
+    return rng.randrange(len(game.maos_rodada_atual[player_id]))
+
+def jogar_carta_mais_forte(game, player_id, rng):
+    mao = game.maos_rodada_atual[player_id]
+    forcas = game.forcas_rodada_atual
+    return max(range(len(mao)), key=lambda i: forcas[mao[i].codigo])
+
+# ── Seeding ────────────────────────────────────────────────────────────────────
+def seed_da_partida(seed, indice):
+    """
+    Derives the seed of game number `indice` from a master seed (splitmix64).
+    Game i always gets the same seed, no matter how games are batched or sharded.
+    """
+    z = (seed * 0x9E3779B97F4A7C15 + (indice + 1) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return z ^ (z >> 31)
+
+# ── Simulation ─────────────────────────────────────────────────────────────────
+def simular_partida(player_ids, bid_policy=palpite_aleatorio, play_policy=jogar_carta_aleatoria,
+                    seed=None, initial_lives=3, max_rodadas=MAX_RODADAS_POR_PARTIDA, rng=None, dealer_inicial=None):
+    """
+    Plays one full game and returns its result record:
+    {"seed", "rodadas", "game_over", "vidas", "eliminados", "vencedores", "historico"}
+    where historico has one entry per round with n_cartas, dealer, palpites,
+    vitorias and vidas_perdidas. dealer_inicial (an index into player_ids)
+    picks who deals first instead of the rng; the deals stay the same.
+    """
+    if rng is None:
+        rng = random.Random(seed)
+    game = FodinhaGame(list(player_ids), initial_lives=initial_lives, rng=rng, verbose=False)
+    if dealer_inicial is not None:
+        game.dealer_idx_global = dealer_inicial # After __init__ drew its own, so the rng stream is unchanged
+    historico = []
+
+    while len(historico) < max_rodadas and game.start_new_round():
+        vidas_antes = dict(game.vidas)
+
+        while game.round_phase == "waiting_palpites":
+            jogador = game.jogador_da_vez_acao
+            result = game.submit_palpite(jogador, bid_policy(game, jogador, rng))
+            if not result["success"]:
+                raise ValueError(f"Bid policy made an illegal bid for {jogador}: {result['error']}")
+
+        while game.round_phase == "waiting_card_play":
+            jogador = game.jogador_da_vez_acao
+            result = game.submit_card_play(jogador, play_policy(game, jogador, rng))
+            if not result["success"]:
+                raise ValueError(f"Play policy made an illegal play for {jogador}: {result['error']}")
+
+        historico.append({
+            "n_cartas": game.n_cartas_rodada_atual,
+            "dealer": game.dealer_rodada_atual,
+            "palpites": game.palpites_feitos_rodada_atual, # Replaced (not mutated) by the next round
+            "vitorias": game.vitorias_rodada_atual,
+            "vidas_perdidas": {j: vidas_antes[j] - game.vidas[j] for j in game.jogadores},
+        })
+
+    melhor = max(game.vidas.values())
+    return {
+        "seed": seed,
+        "rodadas": len(historico),
+        "game_over": game.game_over_global,
+        "vidas": game.vidas,
+        "eliminados": [j for j, v in game.vidas.items() if v <= 0],
+        "vencedores": [j for j, v in game.vidas.items() if v == melhor],
+        "historico": historico,
+    }
+
+def simular_partidas(n_partidas, player_ids=("P1", "P2", "P3", "P4"), bid_policy=palpite_aleatorio,
+                     play_policy=jogar_carta_aleatoria, seed=0, initial_lives=3,
+                     max_rodadas=MAX_RODADAS_POR_PARTIDA, primeiro_indice=0):
+    """
+    Plays n_partidas independent games and returns their records in order.
+    Game i is seeded with seed_da_partida(seed, primeiro_indice + i), so any
+    range of games can be reproduced on its own.
+    """
+    resultados = []
+    for indice in range(primeiro_indice, primeiro_indice + n_partidas):
+        registro = simular_partida(player_ids, bid_policy, play_policy, seed_da_partida(seed, indice),
+                                   initial_lives, max_rodadas)
+        registro["indice"] = indice
+        resultados.append(registro)
+    return resultados
+
+if __name__ == "__main__":
+    import time
+    inicio = time.perf_counter()
+    partidas = simular_partidas(2000, seed=42)
+    duracao = time.perf_counter() - inicio
+    rodadas = sum(p["rodadas"] for p in partidas)
+    print(f"{len(partidas)} partidas, {rodadas} rodadas em {duracao:.2f}s "
+          f"({len(partidas) / duracao:.0f} partidas/s, {rodadas / duracao:.0f} rodadas/s)")
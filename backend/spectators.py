@@ -0,0 +1,44 @@
+# backend/spectators.py
+"""
+Spectators: sockets that watch a lobby without playing in it.
+
+A client emits "spectate_lobby" {"room_id", "encoding"/"compression" (optional,
+see wire.py)} instead of join_lobby. Spectators don't take a seat (they don't
+count toward MAX_PLAYERS_PER_LOBBY), can't act, and only ever see the public
+view: FodinhaGame.get_public_game_state, with every hand hidden except in
+1-card rounds after bidding. They get:
+
+    spectating        {"room_id", "players", "spectators", "game_state"} on joining
+    spectator_update  {"room_id", "players", "game_state"} once per action that
+                      changed the lobby (its players or its game)
+    lobby_closed      {"room_id", "reason"} when the lobby goes away
+
+Each update is built once per action, whoever watches. It is broadcast to
+one sub-room per encoding in use, so it is serialized once per encoding
+rather than once per spectator. Socket.IO then queues the same packet on
+every spectator socket without waiting for any of them, so a slow spectator
+only delays itself, never the players or the action's handler.
+"""
+from wire import CODIFICACAO_JSON, CODIFICACAO_DEFLATE, codificar
+
+def sala_espectadores(room_id, codificacao=CODIFICACAO_JSON):
+    """Socket.IO room holding a lobby's spectators that use one encoding."""
+    return f"{room_id}#watch" if codificacao == CODIFICACAO_JSON else f"{room_id}#watch-{codificacao}"
+
+def vista_publica(room_id, lobby_data):
+    game_instance = lobby_data["game_instance"]
+    return {"room_id": room_id, "players": list(lobby_data["players"]),
+            "game_state": game_instance.get_public_game_state() if game_instance else None}
+
+def marca(lobby_data):
+    """What spectators have seen of a lobby; a new one means they need an update."""
+    game_instance = lobby_data["game_instance"]
+    # The game object itself, not its id(): a retired game may be freed and its id reused
+    return (tuple(lobby_data["players"]), game_instance, game_instance.state_version if game_instance else None)
+
+def transmitir(out, room_id, lobby_data, codificacoes):
+    """Queues one spectator_update per encoding the lobby's spectators use."""
+    vista = vista_publica(room_id, lobby_data)
+    for codificacao in codificacoes:
+        payload = vista if codificacao == CODIFICACAO_JSON else codificar(vista, codificacao == CODIFICACAO_DEFLATE)
+        out.emit("spectator_update", payload, sala_espectadores(room_id, codificacao))
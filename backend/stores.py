@@ -0,0 +1,419 @@
+# backend/stores.py
+"""
+Lobby/session stores behind LobbyServer (lobbies.py).
+
+A store provides:
+  games                  mapping room_id -> lobby dict (see LobbyServer)
+  sessions               SessionRegistry-compatible sid <-> (room_id, player_id) indexes
+  espectadores           SpectatorRegistry-compatible sid <-> room_id indexes for spectators
+  transacao()            context manager wrapped around every handler call
+  publicacao()           context manager wrapped around sending one handler's emits,
+                         so other workers get all of them or none in a poll
+  lobbies_em_jogo()      lobbies with a game instance (metrics gauge)
+  duravel                True if lobbies outlive the process (otherwise see checkpoint.py)
+  client_manager(async_mode, travas, sala_de)
+                         Socket.IO client manager that carries emits between workers
+                         (None keeps python-socketio's in-process default); `travas`
+                         are the server's room locks (room_locks.py) and sala_de maps
+                         an emit target to its lobby (LobbyServer.sala_do_destino)
+
+MemoryStore keeps everything in this process, as the server always did.
+SQLiteStore shares lobbies, sessions and emits between worker processes through
+one SQLite file, so several app.py/async_app.py processes can serve one
+deployment (behind a load balancer with sticky sessions):
+
+    FODINHA_STORE=sqlite:///tmp/fodinha.db PORT=5050 python app.py
+    FODINHA_STORE=sqlite:///tmp/fodinha.db PORT=5051 python app.py
+
+Each handler call is one SQLite write transaction: lobbies it reads are
+unpickled, and written back (if they changed) on commit. Emits are rows in a
+message table that every worker polls, so a player connected to worker A sees
+an action handled by worker B. It is the bundled stand-in for a real broker,
+good for one host; a Redis-backed store would implement the same interface.
+"""
+import time
+import pickle
+import sqlite3
+import asyncio
+import threading
+import contextlib
+import contextvars
+from collections.abc import MutableMapping
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+from sessions import SessionRegistry, SpectatorRegistry
+from wire import CODIFICACOES
+
+def criar_store(url=None):
+    """Store for a FODINHA_STORE url: empty/"memory" or "sqlite:///path/to/file.db"."""
+    if not url or url == "memory":
+        return MemoryStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unknown lobby store: {url}")
+
+class MemoryStore:
+    """Lobbies and sessions in this process's dicts (single worker)."""
+    duravel = False
+
+    def __init__(self):
+        self.games = {}
+        self.sessions = SessionRegistry()
+        self.espectadores = SpectatorRegistry()
+
+    def transacao(self):
+        return contextlib.nullcontext()
+
+    def publicacao(self):
+        return contextlib.nullcontext()
+
+    def lobbies_em_jogo(self):
+        return sum(1 for l in list(self.games.values()) if l["game_instance"]) # list(): handlers may add lobbies meanwhile
+
+    def client_manager(self, async_mode=False, travas=None, sala_de=None):
+        return None
+
+# ── SQLite ─────────────────────────────────────────────────────────────────────
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lobbies (
+    room_id TEXT PRIMARY KEY,
+    em_jogo INTEGER NOT NULL,
+    dados BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessoes (
+    ordem INTEGER PRIMARY KEY AUTOINCREMENT, -- Keeps sids_do_jogador in registration order
+    sid TEXT NOT NULL UNIQUE,
+    room_id TEXT NOT NULL,
+    player_id TEXT NOT NULL,
+    protocol TEXT NOT NULL,
+    lote INTEGER NOT NULL DEFAULT 0, -- Socket asked for batched emits (batching.py)
+    codificacao TEXT NOT NULL DEFAULT 'json' -- Payload encoding the socket asked for (wire.py)
+);
+CREATE INDEX IF NOT EXISTS sessoes_por_jogador ON sessoes (room_id, player_id);
+CREATE TABLE IF NOT EXISTS espectadores (
+    sid TEXT PRIMARY KEY,
+    room_id TEXT NOT NULL,
+    codificacao TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS espectadores_por_sala ON espectadores (room_id, codificacao);
+CREATE TABLE IF NOT EXISTS mensagens (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    criada REAL NOT NULL,
+    dados BLOB NOT NULL
+);
+"""
+RETENCAO_MENSAGENS = 60.0 # Seconds a published emit stays in the table
+LIMPEZA_A_CADA = 500      # Publishes between purges of old messages
+
+# Messages held back by the SQLiteStore.publicacao() open in this thread/greenlet/task
+_pendentes = contextvars.ContextVar("fodinha_mensagens_pendentes", default=None)
+
+class SQLiteStore:
+    duravel = True
+
+    def __init__(self, path, poll_interval=0.005):
+        self.path = path
+        self.poll_interval = poll_interval # How often idle workers look for new emits
+        self._local = threading.local() # One connection and open transaction per thread
+        self._publicadas = 0
+        self.db.executescript(SCHEMA)
+        colunas = {row[1] for row in self.db.execute("PRAGMA table_info(sessoes)")}
+        if "lote" not in colunas:
+            self.db.execute("ALTER TABLE sessoes ADD COLUMN lote INTEGER NOT NULL DEFAULT 0") # Database from before batching
+        if "codificacao" not in colunas:
+            self.db.execute("ALTER TABLE sessoes ADD COLUMN codificacao TEXT NOT NULL DEFAULT 'json'") # ... and before wire.py
+        self.games = SQLiteLobbies(self)
+        self.sessions = SQLiteSessions(self)
+        self.espectadores = SQLiteSpectators(self)
+
+    @property
+    def db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @property
+    def lobbies_da_transacao(self):
+        """room_id -> [lobby, pickled form when loaded] for the open transaction, or None outside one."""
+        return getattr(self._local, "lobbies", None)
+
+    @contextlib.contextmanager
+    def transacao(self):
+        db = self.db
+        db.execute("BEGIN IMMEDIATE") # Takes the write lock up front, so concurrent handlers queue instead of deadlocking
+        self._local.lobbies = {}
+        try:
+            yield
+            self.games.gravar(self._local.lobbies)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            self._local.lobbies = None
+
+    @contextlib.contextmanager
+    def publicacao(self):
+        # Without this, a worker polling between two emits of the same handler would deliver
+        # the first now and the rest a poll later, after events that came from newer actions.
+        # The messages are written in one transaction on exit, so none stays open while the
+        # handler's sends yield to other handlers (which share this thread's connection).
+        pendentes = []
+        token = _pendentes.set(pendentes)
+        try:
+            yield
+        finally:
+            _pendentes.reset(token)
+        if pendentes:
+            self.gravar_mensagens(pendentes)
+
+    def gravar_mensagens(self, mensagens):
+        """Appends pub/sub messages to the message table in one transaction."""
+        db = self.db
+        agora = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany("INSERT INTO mensagens (criada, dados) VALUES (?, ?)",
+                           [(agora, pickle.dumps(message)) for message in mensagens])
+            antes = self._publicadas
+            self._publicadas += len(mensagens)
+            if antes // LIMPEZA_A_CADA != self._publicadas // LIMPEZA_A_CADA:
+                db.execute("DELETE FROM mensagens WHERE criada < ?", (agora - RETENCAO_MENSAGENS,))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def lobbies_em_jogo(self):
+        return self.db.execute("SELECT COUNT(*) FROM lobbies WHERE em_jogo").fetchone()[0]
+
+    def client_manager(self, async_mode=False, travas=None, sala_de=None):
+        manager = AsyncSQLiteManager if async_mode else SQLiteManager
+        return manager(self, travas, sala_de)
+
+class SQLiteLobbies(MutableMapping):
+    """games mapping over the lobbies table; reads inside a transaction are cached and written back on commit."""
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, room_id):
+        abertos = self.store.lobbies_da_transacao
+        if abertos is not None and room_id in abertos:
+            return abertos[room_id][0]
+        row = self.store.db.execute("SELECT dados FROM lobbies WHERE room_id = ?", (room_id,)).fetchone()
+        if row is None:
+            raise KeyError(room_id)
+        lobby = pickle.loads(row[0])
+        if abertos is not None:
+            abertos[room_id] = [lobby, row[0]]
+        return lobby
+
+    def __setitem__(self, room_id, lobby):
+        abertos = self.store.lobbies_da_transacao
+        if abertos is None:
+            self.gravar({room_id: [lobby, None]})
+        else:
+            abertos[room_id] = [lobby, None]
+
+    def __delitem__(self, room_id):
+        abertos = self.store.lobbies_da_transacao
+        if abertos is not None:
+            abertos.pop(room_id, None)
+        if self.store.db.execute("DELETE FROM lobbies WHERE room_id = ?", (room_id,)).rowcount == 0:
+            raise KeyError(room_id)
+
+    def __contains__(self, room_id):
+        abertos = self.store.lobbies_da_transacao
+        if abertos is not None and room_id in abertos:
+            return True
+        return self.store.db.execute("SELECT 1 FROM lobbies WHERE room_id = ?", (room_id,)).fetchone() is not None
+
+    def __iter__(self):
+        return iter([row[0] for row in self.store.db.execute("SELECT room_id FROM lobbies")])
+
+    def __len__(self):
+        return self.store.db.execute("SELECT COUNT(*) FROM lobbies").fetchone()[0]
+
+    def gravar(self, lobbies):
+        """Writes back lobbies whose pickled form changed since they were loaded."""
+        for room_id, (lobby, carregado) in lobbies.items():
+            dados = pickle.dumps(lobby, pickle.HIGHEST_PROTOCOL)
+            if dados != carregado:
+                self.store.db.execute("INSERT OR REPLACE INTO lobbies (room_id, em_jogo, dados) VALUES (?, ?, ?)",
+                                      (room_id, lobby["game_instance"] is not None, dados))
+
+class SQLiteSessions:
+    """SessionRegistry over the sessoes table, same methods and return types."""
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return self.store.db.execute("SELECT COUNT(*) FROM sessoes").fetchone()[0]
+
+    def __contains__(self, sid):
+        return self.get(sid) is not None
+
+    def get(self, sid):
+        row = self.store.db.execute("SELECT room_id, player_id, protocol, lote, codificacao FROM sessoes WHERE sid = ?", (sid,)).fetchone()
+        return {"room_id": row[0], "player_id": row[1], "protocol": row[2], "batch": bool(row[3]), "encoding": row[4]} if row else None
+
+    def registrar(self, sid, room_id, player_id, protocol="full", batch=False, encoding="json"):
+        db = self.store.db
+        db.execute("DELETE FROM sessoes WHERE sid = ?", (sid,))
+        db.execute("INSERT INTO sessoes (sid, room_id, player_id, protocol, lote, codificacao) VALUES (?, ?, ?, ?, ?, ?)",
+                   (sid, room_id, player_id, protocol, batch, encoding))
+
+    def remover(self, sid):
+        info = self.get(sid)
+        if info is not None:
+            self.store.db.execute("DELETE FROM sessoes WHERE sid = ?", (sid,))
+        return info
+
+    def remover_sala(self, room_id):
+        sids = self.sids_da_sala(room_id)
+        self.store.db.execute("DELETE FROM sessoes WHERE room_id = ?", (room_id,))
+        return set(sids)
+
+    def sids_do_jogador(self, room_id, player_id):
+        rows = self.store.db.execute("SELECT sid FROM sessoes WHERE room_id = ? AND player_id = ? ORDER BY ordem", (room_id, player_id))
+        return tuple(row[0] for row in rows)
+
+    def sids_da_sala(self, room_id):
+        return frozenset(row[0] for row in self.store.db.execute("SELECT sid FROM sessoes WHERE room_id = ?", (room_id,)))
+
+    def tem_sessoes(self, room_id):
+        return self.store.db.execute("SELECT 1 FROM sessoes WHERE room_id = ? LIMIT 1", (room_id,)).fetchone() is not None
+
+class SQLiteSpectators:
+    """SpectatorRegistry over the espectadores table."""
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return self.store.db.execute("SELECT COUNT(*) FROM espectadores").fetchone()[0]
+
+    def get(self, sid):
+        row = self.store.db.execute("SELECT room_id, codificacao FROM espectadores WHERE sid = ?", (sid,)).fetchone()
+        return {"room_id": row[0], "encoding": row[1]} if row else None
+
+    def registrar(self, sid, room_id, encoding="json"):
+        self.store.db.execute("INSERT OR REPLACE INTO espectadores (sid, room_id, codificacao) VALUES (?, ?, ?)", (sid, room_id, encoding))
+
+    def remover(self, sid):
+        info = self.get(sid)
+        if info is not None:
+            self.store.db.execute("DELETE FROM espectadores WHERE sid = ?", (sid,))
+        return info
+
+    def remover_sala(self, room_id):
+        db = self.store.db
+        sala = dict(db.execute("SELECT sid, codificacao FROM espectadores WHERE room_id = ?", (room_id,)))
+        db.execute("DELETE FROM espectadores WHERE room_id = ?", (room_id,))
+        return sala
+
+    def codificacoes(self, room_id):
+        # One index probe per known encoding; DISTINCT would read every spectator of the lobby on each action
+        db = self.store.db
+        return frozenset(codificacao for codificacao in CODIFICACOES
+                         if db.execute("SELECT 1 FROM espectadores WHERE room_id = ? AND codificacao = ? LIMIT 1", (room_id, codificacao)).fetchone())
+
+    def contagem(self, room_id):
+        return self.store.db.execute("SELECT COUNT(*) FROM espectadores WHERE room_id = ?", (room_id,)).fetchone()[0]
+
+# ── Cross-process emits ────────────────────────────────────────────────────────
+class _CanalSQLite:
+    """
+    Message table shared by the sync and async client managers. Rows hold pickled
+    pub/sub messages. Delivering a message sends to sockets, which lets other
+    handlers run in between; holding the lobby's room lock while a run of its
+    messages goes out keeps local handlers from slipping their newer events
+    between the messages of an older remote action.
+    """
+    def _publicar(self, message):
+        pendentes = _pendentes.get()
+        if pendentes is not None:
+            pendentes.append(message)
+        else:
+            self.store.gravar_mensagens([message])
+
+    def _ultima_mensagem(self):
+        return self.store.db.execute("SELECT COALESCE(MAX(id), 0) FROM mensagens").fetchone()[0]
+
+    def _mensagens_desde(self, ultima):
+        return self.store.db.execute("SELECT id, dados FROM mensagens WHERE id > ? ORDER BY id", (ultima,)).fetchall()
+
+    def _lotes(self, mensagens):
+        """Unpickles polled rows into runs of consecutive messages for the same lobby: [(room_id or None, [message, ...])]."""
+        lotes = []
+        for _, dados in mensagens:
+            message = pickle.loads(dados)
+            destino = message.get("room")
+            sala = None
+            if self.sala_de and isinstance(destino, str) and message.get("host_id") != self.host_id: # Our own are skipped anyway
+                sala = self.sala_de(destino)
+            if lotes and lotes[-1][0] == sala:
+                lotes[-1][1].append(message)
+            else:
+                lotes.append((sala, [message]))
+        return lotes
+
+class SQLiteManager(_CanalSQLite, socketio.PubSubManager):
+    """Client manager for app.py (threads/eventlet) over a SQLiteStore."""
+    name = "sqlite"
+
+    def __init__(self, store, travas=None, sala_de=None, channel="socketio", write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.store = store
+        self.travas = travas
+        self.sala_de = sala_de
+
+    def _publish(self, data):
+        self._publicar(data)
+
+    def _listen(self):
+        ultima = self._ultima_mensagem()
+        while True:
+            mensagens = self._mensagens_desde(ultima)
+            if not mensagens:
+                self.server.sleep(self.store.poll_interval)
+                continue
+            ultima = mensagens[-1][0]
+            for sala, lote in self._lotes(mensagens):
+                if sala is None or self.travas is None:
+                    yield from lote
+                    continue
+                with self.travas.travar(lambda: (sala,), "pubsub"):
+                    yield from lote
+
+class AsyncSQLiteManager(_CanalSQLite, AsyncPubSubManager):
+    """Client manager for async_app.py over a SQLiteStore."""
+    name = "sqlite"
+
+    def __init__(self, store, travas=None, sala_de=None, channel="socketio", write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.store = store
+        self.travas = travas
+        self.sala_de = sala_de
+
+    async def _publish(self, data):
+        self._publicar(data)
+
+    async def _listen(self):
+        ultima = self._ultima_mensagem()
+        while True:
+            mensagens = self._mensagens_desde(ultima)
+            if not mensagens:
+                await asyncio.sleep(self.store.poll_interval)
+                continue
+            ultima = mensagens[-1][0]
+            for sala, lote in self._lotes(mensagens):
+                if sala is None or self.travas is None:
+                    for message in lote:
+                        yield message
+                    continue
+                async with self.travas.travar(lambda: (sala,), "pubsub"):
+                    for message in lote:
+                        yield message
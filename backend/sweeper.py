@@ -0,0 +1,98 @@
+# backend/sweeper.py
+"""
+Idle-lobby eviction.
+
+LobbyServer stamps every lobby a handler touches with "ativo_em" (wall-clock
+seconds). Every `interval` seconds the sweeper closes lobbies that have been
+idle longer than the TTL of their state:
+
+    waiting     no game started yet
+    in_game     a game instance that isn't over
+    game_over   the last game ended and nobody started another
+
+It also keeps the number of lobbies at or under max_lobbies: when a
+create_lobby would go over it, the least recently active lobbies are closed
+first (a percent of the cap at a time, so the scan for them is amortized).
+
+Closing is the internal "evict_lobby" event, run by the transport like any
+handler (same room lock, transaction and flush): players still connected get
+"lobby_closed" {"room_id", "reason"}, their sessions are dropped and the game
+goes to the game log. A lobby that saw activity after it was picked is left
+alone.
+
+    FODINHA_LOBBY_TTL="waiting=1800,in_game=3600,game_over=600"   seconds, any subset
+    FODINHA_MAX_LOBBIES=10000
+"""
+import os
+import time
+import heapq
+import asyncio
+
+TTL_PADRAO = {"waiting": 30 * 60, "in_game": 60 * 60, "game_over": 10 * 60}
+MAX_LOBBIES_PADRAO = 10_000
+
+def estado_do_lobby(lobby_data):
+    game_instance = lobby_data["game_instance"]
+    if game_instance is None:
+        return "waiting"
+    return "game_over" if game_instance.game_over_global else "in_game"
+
+def sweeper_do_ambiente(server):
+    ttls = dict(TTL_PADRAO)
+    for item in filter(None, os.environ.get("FODINHA_LOBBY_TTL", "").split(",")):
+        estado, _, segundos = item.partition("=")
+        if estado.strip() not in ttls:
+            raise ValueError(f"Unknown lobby state in FODINHA_LOBBY_TTL: {estado}")
+        ttls[estado.strip()] = float(segundos)
+    return LobbySweeper(server, ttls, int(os.environ.get("FODINHA_MAX_LOBBIES", MAX_LOBBIES_PADRAO)))
+
+class LobbySweeper:
+    def __init__(self, server, ttls=None, max_lobbies=MAX_LOBBIES_PADRAO, interval=10.0):
+        self.server = server
+        self.ttls = dict(TTL_PADRAO, **(ttls or {}))
+        self.max_lobbies = max_lobbies
+        self.interval = interval
+
+    def despejos(self, agora=None):
+        """evict_lobby payloads for lobbies past their TTL, then for the least recently active ones over the cap."""
+        agora = time.time() if agora is None else agora
+        despejos, vivos = [], []
+        for room_id in list(self.server.games):
+            lobby_data = self.server.games.get(room_id)
+            if lobby_data is None:
+                continue # Removed meanwhile
+            ativo_em = lobby_data.get("ativo_em", agora)
+            if agora - ativo_em > self.ttls[estado_do_lobby(lobby_data)]:
+                despejos.append({"room_id": room_id, "reason": "idle", "ativo_ate": ativo_em})
+            else:
+                vivos.append((ativo_em, room_id))
+        despejos += self._menos_ativos(vivos, len(vivos) - self.max_lobbies)
+        return despejos
+
+    def vagas(self):
+        """evict_lobby payloads making room for a new lobby; empty while under the cap."""
+        games = self.server.games
+        if len(games) < self.max_lobbies:
+            return []
+        vivos = [(l.get("ativo_em", 0), r) for r, l in ((r, games.get(r)) for r in list(games)) if l is not None]
+        return self._menos_ativos(vivos, len(vivos) - self.max_lobbies + max(1, self.max_lobbies // 100))
+
+    @staticmethod
+    def _menos_ativos(vivos, n):
+        if n <= 0:
+            return []
+        return [{"room_id": room_id, "reason": "capacity", "ativo_ate": ativo_em} for ativo_em, room_id in heapq.nsmallest(n, vivos)]
+
+    def rodar(self, sleep, executar):
+        """Background loop for app.py; executar(event, sid, data) runs an event like a socket handler."""
+        while True:
+            sleep(self.interval)
+            for data in self.despejos():
+                executar("evict_lobby", None, data)
+
+    async def rodar_async(self, executar):
+        """Background task for async_app.py; executar is the coroutine version."""
+        while True:
+            await asyncio.sleep(self.interval)
+            for data in self.despejos():
+                await executar("evict_lobby", None, data)
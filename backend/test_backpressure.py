@@ -0,0 +1,82 @@
+# backend/test_backpressure.py
+"""Slow consumers through LobbyServer.dispatch (see backpressure.py). Run with: python -m pytest test_backpressure.py"""
+import random
+from lobbies import LobbyServer
+from metrics import Metrics
+from backpressure import FilasDeSaida
+from simulation import palpites_permitidos
+
+def mesa(profundidades, batch=True):
+    """A started 2-player game whose sids report the queue depths in profundidades (0 until it is set up)."""
+    depois, profundidades_iniciais = dict(profundidades), profundidades
+    profundidades.update(a=0, b=0)
+    server = LobbyServer(Metrics(), verbose_games=False)
+    server.sementes = random.Random(7)
+    server.saida = FilasDeSaida(profundidades.get, lambda sid: None, server.metrics, server.sala_do_destino)
+    server.dispatch("create_lobby", "a", {"player_id": "A", "batch": batch})
+    room_id = next(iter(server.games))
+    server.dispatch("join_lobby", "b", {"room_id": room_id, "player_id": "B", "batch": batch})
+    server.dispatch("start_game", "a", {"room_id": room_id})
+    profundidades_iniciais.update(depois)
+    return server, room_id
+
+def eventos_para(out, sid):
+    """(event, payload) pairs sent to sid, with batches unpacked."""
+    eventos = []
+    for op in out:
+        if op[0] != "emit" or op[3] != sid:
+            continue
+        if op[1] == "batch":
+            estados = op[2]["states"]
+            eventos += [(e["event"], {**estados[e["state"]], **e["data"]} if "state" in e else e["data"]) for e in op[2]["events"]]
+        else:
+            eventos.append((op[1], op[2]))
+    return eventos
+
+def ultimo_palpite(server, room_id):
+    """Bids for everyone but the last bidder; returns the dispatch of the last bid (two game_updates to each player)."""
+    game = server.games[room_id]["game_instance"]
+    sids = {"A": "a", "B": "b"}
+    while len(game.palpites_feitos_rodada_atual) < len(game.jogadores) - 1:
+        server.dispatch("submit_palpite_action", sids[game.jogador_da_vez_acao],
+                        {"room_id": room_id, "palpite": palpites_permitidos(game)[0]})
+    return server.dispatch("submit_palpite_action", sids[game.jogador_da_vez_acao],
+                           {"room_id": room_id, "palpite": palpites_permitidos(game)[0]})
+
+def test_batching_sid_with_deep_queue_gets_only_newest_game_update():
+    profundidades = {"b": 50}
+    server, room_id = mesa(profundidades)
+    out = ultimo_palpite(server, room_id)
+
+    # The fast player gets both updates in one batch
+    assert [e for e, _ in eventos_para(out, "a") if e == "game_update"] == ["game_update", "game_update"]
+    # The slow one: the first update was superseded, the newest is held or went out ahead of a later event
+    updates = [p for e, p in eventos_para(out, "b") if e == "game_update"]
+    assert server.metrics.dropped_events["game_update"] == 1
+    assert len(updates) + len(server.saida) == 1
+
+    profundidades["b"] = 0 # The queue drained
+    for data in server.saida.drenados():
+        updates += [p for e, p in eventos_para(server.dispatch("drain_outbound", None, data), "b") if e == "game_update"]
+    assert [p["event_type"] for p in updates] == ["all_palpites_completed"]
+    assert len(server.saida) == 0
+
+def test_shallow_queue_keeps_every_game_update():
+    server, room_id = mesa({"b": 3})
+    out = ultimo_palpite(server, room_id)
+    assert [p["event_type"] for e, p in eventos_para(out, "b") if e == "game_update"] == ["palpite_submitted", "all_palpites_completed"]
+    assert len(server.saida) == 0
+
+def test_batch_counts_as_one_packet():
+    # Just under the threshold: the events of one batch don't queue behind each other, so nothing is held
+    server, room_id = mesa({"b": 7})
+    ultimo_palpite(server, room_id)
+    assert server.metrics.dropped_events["game_update"] == 0
+    assert len(server.saida) == 0
+
+def test_non_batching_sid_is_counted_per_event():
+    server, room_id = mesa({"b": 7}, batch=False)
+    out = ultimo_palpite(server, room_id)
+    # The first update takes the queue to 8, so the second one is held until the queue drains
+    assert [p["event_type"] for e, p in eventos_para(out, "b") if e == "game_update"] == ["palpite_submitted"]
+    assert len(server.saida) == 1
@@ -0,0 +1,125 @@
+# backend/test_checkpoint.py
+"""Warm restart from checkpoint.py through LobbyServer.dispatch. Run with: python -m pytest test_checkpoint.py"""
+import json
+import random
+import pytest
+from lobbies import LobbyServer, lobby_to_dict
+from metrics import Metrics
+from checkpoint import Checkpointer
+from simulation import palpites_permitidos
+
+def servidor(semente=7):
+    server = LobbyServer(Metrics(), verbose_games=False)
+    server.sementes = random.Random(semente)
+    return server
+
+def mesa(server, n_jogadores, prefixo="s"):
+    """A started game with players P1..Pn on sids <prefixo>1..<prefixo>n. Returns (room_id, {player_id: sid})."""
+    sids = {f"P{i}": f"{prefixo}{i}" for i in range(1, n_jogadores + 1)}
+    out = server.dispatch("create_lobby", sids["P1"], {"player_id": "P1"})
+    room_id = next(op[2]["room_id"] for op in out.ops if op[0] == "emit" and op[1] == "lobby_created")
+    for player_id, sid in list(sids.items())[1:]:
+        server.dispatch("join_lobby", sid, {"room_id": room_id, "player_id": player_id})
+    server.dispatch("start_game", sids["P1"], {"room_id": room_id})
+    return room_id, sids
+
+def agir(server, room_id, sids):
+    """Plays the next action of the game (first legal bid, first card, next round). False once it is over."""
+    game = server.games[room_id]["game_instance"]
+    if game.round_phase == "waiting_palpites":
+        server.dispatch("submit_palpite_action", sids[game.jogador_da_vez_acao], {"room_id": room_id, "palpite": palpites_permitidos(game)[0]})
+    elif game.round_phase == "waiting_card_play":
+        server.dispatch("submit_card_action", sids[game.jogador_da_vez_acao], {"room_id": room_id, "card_index": 0})
+    elif game.round_phase == "round_over":
+        server.dispatch("request_next_round_action", sids["P1"], {"room_id": room_id})
+    else:
+        return False
+    return True
+
+def gravar(server, path):
+    checkpointer = Checkpointer(server, path)
+    checkpointer.iniciar()
+    return checkpointer
+
+def restaurado(path):
+    server = servidor(semente=99) # Restored games keep their own seeds
+    assert Checkpointer(server, path).restaurar() == len(server.games)
+    return server
+
+@pytest.mark.parametrize("n_jogadores", range(2, 7))
+def test_restart_resumes_game_mid_round(tmp_path, n_jogadores):
+    path = str(tmp_path / "lobbies.checkpoint.jsonl")
+    antes = servidor()
+    checkpointer = gravar(antes, path)
+    room_id, sids = mesa(antes, n_jogadores)
+    for _ in range(3 * n_jogadores + 1): # Round 1, then the bids of round 2: the restart finds cards to play
+        agir(antes, room_id, sids)
+    checkpointer.fechar()
+
+    depois = restaurado(path)
+    assert list(depois.games) == [room_id]
+    assert lobby_to_dict(depois.games[room_id]) == lobby_to_dict(antes.games[room_id])
+
+    # Everyone comes back on a new socket with their token; the host takes over
+    tokens = antes.games[room_id]["tokens"]
+    novos = {player_id: "novo" + sid for player_id, sid in sids.items()}
+    for player_id, sid in novos.items():
+        out = depois.dispatch("join_lobby", sid, {"room_id": room_id, "player_id": player_id, "rejoin_token": tokens[player_id]})
+        estado = next(op[2] for op in out.ops if op[0] == "emit" and op[1] == "lobby_state")
+        assert estado["game_state"] == antes.games[room_id]["game_instance"].get_player_game_state(player_id)
+    assert depois.games[room_id]["host_sid"] == novos["P1"]
+
+    # Both servers play the rest of the game the same way
+    while agir(antes, room_id, sids):
+        assert agir(depois, room_id, novos)
+    assert not agir(depois, room_id, novos)
+    assert depois.games[room_id]["game_instance"].to_dict() == antes.games[room_id]["game_instance"].to_dict()
+
+def test_restored_seat_needs_its_token(tmp_path):
+    path = str(tmp_path / "lobbies.checkpoint.jsonl")
+    antes = servidor()
+    checkpointer = gravar(antes, path)
+    room_id, sids = mesa(antes, 3)
+    checkpointer.fechar()
+
+    depois = restaurado(path)
+    out = depois.dispatch("join_lobby", "intruso", {"room_id": room_id, "player_id": "P2", "rejoin_token": "chute"})
+    assert [op[1:3] for op in out.ops] == [("error", {"msg": f"Player P2 is already in lobby {room_id}."})]
+    assert "intruso" not in depois.sessions
+
+def test_removed_lobbies_and_torn_lines_are_skipped(tmp_path):
+    path = str(tmp_path / "lobbies.checkpoint.jsonl")
+    antes = servidor()
+    checkpointer = gravar(antes, path)
+    fechada, sids_fechada = mesa(antes, 2, prefixo="a")
+    checkpointer.ciclo()
+    aberta, _ = mesa(antes, 4, prefixo="b")
+    for sid in sids_fechada.values():
+        antes.dispatch("disconnect", sid)
+    checkpointer.fechar()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"room_id": "XYZ", "lob') # Crash in the middle of a write
+
+    depois = restaurado(path)
+    assert list(depois.games) == [aberta]
+    assert lobby_to_dict(depois.games[aberta]) == lobby_to_dict(antes.games[aberta])
+
+def test_compaction_keeps_latest_record_of_each_lobby(tmp_path):
+    path = str(tmp_path / "lobbies.checkpoint.jsonl")
+    antes = servidor()
+    checkpointer = Checkpointer(antes, path, compactar_acima=0)
+    checkpointer.iniciar()
+    salas = [mesa(antes, n, prefixo=f"m{n}_") for n in (2, 5)]
+    for _ in range(30):
+        for room_id, sids in salas:
+            agir(antes, room_id, sids)
+        checkpointer.ciclo()
+    checkpointer.fechar()
+
+    with open(path, encoding="utf-8") as f:
+        linhas = [json.loads(linha)["room_id"] for linha in f]
+    assert set(linhas) == {room_id for room_id, _ in salas}
+    assert len(linhas) < 30 # 60 records were written; older ones were compacted away
+    depois = restaurado(path)
+    for room_id, _ in salas:
+        assert lobby_to_dict(depois.games[room_id]) == lobby_to_dict(antes.games[room_id])
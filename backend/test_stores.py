@@ -0,0 +1,114 @@
+# backend/test_stores.py
+"""SQLiteStore against MemoryStore through LobbyServer.dispatch (see stores.py). Run with: python -m pytest test_stores.py"""
+import random
+import itertools
+import pytest
+import lobbies
+from lobbies import LobbyServer
+from metrics import Metrics
+from stores import MemoryStore, SQLiteStore
+from simulation import palpites_permitidos
+
+@pytest.fixture(autouse=True)
+def tokens_fixos(monkeypatch):
+    monkeypatch.setattr(lobbies, "generate_rejoin_token", lambda: "token")
+
+def servidor(store, monkeypatch):
+    """A LobbyServer over store whose room ids and deals are the same on every run, so two servers' emits can be compared."""
+    salas = itertools.count()
+    monkeypatch.setattr(lobbies, "generate_room_id", lambda: f"SALA{next(salas)}")
+    server = LobbyServer(Metrics(), store, verbose_games=False)
+    server.sementes = random.Random(7)
+    return server
+
+# One seat per connection option, so every kind of emit goes through the store
+JOGADORES = {
+    "P1": {},
+    "P2": {"protocol": "delta"},
+    "P3": {"batch": True},
+    "P4": {"encoding": "binary", "compression": "deflate"},
+}
+
+def partida(server, ops, rodadas=6):
+    """Seats JOGADORES plus a spectator, plays `rodadas` rounds and disconnects everyone. Returns the room_id."""
+    def d(event, sid, data=None):
+        ops.extend(server.dispatch(event, sid, data).ops)
+    d("create_lobby", "P1", {"player_id": "P1"})
+    room_id = next(iter(server.games))
+    for player_id, opcoes in list(JOGADORES.items())[1:]:
+        d("join_lobby", player_id, {"room_id": room_id, "player_id": player_id, **opcoes})
+    d("spectate_lobby", "espectador", {"room_id": room_id, "encoding": "binary"})
+    d("start_game", "P1", {"room_id": room_id})
+    rng = random.Random(3)
+    for _ in range(rodadas):
+        game = server.games[room_id]["game_instance"]
+        while game.round_phase == "waiting_palpites":
+            d("submit_palpite_action", game.jogador_da_vez_acao, {"room_id": room_id, "palpite": rng.choice(palpites_permitidos(game))})
+            game = server.games[room_id]["game_instance"]
+        while game.round_phase == "waiting_card_play":
+            d("submit_card_action", game.jogador_da_vez_acao, {"room_id": room_id, "card_index": 0})
+            game = server.games[room_id]["game_instance"]
+        if game.round_phase == "game_over":
+            break
+        d("request_next_round_action", "P1", {"room_id": room_id})
+    d("submit_card_action", "P2", {"room_id": room_id, "card_index": 0}) # Out of turn: an error to P2 only
+    for sid in (*JOGADORES, "espectador"):
+        d("disconnect", sid)
+    return room_id
+
+def test_sqlite_store_sends_what_memory_store_sends(tmp_path, monkeypatch):
+    memoria, sqlite = [], []
+    partida(servidor(MemoryStore(), monkeypatch), memoria)
+    partida(servidor(SQLiteStore(str(tmp_path / "fodinha.db")), monkeypatch), sqlite)
+    assert len(memoria) > 100
+    assert sqlite == memoria
+
+def test_other_worker_sees_lobby_sessions_and_game(tmp_path, monkeypatch):
+    caminho = str(tmp_path / "fodinha.db")
+    a = servidor(SQLiteStore(caminho), monkeypatch)
+    a.dispatch("create_lobby", "s1", {"player_id": "P1", "batch": True})
+    room_id = next(iter(a.games))
+    a.dispatch("join_lobby", "s2", {"room_id": room_id, "player_id": "P2", "encoding": "binary"})
+    a.dispatch("spectate_lobby", "s3", {"room_id": room_id})
+    a.dispatch("start_game", "s1", {"room_id": room_id})
+
+    b = servidor(SQLiteStore(caminho), monkeypatch) # A second process on the same file
+    assert list(b.games) == [room_id]
+    assert b.sessions.get("s1") == {"room_id": room_id, "player_id": "P1", "protocol": "full", "batch": True, "encoding": "json"}
+    assert b.sessions.get("s2")["encoding"] == "binary"
+    assert b.sessions.sids_da_sala(room_id) == {"s1", "s2"}
+    assert b.espectadores.get("s3") == {"room_id": room_id, "encoding": "json"}
+    assert b.store.lobbies_em_jogo() == 1
+
+    # b plays a turn of the game a started, and a reads it back
+    game = b.games[room_id]["game_instance"]
+    jogador = game.jogador_da_vez_acao
+    sid = {"P1": "s1", "P2": "s2"}[jogador]
+    b.dispatch("submit_palpite_action", sid, {"room_id": room_id, "palpite": palpites_permitidos(game)[0]})
+    assert a.games[room_id]["game_instance"].palpites_feitos_rodada_atual == {jogador: palpites_permitidos(game)[0]}
+
+def test_transaction_rolls_back_on_error(tmp_path):
+    store = SQLiteStore(str(tmp_path / "fodinha.db"))
+    store.games["SALA"] = {"game_instance": None, "players": ["P1"]}
+    with pytest.raises(RuntimeError):
+        with store.transacao():
+            store.games["SALA"]["players"].append("P2")
+            store.sessions.registrar("s2", "SALA", "P2")
+            raise RuntimeError("handler failed")
+    assert store.games["SALA"]["players"] == ["P1"]
+    assert "s2" not in store.sessions
+
+def test_session_tables_match_registries(tmp_path):
+    memoria, sqlite = MemoryStore(), SQLiteStore(str(tmp_path / "fodinha.db"))
+    for store in (memoria, sqlite):
+        store.sessions.registrar("s1", "SALA", "P1")
+        store.sessions.registrar("s2", "SALA", "P1", protocol="delta")
+        store.sessions.registrar("s3", "OUTRA", "P2", batch=True, encoding="binary")
+        store.sessions.registrar("s1", "SALA", "P1") # Re-registering moves s1 after s2
+        store.espectadores.registrar("e1", "SALA", "binary")
+        store.espectadores.registrar("e2", "SALA")
+    for metodo, args in [("sids_do_jogador", ("SALA", "P1")), ("sids_da_sala", ("SALA",)), ("tem_sessoes", ("OUTRA",)),
+                         ("get", ("s3",)), ("remover", ("s2",)), ("remover_sala", ("SALA",)), ("__len__", ())]:
+        assert getattr(sqlite.sessions, metodo)(*args) == getattr(memoria.sessions, metodo)(*args), metodo
+    for metodo, args in [("codificacoes", ("SALA",)), ("contagem", ("SALA",)), ("remover", ("e1",)), ("remover_sala", ("SALA",))]:
+        assert getattr(sqlite.espectadores, metodo)(*args) == getattr(memoria.espectadores, metodo)(*args), metodo
@@ -0,0 +1,94 @@
+# backend/test_sweeper.py
+"""Idle and over-capacity eviction (see sweeper.py) through LobbyServer.dispatch. Run with: python -m pytest test_sweeper.py"""
+import time
+import random
+import pytest
+from lobbies import LobbyServer
+from metrics import Metrics
+from stores import MemoryStore, SQLiteStore
+from sweeper import LobbySweeper
+from simulation import palpites_permitidos
+
+TTLS = {"waiting": 100, "in_game": 300, "game_over": 50}
+
+@pytest.fixture(params=["memory", "sqlite"])
+def server(request, tmp_path):
+    store = MemoryStore() if request.param == "memory" else SQLiteStore(str(tmp_path / "fodinha.db"))
+    server = LobbyServer(Metrics(), store, verbose_games=False)
+    server.sementes = random.Random(7)
+    return server
+
+def mesa(server, prefixo, n_jogadores=2, comecar=True):
+    """A lobby with players on sids <prefixo>1..<prefixo>n, started unless comecar is False. Returns (room_id, {player_id: sid})."""
+    sids = {f"P{i}": f"{prefixo}{i}" for i in range(1, n_jogadores + 1)}
+    out = server.dispatch("create_lobby", sids["P1"], {"player_id": "P1"})
+    room_id = next(op[2]["room_id"] for op in out.ops if op[0] == "emit" and op[1] == "lobby_created")
+    for player_id, sid in list(sids.items())[1:]:
+        server.dispatch("join_lobby", sid, {"room_id": room_id, "player_id": player_id})
+    if comecar:
+        server.dispatch("start_game", sids["P1"], {"room_id": room_id})
+    return room_id, sids
+
+def ate_o_fim(server, room_id, sids):
+    """Plays the game to its end (first legal bid, first card)."""
+    while True:
+        game = server.games[room_id]["game_instance"]
+        if game.round_phase == "waiting_palpites":
+            server.dispatch("submit_palpite_action", sids[game.jogador_da_vez_acao], {"room_id": room_id, "palpite": palpites_permitidos(game)[0]})
+        elif game.round_phase == "waiting_card_play":
+            server.dispatch("submit_card_action", sids[game.jogador_da_vez_acao], {"room_id": room_id, "card_index": 0})
+        elif game.round_phase == "round_over":
+            server.dispatch("request_next_round_action", sids["P1"], {"room_id": room_id})
+        else:
+            return
+
+def test_each_state_gets_its_ttl(server):
+    esperando, _ = mesa(server, "w", comecar=False)
+    jogando, sids = mesa(server, "j")
+    server.dispatch("spectate_lobby", "espectador", {"room_id": jogando, "encoding": "binary"})
+    acabou, sids_acabou = mesa(server, "f")
+    ate_o_fim(server, acabou, sids_acabou)
+    assert server.games[acabou]["game_instance"].game_over_global
+    sweeper = LobbySweeper(server, TTLS)
+    agora = time.time()
+
+    assert sweeper.despejos(agora + 49) == []
+    assert [d["room_id"] for d in sweeper.despejos(agora + 51)] == [acabou]
+    assert {d["room_id"] for d in sweeper.despejos(agora + 101)} == {esperando, acabou}
+    despejos = {d["room_id"]: d for d in sweeper.despejos(agora + 301)}
+    assert set(despejos) == {esperando, jogando, acabou}
+    assert {d["reason"] for d in despejos.values()} == {"idle"}
+
+    out = server.dispatch("evict_lobby", None, despejos[jogando])
+    fechado = {"room_id": jogando, "reason": "idle"}
+    assert ("emit", "lobby_closed", fechado, jogando) in out.ops
+    assert any(op[:2] == ("emit", "lobby_closed") and op[3].startswith(jogando + "#") for op in out.ops) # The spectators' sub-room
+    assert jogando not in server.games
+    assert not server.sessions.tem_sessoes(jogando) and server.espectadores.get("espectador") is None
+    assert server.sessions.get(sids["P1"]) is None
+    assert server.metrics.evictions["idle"] == 1
+
+def test_lobby_active_after_being_picked_stays(server):
+    room_id, sids = mesa(server, "a")
+    sweeper = LobbySweeper(server, TTLS)
+    despejo, = sweeper.despejos(time.time() + 301)
+    despejo["ativo_ate"] -= 1 # The lobby saw an action after the sweeper looked at it
+    assert server.dispatch("evict_lobby", None, despejo).ops == []
+    assert room_id in server.games
+    assert server.dispatch("evict_lobby", None, {"room_id": "SUMIU", "reason": "idle", "ativo_ate": 0}).ops == []
+
+def test_cap_closes_least_recently_active_first(server):
+    salas = [mesa(server, f"c{i}_", comecar=False)[0] for i in range(4)]
+    for i, room_id in enumerate(salas):
+        with server.store.transacao():
+            server.games[room_id]["ativo_em"] = 1000 + (i * 7) % 4 # 1000, 1003, 1002, 1001
+    sweeper = LobbySweeper(server, TTLS, max_lobbies=4)
+    assert [d["room_id"] for d in sweeper.vagas()] == [salas[0]] # At the cap: one slot for the new lobby
+    sweeper.max_lobbies = 2
+    despejos = sweeper.despejos(1001)
+    assert [(d["room_id"], d["reason"]) for d in despejos] == [(salas[0], "capacity"), (salas[3], "capacity")]
+    for despejo in despejos:
+        server.dispatch("evict_lobby", None, despejo)
+    assert sorted(server.games) == sorted(salas[1:3])
+    assert sweeper.vagas() == [{"room_id": salas[2], "reason": "capacity", "ativo_ate": 1002}]
+    assert server.metrics.evictions["capacity"] == 2
@@ -0,0 +1,87 @@
+# backend/test_turn_timers.py
+"""Turn deadlines (see turn_timers.py) through LobbyServer.dispatch with a fake clock. Run with: python -m pytest test_turn_timers.py"""
+import random
+from lobbies import LobbyServer
+from metrics import Metrics
+from game_logic import CARTAS, N_CARTAS_BARALHO
+from simulation import palpites_permitidos
+from turn_timers import RelogioDeTurnos, palpite_padrao
+
+def mesa(n_jogadores=3):
+    """A started game on a server whose turn clock reads relogio[0]. Returns (server, room_id, {player_id: sid}, relogio)."""
+    relogio = [1000.0]
+    server = LobbyServer(Metrics(), verbose_games=False)
+    server.sementes = random.Random(11)
+    server.turnos = RelogioDeTurnos({"palpite": 45, "card": 30}, relogio=lambda: relogio[0])
+    sids = {f"P{i}": f"s{i}" for i in range(1, n_jogadores + 1)}
+    out = server.dispatch("create_lobby", "s1", {"player_id": "P1"})
+    room_id = next(op[2]["room_id"] for op in out.ops if op[0] == "emit" and op[1] == "lobby_created")
+    for player_id, sid in list(sids.items())[1:]:
+        server.dispatch("join_lobby", sid, {"room_id": room_id, "player_id": player_id})
+    server.dispatch("start_game", "s1", {"room_id": room_id})
+    return server, room_id, sids, relogio
+
+def emitidos(out, event):
+    return [op[2] for op in out.ops if op[0] == "emit" and op[1] == event]
+
+def test_idle_players_are_played_for_until_the_round_ends():
+    server, room_id, sids, relogio = mesa()
+    game = server.games[room_id]["game_instance"]
+    assert game.n_cartas_rodada_atual == 1 and game.round_phase == "waiting_palpites"
+
+    relogio[0] += 44.9
+    assert server.turnos.vencidos() == []
+    fases = []
+    while game.round_phase in ("waiting_palpites", "waiting_card_play"):
+        jogador, fase = game.jogador_da_vez_acao, game.round_phase
+        permitidos = palpites_permitidos(game)
+        relogio[0] += 45 if fase == "waiting_palpites" else 30
+        vencido, = server.turnos.vencidos()
+        out = server.dispatch("turn_timeout", None, vencido)
+        assert emitidos(out, "turn_timeout") == [{"room_id": room_id, "player_id": jogador, "phase": fase}]
+        if fase == "waiting_palpites":
+            assert game.palpites_feitos_rodada_atual[jogador] == min(permitidos)
+        else:
+            assert game.maos_rodada_atual[jogador] == [] # Its only card was played
+        assert not emitidos(out, "action_error") and not emitidos(out, "error")
+        fases.append(fase)
+    assert game.round_phase == "round_over"
+    assert emitidos(out, "round_results")
+    assert fases == ["waiting_palpites"] * 3 + ["waiting_card_play"] * 3
+    assert server.metrics.turn_timeouts == {"waiting_palpites": 3, "waiting_card_play": 3}
+    assert len(server.turnos) == 0 # Nobody is on the clock between rounds
+
+def test_turn_played_in_time_cancels_its_deadline():
+    server, room_id, sids, relogio = mesa()
+    game = server.games[room_id]["game_instance"]
+    relogio[0] += 40
+    server.dispatch("submit_palpite_action", sids[game.jogador_da_vez_acao], {"room_id": room_id, "palpite": 0})
+    relogio[0] += 10 # 50s after the deal, 10s into the next player's turn
+    assert server.turnos.vencidos() == []
+
+    # A deadline that fires as its turn is being played finds the turn changed
+    relogio[0] += 35
+    vencido, = server.turnos.vencidos()
+    server.dispatch("submit_palpite_action", sids[game.jogador_da_vez_acao], {"room_id": room_id, "palpite": 0})
+    acoes = len(game.acoes)
+    assert server.dispatch("turn_timeout", None, vencido).ops == []
+    assert len(game.acoes) == acoes and server.metrics.turn_timeouts == {}
+
+def test_closing_the_lobby_drops_its_deadline():
+    server, room_id, sids, relogio = mesa(2)
+    assert len(server.turnos) == 1
+    for sid in sids.values():
+        server.dispatch("disconnect", sid)
+    assert room_id not in server.games and len(server.turnos) == 0
+
+def test_one_card_default_ignores_the_own_card():
+    server, room_id, sids, relogio = mesa(4)
+    game = server.games[room_id]["game_instance"]
+    jogador = game.jogador_da_vez_acao
+    vistas = {game.carta_meio_rodada_atual.codigo} | {m[0].codigo for j, m in game.maos_rodada_atual.items() if j != jogador}
+    palpites = set()
+    for codigo in range(N_CARTAS_BARALHO):
+        if codigo not in vistas:
+            game.maos_rodada_atual[jogador] = [CARTAS[codigo]]
+            palpites.add(palpite_padrao(game, jogador))
+    assert palpites == {min(palpites_permitidos(game))}
@@ -0,0 +1,116 @@
+# backend/test_wire.py
+"""Binary payloads (see wire.py) decode to the JSON they replace. Run with: python -m pytest test_wire.py"""
+import json
+import random
+import itertools
+import pytest
+import lobbies
+import wire
+from lobbies import LobbyServer
+from metrics import Metrics
+from simulation import palpite_por_manilhas
+from spectators import sala_espectadores
+from wire import CODIFICACAO_BINARIA, CODIFICACAO_DEFLATE, COMPRIMIDO, codificar, decodificar
+
+# Connection options per seat, cycled: batched and unbatched sockets on each encoding
+OPCOES = (
+    {"encoding": "binary"},
+    {"encoding": "binary", "compression": "deflate", "batch": True},
+    {"encoding": "binary", "batch": True, "protocol": "delta"},
+    {"encoding": "binary", "compression": "deflate"},
+)
+
+def como_json(valor):
+    return json.loads(json.dumps(valor))
+
+def partida(monkeypatch, n_jogadores, binario):
+    """
+    Plays a seeded game to its end with players and spectators on every
+    encoding, or all of them on JSON when binario is false. Returns the ops
+    of each dispatch.
+    """
+    salas = itertools.count()
+    monkeypatch.setattr(lobbies, "generate_room_id", lambda: f"SALA{next(salas)}")
+    monkeypatch.setattr(lobbies, "generate_rejoin_token", lambda: "token")
+    server = LobbyServer(Metrics(), verbose_games=False)
+    server.sementes = random.Random(n_jogadores)
+    despachos = []
+    def d(event, sid, data):
+        despachos.append(server.dispatch(event, sid, data).ops)
+
+    jogadores = [f"Jogador {i} da mesa de {n_jogadores}" for i in range(n_jogadores)]
+    opcoes = {p: dict(OPCOES[i % len(OPCOES)]) for i, p in enumerate(jogadores)}
+    if not binario:
+        for o in opcoes.values():
+            o.pop("encoding") # Still batched/delta the same way; compression alone is ignored
+    d("create_lobby", jogadores[0], {"player_id": jogadores[0], **opcoes[jogadores[0]]})
+    room_id = "SALA0"
+    for p in jogadores[1:]:
+        d("join_lobby", p, {"room_id": room_id, "player_id": p, **opcoes[p]})
+    for sid, codificacao in (("espectador-json", {}), ("espectador-bin", {"encoding": "binary"}),
+                             ("espectador-deflate", {"encoding": "binary", "compression": "deflate"})):
+        d("spectate_lobby", sid, {"room_id": room_id, **(codificacao if binario else {})})
+    d("start_game", jogadores[0], {"room_id": room_id})
+    while True:
+        game = server.games[room_id]["game_instance"]
+        if game.round_phase == "waiting_palpites":
+            d("submit_palpite_action", game.jogador_da_vez_acao, {"room_id": room_id, "palpite": palpite_por_manilhas(game, game.jogador_da_vez_acao, None)})
+        elif game.round_phase == "waiting_card_play":
+            d("submit_card_action", game.jogador_da_vez_acao, {"room_id": room_id, "card_index": 0})
+        elif game.round_phase == "round_over":
+            d("request_next_round_action", jogadores[0], {"room_id": room_id})
+        else:
+            break
+    d("request_resync", jogadores[-1], {"room_id": room_id})
+    return despachos
+
+def sem_salas_de_espectadores(ops):
+    """Ops minus the spectator sub-rooms' (one per encoding in use, so their number differs)."""
+    return [op for op in ops if "#watch" not in op[-1]]
+
+@pytest.mark.parametrize("limiar", [wire.COMPRIMIR_A_PARTIR_DE, 0]) # 0: deflate even the small tables' payloads
+@pytest.mark.parametrize("n_jogadores", range(2, 7))
+def test_binary_emits_decode_to_the_json_ones(monkeypatch, n_jogadores, limiar):
+    monkeypatch.setattr(wire, "COMPRIMIR_A_PARTIR_DE", limiar)
+    binarios = partida(monkeypatch, n_jogadores, binario=True)
+    jsons = partida(monkeypatch, n_jogadores, binario=False)
+    assert len(binarios) == len(jsons)
+    vistos = set()
+    for ops_bin, ops_json in zip(binarios, jsons):
+        # The same emits, the binary sockets' as payload bytes
+        ops_bin, ops_json = sem_salas_de_espectadores(ops_bin), sem_salas_de_espectadores(ops_json)
+        assert [op[:2] + op[3:] for op in ops_bin] == [op[:2] + op[3:] for op in ops_json]
+        for op_bin, op_json in zip(ops_bin, ops_json):
+            if op_bin[0] == "emit" and isinstance(op_bin[2], bytes):
+                assert decodificar(op_bin[2]) == como_json(op_json[2]), op_bin[1]
+                vistos.add((op_bin[1], bool(op_bin[2][0] & COMPRIMIDO)))
+            else:
+                assert op_bin == op_json
+    for ops in binarios:
+        # Spectator updates: each encoding's decodes to the JSON one
+        por_sala = {op[3]: op[2] for op in ops if op[0] == "emit" and op[1] == "spectator_update"}
+        if por_sala:
+            vista = como_json(por_sala.pop(sala_espectadores("SALA0")))
+            for codificacao in (CODIFICACAO_BINARIA, CODIFICACAO_DEFLATE):
+                assert decodificar(por_sala[sala_espectadores("SALA0", codificacao)]) == vista
+    # Every kind of game-state emit went out, and deflate was used where it was asked for and paid off
+    assert {event for event, _ in vistos} >= {"game_started", "game_update", "prompt_palpite", "prompt_card_play",
+                                              "round_results", "batch", "lobby_joined", "spectating"}
+    if limiar == 0 or n_jogadores >= 5:
+        assert ("game_update", True) in vistos and ("batch", True) in vistos
+
+def test_more_than_32_strings_use_long_back_references():
+    textos = [f"jogador-{i}" for i in range(40)]
+    valor = {"players": textos, "lives": {t: i for i, t in enumerate(textos)}, "events": [{"event": "lobby_message", "msg": t} for t in reversed(textos)]}
+    dados = codificar(valor)
+    assert decodificar(dados) == valor
+    assert bytes([0x0D, 35]) in dados # Back-reference 35, past the one-byte 0x20-0x3F range
+    comprimido = codificar(valor, comprimir=True)
+    assert comprimido[0] & COMPRIMIDO and len(comprimido) < len(dados)
+    assert decodificar(comprimido) == valor
+
+def test_scalars_round_trip():
+    valores = [None, True, False, 0, 63, 64, 2 ** 70, -1, -2 ** 40, 1.5, -0.25, "", "HIDDEN", "ç ♣ 🂡",
+               ["HIDDEN"] * 3, [], {}, {"1": [None]}]
+    for comprimir in (False, True):
+        assert decodificar(codificar(valores, comprimir)) == valores
@@ -0,0 +1,346 @@
+# backend/tournament.py
+"""
+Bot tournaments: how new bots qualify before they face real players.
+
+A bot is a named pair of policies (simulation.py signatures), written
+"nome=palpite:jogada" where each policy is a function of simulation.py or
+"modulo.funcao":
+
+    manilhas=palpite_por_manilhas:jogar_carta_mais_forte
+    tecnico=bid_tables.palpite_por_tabela:endgame.jogar_por_solver
+
+Formats (tables of --mesa bots):
+
+    round-robin  every group of --mesa bots in the roster meets once
+    swiss        --rodadas rounds; each round seats bots of similar standing
+                 together, avoiding repeat meetings where it can. When the
+                 roster doesn't divide into tables, the lowest-ranked bots
+                 with the fewest byes so far sit the round out.
+
+Each meeting plays --partidas deals in every rotation of its seating, with
+seat 0 dealing first (dealer_inicial), so every bot sits in each seat and
+deals first equally often. The rotations of a deal share its seed: the first
+round's cards are the same, only who holds them changes.
+
+Scoring: in each game a bot gets 2 half-points per opponent that ended with
+fewer lives and 1 per tie, so pontos = half-points / 2(k - 1) is 1 for
+outliving the whole table and 0.5 on average. Standings give mean pontos
+with a 95% confidence interval (mean ± 1.96 standard errors over games).
+
+A meeting's deals are split into units of --bloco deals in one rotation and
+spread over a process pool (all cores by default). Workers only return
+integer counters, so the standings for a seed are the same for any number of
+workers. Every finished unit is appended to the --checkpoint file (JSON
+lines, fsynced); rerunning with the same arguments skips the units already
+there. Swiss pairings depend only on earlier results, so they come out the
+same on resume.
+
+    python tournament.py --bot a=palpite_aleatorio:jogar_carta_aleatoria \\
+        --bot m=palpite_por_manilhas:jogar_carta_mais_forte --bot ... \\
+        --formato swiss --rodadas 5 --mesa 4 --partidas 500 --checkpoint torneio.jsonl
+"""
+import os
+import json
+import math
+import time
+import argparse
+import importlib
+import itertools
+import multiprocessing
+from collections import Counter
+import simulation
+from simulation import MAX_RODADAS_POR_PARTIDA, seed_da_partida, simular_partida
+
+FORMATOS = ("round-robin", "swiss")
+Z_95 = 1.959963984540054
+BOTS_PADRAO = (
+    "aleatorio=palpite_aleatorio:jogar_carta_aleatoria",
+    "primeira=palpite_aleatorio:jogar_primeira_carta",
+    "forte=palpite_aleatorio:jogar_carta_mais_forte",
+    "manilhas=palpite_por_manilhas:jogar_carta_mais_forte",
+)
+
+# ── Roster ─────────────────────────────────────────────────────────────────────
+def politica(nome):
+    """A policy by name: a function of simulation.py, or "modulo.funcao"."""
+    modulo, _, funcao = nome.rpartition(".")
+    return getattr(importlib.import_module(modulo) if modulo else simulation, funcao)
+
+def bot(especificacao):
+    """(nome, bid_policy, play_policy) from "nome=palpite:jogada"."""
+    nome, igual, politicas = especificacao.partition("=")
+    palpite, dois_pontos, jogada = politicas.partition(":")
+    if not (nome and igual and palpite and dois_pontos and jogada):
+        raise ValueError(f"A bot is nome=palpite:jogada, got {especificacao!r}")
+    return nome, politica(palpite), politica(jogada)
+
+class PorJogador:
+    """Policy (simulation.py signature) that hands each player's turn to that player's own policy."""
+    def __init__(self, politicas):
+        self.politicas = politicas # player_id -> policy; module-level functions, so this pickles
+
+    def __call__(self, game, player_id, rng):
+        return self.politicas[player_id](game, player_id, rng)
+
+# ── Standings ──────────────────────────────────────────────────────────────────
+class Classificacao:
+    """Integer counters per bot; merge() is plain addition, as in monte_carlo.Estatisticas."""
+    def __init__(self):
+        self.mesas = 0   # Games played
+        self.rodadas = 0
+        self.partidas = Counter()     # bot -> games played
+        self.meios_pontos = Counter() # bot -> half-points
+        self.quadrados = Counter()    # bot -> sum over games of half-points squared (for the variance)
+        self.vitorias = Counter()     # bot -> games finished with the most lives (ties count for each)
+        self.assentos = Counter()     # (bot, seat) -> games; seat 0 dealt first
+
+    def adicionar_partida(self, registro, player_ids):
+        self.mesas += 1
+        self.rodadas += registro["rodadas"]
+        self.vitorias.update(registro["vencedores"])
+        vidas = registro["vidas"]
+        for assento, nome in enumerate(player_ids):
+            meios = sum(2 if vidas[nome] > vidas[outro] else vidas[nome] == vidas[outro]
+                        for outro in player_ids if outro != nome)
+            self.partidas[nome] += 1
+            self.meios_pontos[nome] += meios
+            self.quadrados[nome] += meios * meios
+            self.assentos[nome, assento] += 1
+
+    def merge(self, outra):
+        self.mesas += outra.mesas
+        self.rodadas += outra.rodadas
+        self.partidas.update(outra.partidas)
+        self.meios_pontos.update(outra.meios_pontos)
+        self.quadrados.update(outra.quadrados)
+        self.vitorias.update(outra.vitorias)
+        self.assentos.update(outra.assentos)
+        return self
+
+    def to_dict(self):
+        return {"mesas": self.mesas, "rodadas": self.rodadas, "partidas": self.partidas,
+                "meios_pontos": self.meios_pontos, "quadrados": self.quadrados, "vitorias": self.vitorias,
+                "assentos": [[nome, assento, n] for (nome, assento), n in self.assentos.items()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        classificacao = cls()
+        classificacao.mesas = data["mesas"]
+        classificacao.rodadas = data["rodadas"]
+        for campo in ("partidas", "meios_pontos", "quadrados", "vitorias"):
+            getattr(classificacao, campo).update(data[campo])
+        classificacao.assentos.update({(nome, assento): n for nome, assento, n in data["assentos"]})
+        return classificacao
+
+    def pontos(self, nome, mesa):
+        n = self.partidas[nome]
+        return self.meios_pontos[nome] / (n * 2 * (mesa - 1)) if n else 0.5
+
+    def resumo(self, nomes, mesa):
+        """One row per bot, best first: pontos with its 95% interval, win rate and games per seat."""
+        linhas = []
+        for nome in nomes:
+            n, soma = self.partidas[nome], self.meios_pontos[nome]
+            pontos = self.pontos(nome, mesa)
+            margem = 1.0
+            if n > 1:
+                variancia = max(0.0, (self.quadrados[nome] - soma * soma / n) / (n - 1))
+                margem = Z_95 * math.sqrt(variancia / n) / (2 * (mesa - 1))
+            linhas.append({
+                "bot": nome,
+                "partidas": n,
+                "pontos": pontos,
+                "ic95": (max(0.0, pontos - margem), min(1.0, pontos + margem)),
+                "taxa_de_vitoria": self.vitorias[nome] / n if n else 0.0,
+                "assentos": [self.assentos[nome, assento] for assento in range(mesa)],
+            })
+        linhas.sort(key=lambda linha: (-linha["pontos"], linha["bot"]))
+        return linhas
+
+# ── Pairings ───────────────────────────────────────────────────────────────────
+def mesas_swiss(ordem, mesa, encontros, folgas):
+    """
+    One Swiss round: `ordem` is the roster by standing (best first),
+    encontros a Counter of frozenset({a, b}) -> meetings so far and folgas a
+    Counter of byes. Returns (tables, bots on a bye).
+    """
+    n_folgas = len(ordem) % mesa
+    # The lowest-ranked of those with the fewest byes sit out
+    de_folga = sorted(reversed(ordem), key=lambda nome: folgas[nome])[:n_folgas]
+    livres = [nome for nome in ordem if nome not in de_folga]
+    mesas = []
+    while livres:
+        sentados = [livres.pop(0)]
+        while len(sentados) < mesa:
+            # The best-placed bot among those that met this table the least
+            escolhido = min(range(len(livres)),
+                            key=lambda i: (sum(encontros[frozenset((livres[i], s))] for s in sentados), i))
+            sentados.append(livres.pop(escolhido))
+        mesas.append(tuple(sentados))
+    return mesas, de_folga
+
+# ── Running ────────────────────────────────────────────────────────────────────
+def _jogar_unidade(tarefa):
+    """Worker entry point: deals [inicio, inicio + n) of a meeting in one rotation of its seating."""
+    chave, bots, rotacao, seed, inicio, n, initial_lives, max_rodadas = tarefa
+    sentados = bots[rotacao:] + bots[:rotacao]
+    player_ids = [nome for nome, _, _ in sentados]
+    palpites = PorJogador({nome: palpite for nome, palpite, _ in sentados})
+    jogadas = PorJogador({nome: jogada for nome, _, jogada in sentados})
+    classificacao = Classificacao()
+    for indice in range(inicio, inicio + n):
+        registro = simular_partida(player_ids, palpites, jogadas, seed_da_partida(seed, indice),
+                                   initial_lives, max_rodadas, dealer_inicial=0)
+        classificacao.adicionar_partida(registro, player_ids)
+    return chave, classificacao
+
+class Torneio:
+    def __init__(self, especificacoes=BOTS_PADRAO, mesa=4, formato="round-robin", partidas=100, rodadas=None,
+                 seed=0, tamanho_bloco=50, initial_lives=3, max_rodadas=MAX_RODADAS_POR_PARTIDA, checkpoint=None):
+        if formato not in FORMATOS:
+            raise ValueError(f"Unknown tournament format {formato!r}")
+        self.bots = [bot(especificacao) for especificacao in especificacoes]
+        self.nomes = [nome for nome, _, _ in self.bots]
+        if len(set(self.nomes)) != len(self.nomes):
+            raise ValueError("Bot names must be unique")
+        if not 2 <= mesa <= len(self.bots):
+            raise ValueError(f"Tables of {mesa} need between 2 and {len(self.bots)} players")
+        self.mesa = mesa
+        self.formato = formato
+        self.rodadas = 1 if formato == "round-robin" else rodadas or max(1, math.ceil(math.log2(len(self.bots))))
+        self.configuracao = {"bots": list(especificacoes), "mesa": mesa, "formato": formato, "partidas": partidas,
+                             "rodadas": self.rodadas, "seed": seed, "bloco": tamanho_bloco,
+                             "vidas": initial_lives, "max_rodadas": max_rodadas}
+        self.partidas = partidas
+        self.seed = seed
+        self.tamanho_bloco = tamanho_bloco
+        self.initial_lives = initial_lives
+        self.max_rodadas = max_rodadas
+        self.checkpoint = checkpoint
+        self.classificacao = Classificacao()
+        self.feitas = {} # chave -> (bots, Classificacao) of the units already in the checkpoint
+        self.mesas_retomadas = 0
+        self.mesas_jogadas = 0 # This run only, for mesas/s
+        self.segundos = 0.0
+
+    def rodar(self, n_workers=None, ao_receber_unidade=None):
+        """
+        Plays every round and returns the standings (Classificacao).
+        ao_receber_unidade(torneio, rodada, feitas, total) is called after each
+        unit is merged, e.g. for progress reporting.
+        """
+        self._carregar_checkpoint()
+        arquivo = open(self.checkpoint, "a", encoding="utf-8") if self.checkpoint else None
+        n_workers = n_workers or os.cpu_count() or 1
+        pool = multiprocessing.Pool(n_workers) if n_workers > 1 else None
+        inicio = time.perf_counter()
+        encontros, folgas = Counter(), Counter()
+        try:
+            for rodada in range(self.rodadas):
+                if self.formato == "round-robin":
+                    mesas = list(itertools.combinations(self.nomes, self.mesa))
+                else:
+                    ordem = sorted(self.nomes, key=lambda nome: (-self.classificacao.pontos(nome, self.mesa), nome))
+                    mesas, de_folga = mesas_swiss(ordem, self.mesa, encontros, folgas)
+                    folgas.update(de_folga)
+                for sentados in mesas:
+                    encontros.update(frozenset(par) for par in itertools.combinations(sentados, 2))
+                self._jogar_rodada(rodada, mesas, pool, arquivo, ao_receber_unidade)
+        finally:
+            self.segundos += time.perf_counter() - inicio
+            if pool:
+                pool.close()
+                pool.join()
+            if arquivo:
+                arquivo.close()
+        return self.classificacao
+
+    def _jogar_rodada(self, rodada, mesas, pool, arquivo, ao_receber_unidade):
+        por_nome = {nome: (nome, palpite, jogada) for nome, palpite, jogada in self.bots}
+        seed_da_rodada = seed_da_partida(self.seed, rodada)
+        tarefas = []
+        for indice_mesa, sentados in enumerate(mesas):
+            seed = seed_da_partida(seed_da_rodada, indice_mesa)
+            for rotacao in range(len(sentados)):
+                for inicio in range(0, self.partidas, self.tamanho_bloco):
+                    chave = f"{rodada}:{indice_mesa}:{rotacao}:{inicio}"
+                    feita = self.feitas.pop(chave, None)
+                    if feita is not None:
+                        if feita[0] != list(sentados):
+                            raise ValueError(f"Checkpoint {self.checkpoint} has unit {chave} with other bots")
+                        self.classificacao.merge(feita[1])
+                        self.mesas_retomadas += feita[1].mesas
+                        continue
+                    tarefas.append((chave, tuple(por_nome[nome] for nome in sentados), rotacao, seed, inicio,
+                                    min(self.tamanho_bloco, self.partidas - inicio), self.initial_lives,
+                                    self.max_rodadas))
+        resultados = pool.imap_unordered(_jogar_unidade, tarefas) if pool and len(tarefas) > 1 else map(_jogar_unidade, tarefas)
+        for feitas, (chave, parcial) in enumerate(resultados, 1):
+            self.classificacao.merge(parcial)
+            self.mesas_jogadas += parcial.mesas
+            if arquivo:
+                indice_mesa = int(chave.split(":")[1])
+                arquivo.write(json.dumps({"unidade": chave, "bots": list(mesas[indice_mesa]),
+                                          "resultado": parcial.to_dict()}, separators=(",", ":")) + "\n")
+                arquivo.flush()
+                os.fsync(arquivo.fileno())
+            if ao_receber_unidade:
+                ao_receber_unidade(self, rodada, feitas, len(tarefas))
+
+    def _carregar_checkpoint(self):
+        """Reads the units already played; drops a line cut short by a crash."""
+        if not self.checkpoint:
+            return
+        with open(self.checkpoint, "a+", encoding="utf-8") as f:
+            f.seek(0)
+            valido = 0
+            for numero, linha in enumerate(iter(f.readline, "")):
+                try:
+                    registro = json.loads(linha)
+                except json.JSONDecodeError:
+                    break
+                if numero == 0:
+                    if registro.get("torneio") != self.configuracao:
+                        raise ValueError(f"Checkpoint {self.checkpoint} is from a different tournament")
+                else:
+                    self.feitas[registro["unidade"]] = (registro["bots"], Classificacao.from_dict(registro["resultado"]))
+                valido = f.tell()
+            f.truncate(valido)
+            if not valido:
+                f.write(json.dumps({"torneio": self.configuracao}) + "\n")
+
+    def resumo(self):
+        return self.classificacao.resumo(self.nomes, self.mesa)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Round-robin or Swiss tournament between Fodinha bots.")
+    parser.add_argument("--bot", action="append", help="nome=palpite:jogada (repeatable; default: a few simulation.py bots)")
+    parser.add_argument("--formato", choices=FORMATOS, default="round-robin")
+    parser.add_argument("--mesa", type=int, default=4, help="Bots per table")
+    parser.add_argument("--partidas", type=int, default=100, help="Deals per meeting, each played in every seat rotation")
+    parser.add_argument("--rodadas", type=int, default=None, help="Swiss rounds (default: log2 of the roster)")
+    parser.add_argument("--vidas", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--bloco", type=int, default=50, help="Deals per unit of work")
+    parser.add_argument("--checkpoint", default=None, help="JSON-lines file to resume from and append to")
+    args = parser.parse_args()
+
+    def _progresso(torneio, rodada, feitas, total):
+        if feitas == total or feitas % 50 == 0:
+            print(f"  rodada {rodada + 1}/{torneio.rodadas}: {feitas}/{total} unidades, "
+                  f"{torneio.mesas_jogadas / max(time.perf_counter() - inicio, 1e-9):.0f} mesas/s", flush=True)
+
+    inicio = time.perf_counter()
+    torneio = Torneio(args.bot or BOTS_PADRAO, mesa=args.mesa, formato=args.formato, partidas=args.partidas,
+                      rodadas=args.rodadas, seed=args.seed, tamanho_bloco=args.bloco, initial_lives=args.vidas,
+                      checkpoint=args.checkpoint)
+    torneio.rodar(args.workers, _progresso)
+    print(f"{torneio.mesas_jogadas} mesas em {torneio.segundos:.2f}s "
+          f"({torneio.mesas_jogadas / torneio.segundos:.0f} mesas/s)"
+          + (f", {torneio.mesas_retomadas} retomadas do checkpoint" if torneio.mesas_retomadas else ""))
+    print(f"{'bot':<16}{'partidas':>9}{'pontos':>8}   {'IC 95%':<15}{'vitórias':>9}   assentos (0 = dá primeiro)")
+    for linha in torneio.resumo():
+        baixo, alto = linha["ic95"]
+        print(f"{linha['bot']:<16}{linha['partidas']:>9}{linha['pontos']:>8.3f}   [{baixo:.3f}, {alto:.3f}]"
+              f"{linha['taxa_de_vitoria']:>9.3f}   {linha['assentos']}")
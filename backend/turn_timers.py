@@ -0,0 +1,128 @@
+# backend/turn_timers.py
+"""
+Turn deadlines, so a player who walks away can't stall a table.
+
+Whenever a game reaches a turn (a bid in waiting_palpites, a card in
+waiting_card_play), LobbyServer.schedule_turn gives the room one deadline
+here. The turn is named by vez_do_jogo (the game's seed and the length of
+its action log), which changes with every accepted action, so a deadline
+whose turn was played meanwhile simply doesn't match any more.
+
+All tables share one heap of (deadline, seq, room_id, vez) and a dict
+room_id -> its current entry:
+
+- scheduling pushes an entry and replaces the room's: O(log n);
+- cancelling only forgets the room's entry: O(1). Stale entries are skipped
+  when they reach the top, and the heap is rebuilt from the live ones when
+  they outnumber them, so it stays O(live deadlines) in size.
+
+One background loop per process (no thread or greenlet per table) pops the
+due entries every `interval` seconds and runs the internal "turn_timeout"
+event for each, under the room's lock like any handler. Its handler checks
+the turn is still the same and plays jogada_padrao/palpite_padrao for the
+player through the usual submit path, so everyone gets the usual updates.
+
+Deadlines live in the process: with several workers (FODINHA_STORE=sqlite)
+the worker that handled a table's last action holds its deadline, and one
+left over from a turn played on another worker finds the turn changed.
+
+    FODINHA_TURN_TIMEOUT="palpite=45,card=30"   seconds per turn, any subset; "off" disables them
+"""
+import os
+import time
+import heapq
+import random
+import asyncio
+from simulation import palpites_permitidos, palpite_por_manilhas, jogar_carta_mais_forte
+
+PRAZOS_PADRAO = {"palpite": 45.0, "card": 30.0}
+FASES = {"waiting_palpites": "palpite", "waiting_card_play": "card"}
+
+def turnos_do_ambiente():
+    """A RelogioDeTurnos configured from FODINHA_TURN_TIMEOUT, or None when it is "off"."""
+    valor = os.environ.get("FODINHA_TURN_TIMEOUT", "")
+    if valor.strip().lower() == "off":
+        return None
+    prazos = {}
+    for item in filter(None, valor.split(",")):
+        nome, _, segundos = item.partition("=")
+        if nome.strip() not in PRAZOS_PADRAO:
+            raise ValueError(f"Unknown setting in FODINHA_TURN_TIMEOUT: {nome}")
+        prazos[nome.strip()] = float(segundos)
+    return RelogioDeTurnos(prazos)
+
+def vez_do_jogo(game):
+    """Names the turn the game is waiting on: any accepted action changes it."""
+    return (game.seed, len(game.acoes))
+
+# Defaults played for a player whose time ran out. Both are deterministic, so the rng is never used.
+_rng = random.Random(0)
+
+def palpite_padrao(game, player_id):
+    if game.n_cartas_rodada_atual == 1:
+        return min(palpites_permitidos(game)) # The player can't see their own card, so the server doesn't look either
+    return palpite_por_manilhas(game, player_id, _rng)
+
+def jogada_padrao(game, player_id):
+    return jogar_carta_mais_forte(game, player_id, _rng)
+
+class RelogioDeTurnos:
+    def __init__(self, prazos=None, interval=0.25, relogio=time.monotonic):
+        self.prazos = dict(PRAZOS_PADRAO, **(prazos or {})) # "palpite" | "card" -> seconds
+        self.interval = interval
+        self.relogio = relogio
+        self._heap = []     # (deadline, seq, room_id, vez), stale entries included
+        self._por_sala = {} # room_id -> its live heap entry
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._por_sala)
+
+    def prazo(self, round_phase):
+        """Seconds a player gets in round_phase, or None if nobody is on the clock then."""
+        tipo = FASES.get(round_phase)
+        return self.prazos[tipo] if tipo else None
+
+    def agendar(self, room_id, vez, segundos, agora=None):
+        """Gives room_id a deadline `segundos` from now for turn vez, replacing the one it had. Returns the deadline."""
+        entrada = self._por_sala.get(room_id)
+        if entrada is not None and entrada[3] == vez:
+            return entrada[0] # Same turn (e.g. a resync): the clock keeps running
+        self._seq += 1
+        entrada = ((self.relogio() if agora is None else agora) + segundos, self._seq, room_id, vez)
+        self._por_sala[room_id] = entrada
+        heapq.heappush(self._heap, entrada)
+        if len(self._heap) > 2 * len(self._por_sala) + 1024:
+            self._heap = list(self._por_sala.values()) # Mostly stale: keep the live ones
+            heapq.heapify(self._heap)
+        return entrada[0]
+
+    def cancelar(self, room_id):
+        self._por_sala.pop(room_id, None)
+
+    def vencidos(self, agora=None):
+        """turn_timeout payloads for the deadlines that have passed, oldest first. They are forgotten."""
+        agora = self.relogio() if agora is None else agora
+        heap = self._heap
+        vencidos = []
+        while heap and heap[0][0] <= agora:
+            entrada = heapq.heappop(heap)
+            room_id = entrada[2]
+            if self._por_sala.get(room_id) is entrada:
+                del self._por_sala[room_id]
+                vencidos.append({"room_id": room_id, "vez": entrada[3]})
+        return vencidos
+
+    def rodar(self, sleep, executar):
+        """Background loop for app.py; executar(event, sid, data) runs an event like a socket handler."""
+        while True:
+            sleep(self.interval)
+            for data in self.vencidos():
+                executar("turn_timeout", None, data)
+
+    async def rodar_async(self, executar):
+        """Background task for async_app.py; executar is the coroutine version."""
+        while True:
+            await asyncio.sleep(self.interval)
+            for data in self.vencidos():
+                await executar("turn_timeout", None, data)
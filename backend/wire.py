@@ -0,0 +1,276 @@
+# backend/wire.py
+"""
+Compact binary payloads for game-state events.
+
+Player views are JSON with long Portuguese keys, card names as strings and
+one "HIDDEN" per card a player can't see. Clients that send
+"encoding": "binary" with create_lobby/join_lobby get the events that carry
+game state (EVENTOS_BINARIOS, including "batch") as one Socket.IO binary
+attachment instead. They decode to exactly the JSON they replace. Adding
+"compression": "deflate" also lets payloads of COMPRIMIR_A_PARTIR_DE bytes
+or more go out zlib-compressed when that makes them smaller.
+
+A payload is one header byte (VERSAO, plus 0x80 if the rest is zlib data)
+and one value. A value is a tag byte and its body:
+
+    0x00 null   0x01 false   0x02 true
+    0x03 varint                  integer >= 64
+    0x04 varint                  negative integer (-1 - n)
+    0x05 8 bytes                 float64, big-endian
+    0x06 varint n, n bytes       UTF-8 string, then known as the next back-reference
+    0x07 varint n, n values      list
+    0x08 varint n, n pairs       object: key value, key value... (keys are strings)
+    0x09 1 byte                  card name, by card code (valor_idx * 4 + naipe_idx)
+    0x0A varint n                list of n "HIDDEN"
+    0x0B varint n, n bytes       list of n card names, by card code
+    0x0C varint i                TEXTOS[i] (field names and common values)
+    0x0D varint i                back-reference: the i-th 0x06 string of this payload
+    0x20-0x3F                    back-references 0-31
+    0x40-0x7F                    integers 0-63
+    0x80-0xFF                    TEXTOS[0-127]
+
+Varints are unsigned LEB128. TEXTOS only ever grows at the end; anything
+else is a new VERSAO. static/player.html has the client decoder.
+"""
+import struct
+import zlib
+from game_logic import CARTAS, VALORES
+
+CODIFICACAO_JSON = "json"
+CODIFICACAO_BINARIA = "binary"
+CODIFICACAO_DEFLATE = "binary+deflate"
+CODIFICACOES = (CODIFICACAO_JSON, CODIFICACAO_BINARIA, CODIFICACAO_DEFLATE)
+
+VERSAO = 1
+COMPRIMIDO = 0x80
+COMPRIMIR_A_PARTIR_DE = 256 # Smaller ones fit a single packet anyway and cost a round of inflate on the client
+
+# Events whose payload is (or holds) a player view
+EVENTOS_BINARIOS = frozenset({
+    "game_started", "game_update", "prompt_palpite", "prompt_card_play", "round_results",
+    "game_snapshot", "lobby_joined", "lobby_state", "batch", "spectating", "spectator_update",
+})
+
+TEXTOS = (
+    # Player view (FodinhaGame.get_player_game_state)
+    "players", "lives", "current_dealer_global", "cards_next_round_global", "game_over_global",
+    "round_phase", "dealer_rodada_atual", "n_cartas_rodada_atual", "carta_meio_rodada_atual",
+    "manilha_rodada_atual", "maos_rodada_atual", "palpites_feitos_rodada_atual",
+    "soma_palpites_rodada_atual", "jogador_da_vez_acao", "vitorias_rodada_atual",
+    "cartas_na_mesa_rodada_atual", "historico_cartas_rodada", "can_see_own_cards", "can_see_others_cards",
+    # Event fields (lobbies.py, batching.py)
+    "room_id", "event_type", "player_who_bade", "palpite_value", "player_who_played", "trick_winner",
+    "version", "game_state", "your_player_id", "states", "events", "event", "state", "data", "msg",
+    # Values
+    "waiting_palpites", "waiting_card_play", "round_over", "game_over",
+    "palpite_submitted", "all_palpites_completed", "card_played", "trick_completed", "next_round_started",
+    "game_started", "game_update", "prompt_palpite", "prompt_card_play", "round_results", "game_snapshot",
+    "lobby_joined", "lobby_state", "error", "action_error", "lobby_message",
+) + tuple(VALORES) + (
+    # Spectators (spectators.py)
+    "spectators", "spectating", "spectator_update",
+)
+
+HIDDEN = "HIDDEN"
+_INDICE_TEXTO = {texto: i for i, texto in enumerate(TEXTOS)}
+_CODIGO_CARTA = {carta.nome: carta.codigo for carta in CARTAS}
+_NOME_CARTA = tuple(carta.nome for carta in CARTAS)
+
+def codificacao_pedida(data):
+    """Encoding a client asked for in create_lobby/join_lobby (json unless it opts in)."""
+    if data.get("encoding") != CODIFICACAO_BINARIA:
+        return CODIFICACAO_JSON
+    return CODIFICACAO_DEFLATE if data.get("compression") == "deflate" else CODIFICACAO_BINARIA
+
+# ── Encoding ───────────────────────────────────────────────────────────────
+def codificar(valor, comprimir=False):
+    """Payload bytes for a JSON-ready value; zlib-compressed if comprimir, it is large and that helps."""
+    saida = bytearray([VERSAO])
+    _valor(saida, valor, {})
+    if comprimir and len(saida) >= COMPRIMIR_A_PARTIR_DE:
+        comprimido = zlib.compress(memoryview(saida)[1:], 6)
+        if len(comprimido) + 1 < len(saida):
+            return bytes([VERSAO | COMPRIMIDO]) + comprimido
+    return bytes(saida)
+
+def _varint(saida, n):
+    while n >= 0x80:
+        saida.append((n & 0x7F) | 0x80)
+        n >>= 7
+    saida.append(n)
+
+def _texto(saida, texto, refs):
+    indice = _INDICE_TEXTO.get(texto)
+    if indice is not None:
+        if indice < 128:
+            saida.append(0x80 | indice)
+        else:
+            saida.append(0x0C)
+            _varint(saida, indice)
+        return
+    codigo = _CODIGO_CARTA.get(texto)
+    if codigo is not None:
+        saida.append(0x09)
+        saida.append(codigo)
+        return
+    ref = refs.get(texto)
+    if ref is not None:
+        if ref < 32:
+            saida.append(0x20 | ref)
+        else:
+            saida.append(0x0D)
+            _varint(saida, ref)
+        return
+    refs[texto] = len(refs)
+    dados = texto.encode("utf-8")
+    saida.append(0x06)
+    _varint(saida, len(dados))
+    saida += dados
+
+def _lista(saida, lista, refs):
+    n = len(lista)
+    if n:
+        if all(item == HIDDEN for item in lista):
+            saida.append(0x0A)
+            _varint(saida, n)
+            return
+        codigos = [_CODIGO_CARTA.get(item) if type(item) is str else None for item in lista]
+        if None not in codigos:
+            saida.append(0x0B)
+            _varint(saida, n)
+            saida += bytes(codigos)
+            return
+    saida.append(0x07)
+    _varint(saida, n)
+    for item in lista:
+        _valor(saida, item, refs)
+
+def _valor(saida, valor, refs):
+    tipo = type(valor)
+    if tipo is str:
+        _texto(saida, valor, refs)
+    elif valor is None:
+        saida.append(0x00)
+    elif tipo is bool:
+        saida.append(0x02 if valor else 0x01)
+    elif tipo is int:
+        if 0 <= valor < 64:
+            saida.append(0x40 | valor)
+        elif valor >= 0:
+            saida.append(0x03)
+            _varint(saida, valor)
+        else:
+            saida.append(0x04)
+            _varint(saida, -1 - valor)
+    elif isinstance(valor, dict):
+        saida.append(0x08)
+        _varint(saida, len(valor))
+        for chave, item in valor.items():
+            _texto(saida, str(chave), refs)
+            _valor(saida, item, refs)
+    elif isinstance(valor, (list, tuple)):
+        _lista(saida, valor, refs)
+    elif isinstance(valor, float):
+        saida.append(0x05)
+        saida += struct.pack(">d", valor)
+    elif isinstance(valor, int): # int subclasses; bool was handled above
+        _valor(saida, int(valor), refs)
+    else:
+        raise TypeError(f"Can't encode {tipo.__name__} in a binary payload")
+
+# ── Decoding (load_test.py and round-trip checks; browsers use player.html) ──
+def decodificar(dados):
+    """The JSON value a payload from codificar stands for."""
+    cabecalho = dados[0]
+    if cabecalho & 0x7F != VERSAO:
+        raise ValueError(f"Unknown binary payload version {cabecalho & 0x7F}")
+    corpo = zlib.decompress(dados[1:]) if cabecalho & COMPRIMIDO else memoryview(dados)[1:]
+    valor, fim = _ler(corpo, 0, [])
+    if fim != len(corpo):
+        raise ValueError("Trailing bytes after binary payload")
+    return valor
+
+def _ler_varint(dados, i):
+    n = deslocamento = 0
+    while True:
+        byte = dados[i]
+        i += 1
+        n |= (byte & 0x7F) << deslocamento
+        if byte < 0x80:
+            return n, i
+        deslocamento += 7
+
+def _ler(dados, i, refs):
+    tag = dados[i]
+    i += 1
+    if tag >= 0x80:
+        return TEXTOS[tag & 0x7F], i
+    if tag >= 0x40:
+        return tag & 0x3F, i
+    if tag >= 0x20:
+        return refs[tag & 0x1F], i
+    if tag <= 0x02:
+        return (None, False, True)[tag], i
+    if tag == 0x09:
+        return _NOME_CARTA[dados[i]], i + 1
+    if tag == 0x05:
+        return struct.unpack(">d", dados[i:i + 8])[0], i + 8
+    n, i = _ler_varint(dados, i)
+    if tag == 0x03:
+        return n, i
+    if tag == 0x04:
+        return -1 - n, i
+    if tag == 0x06:
+        texto = bytes(dados[i:i + n]).decode("utf-8")
+        refs.append(texto)
+        return texto, i + n
+    if tag == 0x07:
+        lista = []
+        for _ in range(n):
+            item, i = _ler(dados, i, refs)
+            lista.append(item)
+        return lista, i
+    if tag == 0x08:
+        objeto = {}
+        for _ in range(n):
+            chave, i = _ler(dados, i, refs)
+            objeto[chave], i = _ler(dados, i, refs)
+        return objeto, i
+    if tag == 0x0A:
+        return [HIDDEN] * n, i
+    if tag == 0x0B:
+        return [_NOME_CARTA[c] for c in dados[i:i + n]], i + n
+    if tag == 0x0C:
+        return TEXTOS[n], i
+    if tag == 0x0D:
+        return refs[n], i
+    raise ValueError(f"Unknown tag 0x{tag:02x} in binary payload")
+
+# ── Outbox pass ────────────────────────────────────────────────────────────
+def codificar_ops(ops, codificacao, metrics=None):
+    """
+    Outbox ops with the EVENTOS_BINARIOS emits to sockets on the binary
+    encoding (codificacao(sid)) replaced by their payload bytes. A payload
+    sent to several sockets of one player is encoded once per variant.
+    """
+    resultado = []
+    por_sid = {}       # sid -> codificacao(sid), asked once per call
+    codificados = {}   # (id(payload), comprimir) -> bytes
+    for op in ops:
+        if op[0] == "emit" and op[1] in EVENTOS_BINARIOS:
+            _, event, payload, room = op
+            if room not in por_sid:
+                por_sid[room] = codificacao(room)
+            if por_sid[room] != CODIFICACAO_JSON:
+                comprimir = por_sid[room] == CODIFICACAO_DEFLATE
+                chave = (id(payload), comprimir)
+                dados = codificados.get(chave)
+                if dados is None:
+                    dados = codificados[chave] = codificar(payload, comprimir)
+                if metrics is not None:
+                    metrics.binary_bytes[event] += len(dados)
+                    if dados[0] & COMPRIMIDO:
+                        metrics.compressed_payloads[event] += 1
+                op = ("emit", event, dados, room)
+        resultado.append(op)
+    return resultado